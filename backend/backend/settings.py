@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -91,11 +92,112 @@ MQTT_BROKER_PORT = 1883
 MQTT_USERNAME = 'erhun'  # Eğer authentication gerekiyorsa
 MQTT_PASSWORD = '123'  # Eğer authentication gerekiyorsa
 
+# MQTT veri alım (ingest) ayarları
+MQTT_INGEST = {
+    'BUFFER_MAX_BATCH_SIZE': 500,  # Tek bulk_create ile yazılacak en fazla okuma
+    'BUFFER_FLUSH_INTERVAL': 1.0,  # saniye
+    'BUFFER_MAX_PENDING': 20000,  # Tamponda tutulacak en fazla okuma
+    'WORKER_COUNT': 4,  # Mesaj işleyen worker thread sayısı
+    'QUEUE_SIZE': 10000,  # Tüm worker kuyruklarının toplam kapasitesi
+    'OVERFLOW_POLICY': 'drop_telemetry',  # 'block', 'drop_oldest' veya 'drop_telemetry'
+    'SUBSCRIBE_QOS': 0,  # room/+/+ ve esp32/status/+ wildcard abonelikleri için QoS
+    'REASSEMBLY_MAX_ROOMS': 10000,  # Eksik okuma önbelleğinde tutulacak en fazla oda
+    'REASSEMBLY_TTL': 60,  # saniye, bu süre içinde tamamlanmayan kısmi okumalar atılır
+    'REASSEMBLY_SWEEP_INTERVAL': 10,  # saniye
+    # Paylaşımlı abonelik grubu ($share/{grup}/room/+/+); None ise her süreç tüm mesajları alır.
+    # Birden fazla ingest süreci ile eski tekil topic'ler birleştirilemez, telemetry formatı kullanılmalı
+    'SHARED_GROUP': None,
+    'INGEST_WORKERS': 4,  # run_ingest_workers komutunun varsayılan süreç sayısı
+    'ASYNC_MAX_IN_FLIGHT': 1000,  # mqtt_async_client: aynı anda işlenen en fazla mesaj
+    'ASYNC_DB_CONCURRENCY': 2,  # mqtt_async_client: eşzamanlı veritabanı işlemi sayısı
+    'METRICS_DIR': 'logs/ingest_metrics',  # Süreç başına metrik snapshot dosyaları ({pid}.json)
+    'METRICS_INTERVAL': 10,  # saniye, snapshot yazma aralığı (0=kapalı)
+    # Ham MQTT mesaj logu (write-ahead log), replay_mqtt_log komutu ile yeniden işlenebilir
+    'MESSAGE_LOG_ENABLED': True,
+    'MESSAGE_LOG_DIR': 'logs/mqtt_wal',
+    'MESSAGE_LOG_SEGMENT_BYTES': 16 * 1024 * 1024,  # Segment boyutu
+    'MESSAGE_LOG_MAX_SEGMENTS': 32,  # Dizinde (tüm süreçler) tutulacak en fazla segment
+    'MESSAGE_LOG_MAX_AGE': 7 * 24 * 3600,  # saniye, daha eski segmentler silinir
+    'MESSAGE_LOG_FSYNC_INTERVAL': 1.0,  # saniye
+    'MESSAGE_LOG_FSYNC_BATCH': 1000,  # Bu kadar kayıtta bir fsync
+}
+
+# Cihaz komut kuyruğu ayarları (valf/fan komutları için onay takibi)
+MQTT_COMMANDS = {
+    'QOS': 1,  # Komut mesajları için QoS
+    'ACK_TIMEOUT': 5,  # saniye, onay gelmezse ilk yeniden gönderim aralığı
+    'MAX_ATTEMPTS': 5,  # Zaman aşımından önceki en fazla gönderim sayısı
+    'BACKOFF_MAX': 60,  # saniye, yeniden gönderim aralığının üst sınırı
+}
+
+# Değişim tabanlı sensör okuma kaydı (deadband)
+# Okuma yalnızca eşik aşıldığında, hareket durumu değiştiğinde veya heartbeat süresi dolduğunda yazılır
+SENSOR_DEADBAND = {
+    'ENABLED': True,
+    'TEMPERATURE_EPSILON': 0.2,  # °C
+    'HUMIDITY_EPSILON': 1.0,  # %
+    'HEARTBEAT_INTERVAL': 300,  # saniye, değişiklik olmasa da bu aralıkla bir okuma yazılır
+    # Oda bazında eşikler, ör. {1: {'TEMPERATURE_EPSILON': 0.1}}
+    'ROOMS': {},
+}
 
 # Decision Engine ayarları
 DECISION_ENGINE = {
-    'CHECK_INTERVAL': 1,  # saniye
+    'CHECK_INTERVAL': 1,  # saniye (olay modunda: olayların toplu işlenme aralığı)
     'TEMPERATURE_THRESHOLD': 2.0,  # ±°C
+    # 'poll': her CHECK_INTERVAL'da tüm odalar değerlendirilir
+    # 'event': yalnızca yeni okuması yazılan veya cihaz durumu değişen odalar değerlendirilir.
+    # Olaylar yalnızca aynı süreçteki MQTT client'tan gelir; veri alımı ayrı süreçte çalışıyorsa
+    # (mqtt_client komutu, run_ingest_workers) odalar yalnızca SWEEP_INTERVAL'da bir değerlendirilir
+    'MODE': 'poll',
+    'SWEEP_INTERVAL': 60,  # saniye, olay modunda tüm odaların tarama aralığı
+    # 'scalar': oda oda değerlendirme
+    # 'vectorized': tüm odalar NumPy dizileriyle tek geçişte (NumPy gerekir, yoksa 'scalar')
+    'EVALUATION': 'scalar',
+    # Son kararlar, komut geçmişi ve onay bekleyen komutlar bu dosyaya yazılır ve
+    # yeniden başlatmada yüklenir (ilk değerlendirmede komut fırtınasını önler)
+    'STATE_FILE': 'logs/decision_engine_state.json',
+    'STATE_SAVE_INTERVAL': 30,  # saniye
+    'STATE_MAX_AGE': 3600,  # saniye, daha eski durum dosyaları yok sayılır
+}
+
+# Komut birleştirici: cihaz durumunun tersine çevrilmesi için en az bekleme süreleri
+# (step motor hareketleri pil tüketir ve mekanik aşınmaya yol açar)
+COMMAND_COALESCER = {
+    'VALVE_MIN_DWELL': 300,  # saniye
+    'FAN_MIN_DWELL': 30,  # saniye
+    'MANUAL_VALVE_MIN_DWELL': 30,  # saniye, manuel kontrolde vana yön değişimleri arası
+    'MANUAL_FAN_MIN_DWELL': 5,  # saniye
+}
+
+# Program sınırlarında oluşan komut yoğunluğunun zamana yayılması
+# (komutların yeniden denenmesi ve onay takibi MQTT_COMMANDS ayarlarıyla komut kuyruğunda yapılır)
+COMMAND_DISPATCH = {
+    'WINDOW': 30,  # saniye, yoğunluktaki komutlar bu pencereye oda bazlı gecikmeyle yayılır (0=kapalı)
+    'BURST_THRESHOLD': 10,  # komut, bir saniyede bundan fazlası gelirse yayma devreye girer
+    'MAX_RATE': 20,  # komut/saniye, azami gönderim hızı
+    'DRAIN_TIMEOUT': 5,  # saniye, kapatılırken kuyruk hız sınırıyla bu kadar gönderilir, kalanlar komut kuyruğuna devredilir
+}
+
+# Karar motorunun derlenmiş program önbelleği
+SCHEDULE_CACHE = {
+    'CHANGE_POLL_INTERVAL': 2,  # saniye, diğer süreçlerdeki program değişikliklerinin sorgulanma aralığı
+    'TTL': 300,  # saniye, önbellek bu aralıkla tamamen yenilenir (sinyal dışı değişiklikler için)
+    'CHANGE_RETENTION': 3600,  # saniye, daha eski ScheduleChange kayıtları silinir
+}
+
+# Karar motoru ve zamanlayıcı için süreçler arası lider seçimi
+# Seçim yalnızca ENABLED ise ve sunucu süreçlerinde (runserver, gunicorn/uwsgi gibi WSGI/ASGI
+# sunucuları) başlatılır; migrate, check, shell ve diğer yönetim komutları motoru çalıştırmaz
+LEADER_ELECTION = {
+    # Karar motoru varsayılan olarak açık; DECISION_ENGINE_ENABLED=0 ile bu süreçte kapatılır
+    'ENABLED': os.environ.get('DECISION_ENGINE_ENABLED', '1').lower() not in ('0', 'false', 'no'),
+    'SERVER_COMMANDS': ('runserver', 'runserver_with_decision_engine'),  # Motoru çalıştıran yönetim komutları
+    'BACKEND': 'db',  # 'db' (EngineLease satırı), 'file' (tek sunucu, dosya kilidi) veya None (kapalı)
+    'LEASE_NAME': 'decision_engine',
+    'LEASE_TTL': 15,  # saniye, lider bu sürede yenilemezse başka süreç devralır
+    'HEARTBEAT_INTERVAL': 5,  # saniye
+    'LOCK_FILE': 'logs/decision_engine.lock',
 }
 
 # Logging ayarları
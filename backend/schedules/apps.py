@@ -8,21 +8,34 @@ class SchedulesConfig(AppConfig):
     name = 'schedules'
 
     def ready(self):
-        from . import scheduler
-        scheduler.start()
-
+        # Program önbelleğini güncel tutan sinyalleri bağla
+        from . import signals  # noqa: F401
 
         import os
         if os.environ.get('RUN_MAIN', None) != 'true':  # Geliştirme sunucusundaki çift-yüklemeyi önle
-            try:
-                from .decision_engine import decision_engine
-                decision_engine.start()
-                print("Decision Engine başlatıldı!")
-            except Exception as e:
-                print(f"Decision Engine başlatılırken hata: {e}")
+            # Zamanlayıcı ve karar motoru yalnızca LEADER_ELECTION['ENABLED'] açıksa, sunucu
+            # süreçlerinde ve lider seçilen süreçte çalışır
+            from .leader import leader_election
+            if leader_election.should_start():
+                leader_election.start(on_elected, on_demoted)
+
+# Lider seçildiğinde çağrılacak işlev
+def on_elected():
+    from . import scheduler
+    scheduler.start()
+
+    try:
+        from .decision_engine import decision_engine
+        decision_engine.start()
+        print("Decision Engine başlatıldı!")
+    except Exception as e:
+        print(f"Decision Engine başlatılırken hata: {e}")
+
+# Liderlik kaybedildiğinde çağrılacak işlev
+def on_demoted():
+    from . import scheduler
+    scheduler.stop()
 
-# Django uygulaması kapatıldığında çağrılacak işlev
-def on_shutdown():
     try:
         from .decision_engine import decision_engine
         decision_engine.stop()
@@ -30,6 +43,15 @@ def on_shutdown():
     except Exception as e:
         print(f"Decision Engine durdurulurken hata: {e}")
 
+# Django uygulaması kapatıldığında çağrılacak işlev
+def on_shutdown():
+    try:
+        # Liderse motoru durdurur ve kiralamayı bırakır, diğer süreç hemen devralır
+        from .leader import leader_election
+        leader_election.stop()
+    except Exception as e:
+        print(f"Liderlik bırakılırken hata: {e}")
+
 # Kapatma işlevini kaydet
 import atexit
-atexit.register(on_shutdown)
\ No newline at end of file
+atexit.register(on_shutdown)
@@ -0,0 +1,309 @@
+# schedules/command_coalescer.py
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Cihaz tipi -> DeviceStatus alanı
+DEVICE_FIELDS = {
+    'valve': 'valve_status',
+    'fan': 'fan_status',
+}
+
+
+class _DeviceState:
+    """Tek bir oda/cihaz için son gönderilen komut ve bekleyen istek"""
+
+    __slots__ = ('last_value', 'last_change', 'pending', 'manual', 'dispatching', 'rollback')
+
+    def __init__(self):
+        self.last_value = None  # Son gönderilen durum (bu süreçte)
+        self.last_change = 0.0  # Son gönderim zamanı (monotonic)
+        self.pending = None  # Bekleme süresi dolunca gönderilecek durum
+        self.manual = False  # Bekleyen istek manuel kontrolden geldi (kısa bekleme süresi)
+        self.dispatching = False  # last_value gönderim zamanlayıcısında, henüz komut kuyruğuna iletilmedi
+        self.rollback = None  # Zamanlayıcıdaki komuttan önceki (last_value, last_change), snapshot için
+
+
+class CommandCoalescer:
+    """
+    Karar motoru ile MQTT komut gönderimi arasındaki oda bazlı komut birleştirici.
+
+    - Cihaz zaten istenen durumdaysa komut gönderilmez (bastırılır)
+    - Bir cihazın durumu, son değişiklikten sonra MIN_DWELL süresi dolmadan tersine
+      çevrilmez; istek bekletilir ve bu sürede gelen istekler en sonuncusuna indirgenir
+    - Bekleyen istek, cihazın mevcut durumuna geri dönerse iptal edilir
+    - Manuel kontrol (manual=True) daha kısa MANUAL_*_MIN_DWELL süresi uygular ve
+      cihaz aynı yöndeyse komutu yeniden gönderir; force=True bekleme süresini tamamen atlar
+
+    Bekleme süresi dolan istekler arka plan thread'i tarafından gönderilir. Gönderim
+    zamanlayıcısında bekleyen komutlar ('queued') onay takipli MQTT komut kuyruğuna
+    iletildiğinde cihaz durumu güncellenir; yeniden deneme komut kuyruğunda yapılır.
+    """
+
+    def __init__(self):
+        coalescer_settings = getattr(settings, 'COMMAND_COALESCER', {})
+        self.min_dwell = {
+            'valve': coalescer_settings.get('VALVE_MIN_DWELL', 300),  # saniye, vana yön değişimleri arası
+            'fan': coalescer_settings.get('FAN_MIN_DWELL', 30),  # saniye
+        }
+        self.manual_min_dwell = {
+            'valve': coalescer_settings.get('MANUAL_VALVE_MIN_DWELL', 30),  # saniye
+            'fan': coalescer_settings.get('MANUAL_FAN_MIN_DWELL', 5),  # saniye
+        }
+
+        self._states = {}  # (room_id, device) -> _DeviceState
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._flush_thread = None
+        self.running = False
+
+        self.sent_count = 0
+        self.queued_count = 0  # Gönderim zamanlayıcısına alınan
+        self.suppressed_count = 0  # Cihaz zaten istenen durumda olduğu için gönderilmeyen
+        self.deferred_count = 0  # Bekleme süresi nedeniyle ertelenen
+        self.coalesced_count = 0  # Bekleyen istek daha yeni bir istekle değiştirildi
+        self.cancelled_count = 0  # Bekleyen istek mevcut duruma geri döndüğü için iptal edildi
+
+    def start(self):
+        """Bekleyen istekleri gönderen thread'i başlat"""
+        if self.running:
+            return
+
+        self.running = True
+        self._flush_thread = threading.Thread(target=self._run_flush_loop, name='command-coalescer')
+        self._flush_thread.daemon = True
+        self._flush_thread.start()
+
+    def stop(self):
+        """Thread'i durdur (bekleyen istekler bellekte kalır)"""
+        self.running = False
+        self._wake_event.set()
+        if self._flush_thread and self._flush_thread.is_alive():
+            self._flush_thread.join(2.0)  # Maksimum 2 saniye bekle
+        self._flush_thread = None
+
+    def request(self, room_id, device, value, current=None, force=False, manual=False):
+        """
+        Oda ve cihaz için istenen durumu bildir.
+        current: Cihazın bilinen durumu (DeviceStatus), verilmezse son gönderilen durum kullanılır.
+        manual: Kullanıcı komutu; gönderim zamanlayıcısı beklenmez, kısa bekleme süresi uygulanır.
+        Sonuç: 'sent', 'queued' (gönderim zamanlayıcısında; cihaz durumu komut kuyruğuna
+        iletilince güncellenir), 'deferred', 'suppressed' veya 'failed' (broker'a bağlı değil)
+        """
+        key = (int(room_id), device)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _DeviceState()
+
+            if state.dispatching:
+                # Zamanlayıcıdaki komut DeviceStatus'a henüz yansımadı, geçerli durum odur
+                effective = state.last_value
+            else:
+                effective = current if current is not None else state.last_value
+
+            if manual and not force:
+                remaining = state.last_change + self.manual_min_dwell[device] - time.monotonic()
+                if value != effective and state.last_value is not None and remaining > 0:
+                    if state.pending is None:
+                        self.deferred_count += 1
+                        logger.info(
+                            f"Manuel komut ertelendi: Oda={key[0]}, Cihaz={device}, Durum={value}, "
+                            f"Kalan bekleme={remaining:.0f}s"
+                        )
+                    elif state.pending != value:
+                        self.coalesced_count += 1
+                    state.pending = value
+                    state.manual = True
+                    return 'deferred'
+            elif not force:
+                if state.dispatching and value == effective:
+                    if state.pending is not None:
+                        state.pending = None
+                        self.cancelled_count += 1
+                    return 'queued'
+                if value == effective:
+                    if state.pending is not None:
+                        state.pending = None
+                        self.cancelled_count += 1
+                        logger.debug(f"Bekleyen komut iptal edildi: Oda={key[0]}, Cihaz={device}")
+                    self.suppressed_count += 1
+                    return 'suppressed'
+
+                remaining = state.last_change + self.min_dwell[device] - time.monotonic()
+                if state.last_value is not None and remaining > 0:
+                    if state.pending is None:
+                        self.deferred_count += 1
+                        logger.info(
+                            f"Komut ertelendi: Oda={key[0]}, Cihaz={device}, Durum={value}, "
+                            f"Kalan bekleme={remaining:.0f}s"
+                        )
+                    elif state.pending != value:
+                        self.coalesced_count += 1
+                    state.pending = value
+                    state.manual = False
+                    return 'deferred'
+
+            state.pending = None
+            state.manual = False
+            return self._send(key, state, value, immediate=force or manual)
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for state in self._states.values() if state.pending is not None)
+
+    def pending_keys(self):
+        """Bekleyen isteği olan (oda ID, cihaz) çiftleri"""
+        with self._lock:
+            return {key for key, state in self._states.items() if state.pending is not None}
+
+    def stats(self):
+        """Birleştirici sayaçları"""
+        return {
+            'pending': self.pending_count(),
+            'sent': self.sent_count,
+            'queued': self.queued_count,
+            'suppressed': self.suppressed_count,
+            'deferred': self.deferred_count,
+            'coalesced': self.coalesced_count,
+            'cancelled': self.cancelled_count,
+        }
+
+    def export_state(self):
+        """
+        Kalıcı snapshot için durum: [oda ID, cihaz, son gönderilen durum, son gönderim zamanı
+        (epoch saniye), bekleyen durum]. Monotonic zamanlar duvar saatine çevrilir.
+        """
+        offset = time.time() - time.monotonic()
+        entries = []
+        with self._lock:
+            for (room_id, device), state in self._states.items():
+                last_value, last_change, pending = state.last_value, state.last_change, state.pending
+                if state.dispatching:
+                    # Henüz gönderilmedi: son gönderilen durum geri alınmış gibi, komut bekleyen istek olarak
+                    last_value, last_change = state.rollback
+                    if pending is None:
+                        pending = state.last_value
+                if last_value is None and pending is None:
+                    continue
+                entries.append([room_id, device, last_value,
+                                last_change + offset if last_value is not None else None, pending])
+        return entries
+
+    def restore_state(self, entries):
+        """export_state() çıktısını yükle, bekleme süreleri yeniden başlatmadan sonra da korunur"""
+        offset = time.time() - time.monotonic()
+        restored = 0
+        with self._lock:
+            for room_id, device, last_value, last_change, pending in entries:
+                if device not in self.min_dwell:
+                    continue
+                key = (int(room_id), device)
+                if key in self._states:
+                    continue  # Bu süreçte zaten komut gönderilmiş, daha güncel
+                state = self._states[key] = _DeviceState()
+                state.last_value = last_value
+                if last_change is not None:
+                    state.last_change = last_change - offset
+                state.pending = pending
+                restored += 1
+        if restored:
+            self._wake_event.set()
+        return restored
+
+    def _publish(self, room_id, device, value, immediate=False):
+        """Komutu gönderim zamanlayıcısı üzerinden MQTT komut kuyruğuna ilet: 'sent', 'queued' veya 'failed'"""
+        from schedules.dispatcher import command_dispatcher
+        from sensors.mqtt_client import mqtt_client
+
+        if not mqtt_client.is_connected:
+            return 'failed'
+        return command_dispatcher.submit(room_id, device, value, immediate=immediate, callback=self._on_dispatched)
+
+    def _send(self, key, state, value, immediate=False):
+        """Komutu ilet ve durumu güncelle (self._lock tutulurken çağrılır)"""
+        result = self._publish(key[0], key[1], value, immediate=immediate)
+        if result == 'failed':
+            return result
+        if result == 'queued':
+            if not state.dispatching:
+                state.rollback = (state.last_value, state.last_change)
+                state.dispatching = True
+            self.queued_count += 1
+        else:
+            # Hemen gönderildi; zamanlayıcıdaki eski komut varsa onun yerini aldı
+            state.dispatching = False
+            state.rollback = None
+            self.sent_count += 1
+        state.last_value = value
+        state.last_change = time.monotonic()
+        return result
+
+    def _on_dispatched(self, room_id, device, value):
+        """Gönderim zamanlayıcısı komutu MQTT komut kuyruğuna iletti: cihaz durumunu güncelle"""
+        from sensors.models import DeviceStatus
+
+        key = (int(room_id), device)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None or not state.dispatching or state.last_value != value:
+                return  # Bu arada daha yeni bir komut gönderildi
+            state.dispatching = False
+            state.rollback = None
+            self.sent_count += 1
+
+        DeviceStatus.objects.filter(room_id=room_id).update(
+            **{DEVICE_FIELDS[device]: value, 'last_updated': timezone.now()}
+        )
+        logger.info(f"Zamanlanmış komut gönderildi: Oda={room_id}, Cihaz={device}, Durum={value}")
+
+    def _flush_due(self):
+        """Bekleme süresi dolan istekleri gönder, hemen gönderilenleri döndür"""
+        now = time.monotonic()
+        sent = []
+        with self._lock:
+            for key, state in self._states.items():
+                if state.pending is None:
+                    continue
+                min_dwell = self.manual_min_dwell if state.manual else self.min_dwell
+                if state.last_change + min_dwell[key[1]] > now:
+                    continue
+                value = state.pending
+                result = self._send(key, state, value, immediate=state.manual)
+                if result == 'failed':
+                    continue
+                state.pending = None
+                state.manual = False
+                if result == 'sent':
+                    sent.append((key[0], key[1], value))
+        return sent
+
+    def _run_flush_loop(self):
+        """Ertelenen komutları bekleme süresi dolunca gönder ve cihaz durumunu güncelle"""
+        from sensors.models import DeviceStatus
+
+        try:
+            while self.running:
+                self._wake_event.wait(0.5)
+                self._wake_event.clear()
+
+                try:
+                    for room_id, device, value in self._flush_due():
+                        DeviceStatus.objects.filter(room_id=room_id).update(
+                            **{DEVICE_FIELDS[device]: value, 'last_updated': timezone.now()}
+                        )
+                        logger.info(f"Ertelenen komut gönderildi: Oda={room_id}, Cihaz={device}, Durum={value}")
+                except Exception as e:
+                    logger.error(f"Komut birleştirici döngüsünde hata: {str(e)}", exc_info=True)
+        finally:
+            # Bu thread'e ait veritabanı bağlantısını kapat
+            connection.close()
+
+
+# Singleton instance oluştur
+command_coalescer = CommandCoalescer()
@@ -1,13 +1,18 @@
 # schedules/decision_engine.py
+import heapq
 import logging
 import threading
 import time
 from django.utils import timezone
 from django.db.models import F, Q
 from django.conf import settings
+from schedules.tick_profiler import TICKS_GAUGE, TickProfiler
 
 logger = logging.getLogger(__name__)
 
+# Program geçişinde, yeni zaman diliminin kesin olarak geçerli olması için beklenecek ek süre (saniye)
+TRANSITION_MARGIN = 0.01
+
 class DecisionEngine:
     _instance = None
     
@@ -18,7 +23,25 @@ class DecisionEngine:
             engine_settings = getattr(settings, 'DECISION_ENGINE', {})
             cls._instance.check_interval = engine_settings.get('CHECK_INTERVAL', 60)
             cls._instance.temperature_threshold = engine_settings.get('TEMPERATURE_THRESHOLD', 2.0)
+            # 'poll': her check_interval'da tüm odalar, 'event': yalnızca yeni verisi gelen odalar
+            cls._instance.mode = engine_settings.get('MODE', 'poll')
+            cls._instance.sweep_interval = engine_settings.get('SWEEP_INTERVAL', 60)
+            # 'scalar': oda oda değerlendirme, 'vectorized': tüm odalar NumPy dizileriyle tek geçişte
+            cls._instance.evaluation = engine_settings.get('EVALUATION', 'scalar')
             cls._instance.daemon_thread = None
+            cls._instance._dirty_rooms = set()  # Değerlendirilmeyi bekleyen oda ID'leri (olay modu)
+            cls._instance._dirty_lock = threading.Lock()
+            cls._instance._wake_event = threading.Event()
+            # Odaların bir sonraki program geçiş zamanları: (epoch saniye, oda ID, program ID) min-heap
+            cls._instance._transitions = []
+            cls._instance._transitions_generation = None  # Heap'in oluşturulduğu program önbelleği sürümü
+            # Yeniden başlatmalar arasında korunan durum (bkz. engine_state.py)
+            cls._instance.state_file = engine_settings.get('STATE_FILE', 'logs/decision_engine_state.json')
+            cls._instance.state_save_interval = engine_settings.get('STATE_SAVE_INTERVAL', 30)
+            cls._instance.state_max_age = engine_settings.get('STATE_MAX_AGE', 3600)
+            cls._instance._decisions = {}  # Oda ID -> RoomDecision (son karar)
+            cls._instance._next_state_save = 0.0
+            cls._instance.profiler = TickProfiler()  # Tick başına aşama süreleri ve sayaçlar
         return cls._instance
     
     def start(self):
@@ -27,7 +50,18 @@ class DecisionEngine:
             logger.info("Karar motoru zaten çalışıyor")
             return
         
+        from schedules.command_coalescer import command_coalescer
+        from schedules.dispatcher import command_dispatcher
+        from sensors.metrics import ingest_metrics
+        
+        self._restore_state()
         self.running = True
+        command_dispatcher.start()
+        command_coalescer.start()
+        # Tick profili metrik snapshot dosyasıyla diğer süreçlere (ör. API) yayınlanır
+        ingest_metrics.register_gauge(TICKS_GAUGE, self.profiler.snapshot)
+        ingest_metrics.start()
+        self._connect_signals()
         self.daemon_thread = threading.Thread(target=self._run_decision_loop)
         self.daemon_thread.daemon = True
         self.daemon_thread.start()
@@ -39,9 +73,20 @@ class DecisionEngine:
             logger.info("Karar motoru zaten durduruldu")
             return
         
+        from schedules.command_coalescer import command_coalescer
+        from schedules.dispatcher import command_dispatcher
+        from sensors.metrics import ingest_metrics
+        
         self.running = False
+        self._wake_event.set()
         if self.daemon_thread and self.daemon_thread.is_alive():
             self.daemon_thread.join(2.0)  # Maksimum 2 saniye bekle
+        command_coalescer.stop()
+        command_dispatcher.stop()
+        self._save_state()
+        ingest_metrics.unregister_gauge(TICKS_GAUGE)
+        if ingest_metrics.running:
+            ingest_metrics.write_snapshot()  # Bu süreç artık karar motoru olarak görünmez
         logger.info("Karar motoru durduruldu")
     
     def _run_decision_loop(self):
@@ -52,46 +97,389 @@ class DecisionEngine:
         from schedules.models import Schedule, ScheduleTime, RoomSchedule
         from sensors.models import Room, SensorReading, DeviceStatus
         from sensors.mqtt_client import mqtt_client
+        from schedules.schedule_cache import schedule_cache
+        
+        if self.mode == 'event':
+            self._run_event_loop()
+            return
         
         while self.running:
             try:
-                self._process_all_rooms()
+                with self.profiler.tick('poll', self.check_interval):
+                    # Diğer süreçlerde yapılan program değişikliklerini al
+                    with self.profiler.phase('resolve'):
+                        schedule_cache.sync()
+                    self._process_all_rooms()
+                    self._save_state_if_due()
             except Exception as e:
                 logger.error(f"Karar motoru hatası: {str(e)}", exc_info=True)
             
             # Bir sonraki kontrol zamanına kadar bekle
             time.sleep(self.check_interval)
     
+    def _run_event_loop(self):
+        """
+        Olay tabanlı karar döngüsü: yalnızca yeni okuması yazılan, cihaz durumu
+        değişen veya program geçiş zamanı gelen odalar değerlendirilir. Olaylar en fazla
+        check_interval'da bir toplu işlenir, kaçırılan olaylara karşı sweep_interval'da
+        bir tüm odalar taranır.
+        """
+        from schedules.schedule_cache import schedule_cache
+        from sensors.models import Room
+        
+        next_sweep = time.monotonic()
+        while self.running:
+            try:
+                # Diğer süreçlerde yapılan program değişikliklerini al; değişiklikten etkilenen
+                # odalar değerlendirilir, önbellek tamamen yenilendiyse tüm odalar taranır
+                changed_rooms = schedule_cache.sync()
+                if changed_rooms:
+                    with self._dirty_lock:
+                        self._dirty_rooms.update(changed_rooms)
+                elif changed_rooms is None:
+                    next_sweep = time.monotonic()
+                self._refresh_transitions()
+                now = time.monotonic()
+                if now >= next_sweep:
+                    with self.profiler.tick('sweep', self.check_interval):
+                        with self._dirty_lock:
+                            self._dirty_rooms.clear()
+                        self._process_all_rooms()
+                        self._save_state_if_due()
+                    next_sweep = now + self.sweep_interval
+                else:
+                    with self._dirty_lock:
+                        room_ids, self._dirty_rooms = self._dirty_rooms, set()
+                    room_ids.update(self._pop_due_transitions())
+                    if room_ids:
+                        logger.debug(f"Olay tabanlı değerlendirme: {len(room_ids)} oda")
+                        with self.profiler.tick('event', self.check_interval):
+                            with self.profiler.phase('load'):
+                                rooms = list(Room.objects.filter(id__in=room_ids))
+                            self._process_rooms(rooms)
+                            self._save_state_if_due()
+                    else:
+                        self._save_state_if_due()
+            except Exception as e:
+                logger.error(f"Karar motoru hatası: {str(e)}", exc_info=True)
+            
+            # Yeni olay, bir sonraki program geçişi, değişiklik sorgusu veya tarama zamanına kadar bekle
+            timeout = min(next_sweep - time.monotonic(), schedule_cache.seconds_until_sync())
+            if self._transitions:
+                timeout = min(timeout, self._transitions[0][0] - time.time())
+            self._wake_event.wait(max(0.0, timeout))
+            self._wake_event.clear()
+            if self.running:
+                # Art arda gelen olayları toplu işlemek için en az check_interval bekle
+                time.sleep(self.check_interval)
+    
+    def _refresh_transitions(self):
+        """Program önbelleği değiştiyse odaların bir sonraki geçiş zamanlarını yeniden hesapla"""
+        from schedules.schedule_cache import schedule_cache
+        
+        generation = schedule_cache.generation
+        if generation == self._transitions_generation:
+            return
+        
+        now = timezone.now()
+        transitions = []
+        room_schedules = schedule_cache.all_active_schedules()
+        # Eksik programları oda başına ayrı sorgu yerine tek sorguda derle
+        schedule_cache.ensure_compiled(set(room_schedules.values()))
+        for room_id, schedule_id in room_schedules.items():
+            due = schedule_cache.next_transition(schedule_id, now)
+            if due is not None:
+                transitions.append((due.timestamp() + TRANSITION_MARGIN, room_id, schedule_id))
+        heapq.heapify(transitions)
+        
+        self._transitions = transitions
+        self._transitions_generation = generation
+        logger.debug(f"Program geçiş zamanları hesaplandı: {len(transitions)} oda")
+    
+    def _pop_due_transitions(self):
+        """Geçiş zamanı gelen odaları döndür ve bir sonraki geçişlerini heap'e ekle"""
+        from datetime import datetime, timezone as dt_timezone
+        from schedules.schedule_cache import schedule_cache
+        
+        now = time.time()
+        due_rooms = set()
+        while self._transitions and self._transitions[0][0] <= now:
+            due, room_id, schedule_id = heapq.heappop(self._transitions)
+            due_rooms.add(room_id)
+            # Geçiş anının hemen sonrasından itibaren bir sonraki geçişi bul
+            next_due = schedule_cache.next_transition(schedule_id, datetime.fromtimestamp(now, tz=dt_timezone.utc))
+            if next_due is not None:
+                heapq.heappush(self._transitions, (next_due.timestamp() + TRANSITION_MARGIN, room_id, schedule_id))
+        return due_rooms
+    
+    def wake(self):
+        """Olay döngüsünü uyandır (ör. program değişikliğinden sonra geçişleri yeniden hesaplamak için)"""
+        self._wake_event.set()
+    
+    def _connect_signals(self):
+        """Olay modunda veri alım yolunun sinyallerine bağlan"""
+        if self.mode != 'event':
+            return
+        from sensors.signals import readings_committed, device_status_changed
+        
+        readings_committed.connect(self._on_readings_committed, dispatch_uid='decision_engine_readings')
+        device_status_changed.connect(self._on_device_status_changed, dispatch_uid='decision_engine_status')
+    
+    def _on_readings_committed(self, sender, room_ids, **kwargs):
+        self.enqueue_rooms(room_ids)
+    
+    def _on_device_status_changed(self, sender, room_id, changed_fields, **kwargs):
+        # Karar girdisi olmayan alan değişiklikleri (ör. pil seviyesi) için değerlendirme yapma
+        if 'valve_status' in changed_fields or 'fan_status' in changed_fields:
+            self.enqueue_rooms((room_id,))
+    
+    def enqueue_rooms(self, room_ids):
+        """Odaları bir sonraki olay tabanlı değerlendirmeye ekle"""
+        with self._dirty_lock:
+            self._dirty_rooms.update(room_ids)
+        self._wake_event.set()
+    
     def _process_all_rooms(self):
         """Tüm odalar için ısıtma ve fan kararlarını ver"""
         # Geç import yaparak döngüsel import hatalarından kaçınıyoruz
         from sensors.models import Room
         
         # Tüm odaları al
-        rooms = Room.objects.all()
-        logger.info(f"Toplam {rooms.count()} oda kontrol ediliyor")
+        with self.profiler.phase('load'):
+            rooms = list(Room.objects.all())
+        logger.info(f"Toplam {len(rooms)} oda kontrol ediliyor")
         
-        for room in rooms:
-            try:
-                self._process_room(room)
-            except Exception as e:
-                logger.error(f"Oda {room.id} işlenirken hata: {str(e)}")
+        self._process_rooms(rooms)
+        
+        # Silinen odaların kararlarını unut
+        room_ids = {room.id for room in rooms}
+        for room_id in [room_id for room_id in self._decisions if room_id not in room_ids]:
+            del self._decisions[room_id]
     
     def _process_room(self, room):
         """Belirli bir oda için ısıtma ve fan kararlarını ver"""
-        # Geç import yaparak döngüsel import hatalarından kaçınıyoruz
-        from sensors.models import SensorReading, DeviceStatus
-        from schedules.models import RoomSchedule
+        self._process_rooms([room])
+    
+    def _process_rooms(self, rooms):
+        """
+        Odalar için ısıtma ve fan kararlarını ver.
+        Oda başına sorgu yapılmaz: gerekli veriler birkaç toplu sorguyla yüklenir,
+        değişen cihaz alanları alan ve değer başına tek bir UPDATE ile yazılır.
+        """
+        from schedules.schedule_cache import schedule_cache
+        
+        if not rooms:
+            return
+        
+        profiler = self.profiler
+        room_ids = [room.id for room in rooms]
+        profiler.add_rooms(len(room_ids))
+        with profiler.phase('load'):
+            latest_temperatures = self._load_latest_temperatures(room_ids)
+            device_statuses = self._load_device_statuses(room_ids)
+            # Tick başındaki cihaz durumları: yalnızca bu tick'te değişen alanlar yazılır
+            loaded_states = {
+                room_id: (device_status.valve_status, device_status.fan_status)
+                for room_id, device_status in device_statuses.items()
+            }
+        
+        with profiler.phase('resolve'):
+            # Aktif programlar ve şu anki zaman dilimleri derlenmiş program tablolarından (veritabanına gitmez)
+            active_schedules = schedule_cache.active_schedules(room_ids)
+            current_slots = schedule_cache.current_slots(set(active_schedules.values()), timezone.now())
+        
+        # Komut gönderimi (_control_heating/_control_fan) 'publish' aşamasına sayılır
+        with profiler.phase('decide'):
+            if self.evaluation == 'vectorized' and self._vectorized_available():
+                self._evaluate_rooms_vectorized(
+                    room_ids, latest_temperatures, device_statuses, active_schedules, current_slots
+                )
+            else:
+                self._evaluate_rooms(rooms, latest_temperatures, device_statuses, active_schedules, current_slots)
+        
+        with profiler.phase('persist'):
+            self._record_decisions(room_ids, device_statuses)
+            self._save_changed_statuses(device_statuses, loaded_states)
+    
+    def _save_changed_statuses(self, device_statuses, loaded_states):
+        """
+        Gönderilen komutlara göre cihaz durumlarını güncelle. Yalnızca bu tick'te değişen alan
+        yazılır; tick sırasında gelen cihaz onayları, birleştiricinin ve manuel kontrolün
+        güncellemeleri diğer alanlarda korunur. Aynı alan ve değere sahip kayıtlar tek
+        UPDATE ile yazılır (en fazla 4 sorgu).
+        """
+        from sensors.models import DeviceStatus
+        
+        groups = {}  # (alan, değer) -> [DeviceStatus ID]
+        for room_id, device_status in device_statuses.items():
+            valve_status, fan_status = loaded_states[room_id]
+            if device_status.valve_status != valve_status:
+                groups.setdefault(('valve_status', device_status.valve_status), []).append(device_status.id)
+            if device_status.fan_status != fan_status:
+                groups.setdefault(('fan_status', device_status.fan_status), []).append(device_status.id)
+        
+        now = timezone.now()
+        for (field, value), ids in groups.items():
+            DeviceStatus.objects.filter(id__in=ids).update(**{field: value, 'last_updated': now})
+    
+    def _record_decisions(self, room_ids, device_statuses):
+        """Değerlendirilen odaların son kararlarını sakla (tolerans bandındaki vana durumu DeviceStatus'ta kalıcıdır)"""
+        from schedules.engine_state import RoomDecision
+        
+        decided_at = time.time()
+        for room_id in room_ids:
+            device_status = device_statuses[room_id]
+            self._decisions[room_id] = RoomDecision(device_status.valve_status, device_status.fan_status, decided_at)
+    
+    def _save_state_if_due(self):
+        now = time.monotonic()
+        if now >= self._next_state_save:
+            self._next_state_save = now + self.state_save_interval
+            self._save_state()
+    
+    def _save_state(self):
+        """Son kararları, komut birleştirici durumunu ve onay bekleyen komutları dosyaya yaz"""
+        from schedules.command_coalescer import command_coalescer
+        from schedules.engine_state import write_snapshot
         from sensors.mqtt_client import mqtt_client
         
-        # Son sensör verilerini al
-        latest_reading = SensorReading.objects.filter(room=room).order_by('-timestamp').first()
-        if not latest_reading:
-            logger.warning(f"Oda {room.id} için sensör verisi bulunamadı, atlanıyor")
+        if not self.state_file:
             return
+        try:
+            with self.profiler.phase('persist'):
+                write_snapshot(
+                    self.state_file,
+                    dict(self._decisions),
+                    command_coalescer.export_state(),
+                    mqtt_client.command_queue.export_pending()
+                )
+        except Exception as e:
+            logger.error(f"Karar motoru durumu kaydedilemedi: {str(e)}")
+    
+    def _restore_state(self):
+        """Son kaydedilen durumu yükle (başlatılırken, döngü başlamadan önce)"""
+        from schedules.command_coalescer import command_coalescer
+        from schedules.engine_state import read_snapshot
+        from sensors.mqtt_client import mqtt_client
         
-        # Oda cihaz durumunu al
-        device_status, created = DeviceStatus.objects.get_or_create(room=room)
+        if not self.state_file:
+            return
+        snapshot = read_snapshot(self.state_file, self.state_max_age)
+        if snapshot is None:
+            return
+        
+        # Kararlar bilgi amaçlıdır, henüz değerlendirilmemiş odalar için bir sonraki kayda taşınır
+        self._decisions = dict(snapshot['decisions'])
+        coalescer_count = command_coalescer.restore_state(snapshot['coalescer'])
+        pending_count = mqtt_client.command_queue.restore_pending(snapshot['pending_commands'])
+        logger.info(
+            f"Karar motoru durumu yüklendi: {len(self._decisions)} oda kararı, "
+            f"{coalescer_count} cihaz komut geçmişi, {pending_count} onay bekleyen komut"
+        )
+    
+    def _evaluate_rooms(self, rooms, latest_temperatures, device_statuses, active_schedules, current_slots):
+        """Odaları tek tek değerlendir, durumu değişen DeviceStatus kayıtlarını döndür"""
+        changed_statuses = []
+        for room in rooms:
+            try:
+                device_status = device_statuses[room.id]
+                schedule_id = active_schedules.get(room.id)
+                changed = self._evaluate_room(
+                    room,
+                    latest_temperatures.get(room.id),
+                    device_status,
+                    schedule_id,
+                    current_slots.get(schedule_id)
+                )
+                if changed:
+                    changed_statuses.append(device_status)
+            except Exception as e:
+                logger.error(f"Oda {room.id} işlenirken hata: {str(e)}")
+        return changed_statuses
+    
+    def _vectorized_available(self):
+        from schedules import vectorized
+        
+        if vectorized.available():
+            return True
+        logger.warning("NumPy yüklü değil, oda bazlı değerlendirmeye dönülüyor")
+        self.evaluation = 'scalar'
+        return False
+    
+    def _evaluate_rooms_vectorized(self, room_ids, latest_temperatures, device_statuses, active_schedules,
+                                   current_slots):
+        """
+        Tüm odaları dizilerle tek geçişte değerlendir; yalnızca istenen durumu mevcut durumdan
+        farklı olan cihazlar için komut iletilir. Durumu değişen DeviceStatus kayıtlarını döndürür.
+        """
+        import numpy as np
+        from schedules.command_coalescer import command_coalescer
+        from schedules.vectorized import FleetArrays, evaluate_fleet
+        
+        arrays = FleetArrays.build(
+            room_ids, latest_temperatures, device_statuses, active_schedules, current_slots,
+            self.temperature_threshold
+        )
+        decision = evaluate_fleet(arrays)
+        
+        has_temperature = ~np.isnan(arrays.temperature)
+        missing = len(arrays) - int(np.count_nonzero(has_temperature))
+        if missing:
+            logger.warning(f"{missing} oda için sensör verisi bulunamadı, atlanıyor")
+        
+        if self.profiler.current is not None:
+            # Oda bazlı değerlendirmeyle aynı atlama/kapatma nedenleri
+            controlled = decision.valve_controlled | decision.fan_controlled
+            no_slot = controlled & np.isnan(arrays.setpoint)
+            has_schedule = np.fromiter((room_id in active_schedules for room_id in room_ids), dtype=bool,
+                                       count=len(room_ids))
+            self.profiler.count('skipped', 'no_temperature', missing)
+            self.profiler.count('skipped', 'manual', int(np.count_nonzero(has_temperature & ~controlled)))
+            self.profiler.count('forced_off', 'no_schedule', int(np.count_nonzero(no_slot & ~has_schedule)))
+            self.profiler.count('forced_off', 'no_slot', int(np.count_nonzero(no_slot & has_schedule)))
+        
+        # Cihaz zaten istenen durumda olsa da bekleyen (ertelenmiş) istekler birleştiriciye
+        # bildirilmeli ki iptal edilsin
+        valve_changed = decision.valve_changed.copy()
+        fan_changed = decision.fan_changed.copy()
+        pending = command_coalescer.pending_keys()
+        if pending:
+            index_of = {room_id: index for index, room_id in enumerate(room_ids)}
+            for room_id, device in pending:
+                index = index_of.get(room_id)
+                if index is None:
+                    continue
+                if device == 'valve' and decision.valve_controlled[index]:
+                    valve_changed[index] = True
+                elif device == 'fan' and decision.fan_controlled[index]:
+                    fan_changed[index] = True
+        
+        changed = set()
+        for index in np.flatnonzero(valve_changed):
+            device_status = device_statuses[room_ids[index]]
+            if self._control_heating(device_status, bool(decision.valve[index])):
+                changed.add(index)
+        for index in np.flatnonzero(fan_changed):
+            device_status = device_statuses[room_ids[index]]
+            if self._control_fan(device_status, bool(decision.fan[index])):
+                changed.add(index)
+        
+        logger.info(
+            f"Toplu değerlendirme: {len(room_ids)} oda, "
+            f"{int(np.count_nonzero(decision.valve_changed))} vana ve "
+            f"{int(np.count_nonzero(decision.fan_changed))} fan değişikliği"
+        )
+        return [device_statuses[room_ids[index]] for index in sorted(changed)]
+    
+    def _evaluate_room(self, room, current_temperature, device_status, schedule_id, current_time_slot):
+        """
+        Tek oda için kararları ver ve komutları ilet.
+        Cihaz durumu değiştiyse True döndürür (kaydetme çağıran tarafından toplu yapılır).
+        """
+        if current_temperature is None:
+            logger.warning(f"Oda {room.id} için sensör verisi bulunamadı, atlanıyor")
+            self.profiler.count('skipped', 'no_temperature')
+            return False
         
         # Kontrol modlarını kontrol et
         heating_schedule_active = device_status.heating_control_mode == 'schedule'
@@ -100,55 +488,43 @@ class DecisionEngine:
         # Eğer her iki sistem de manuel kontroldeyse, hiçbir şey yapma
         if not heating_schedule_active and not fan_schedule_active:
             logger.debug(f"Oda {room.id} için tüm sistemler manuel kontrol modunda, atlanıyor")
-            return
-        
-        # Aktif programı kontrol et
-        active_schedule = self._get_active_schedule(room)
+            self.profiler.count('skipped', 'manual')
+            return False
         
-        # Eğer aktif program yoksa, atla
-        if not active_schedule:
-            logger.warning(f"Oda {room.id} için aktif program bulunamadı, sistemleri kapatıyorum")
-            # Program yoksa, ısıtma ve fanları kapat
-            if heating_schedule_active:
-                self._control_heating(room.id, False)
-            if fan_schedule_active:
-                self._control_fan(room.id, False)
-            return
-        
-        # Şu anki gün ve saat için program ayarlarını bul
-        current_time_slot = self._get_current_time_slot(active_schedule)
+        changed = False
         
-        # Eğer şu an için bir zaman dilimi bulunamazsa, sistemleri kapat
-        if not current_time_slot:
-            logger.info(f"Oda {room.id} için aktif zaman dilimi bulunamadı, sistemleri kapatıyorum")
-            # Aktif zaman dilimi yoksa, ısıtma ve fanları kapat
+        # Aktif program veya şu an için zaman dilimi yoksa, ısıtma ve fanları kapat
+        if schedule_id is None or current_time_slot is None:
+            if schedule_id is None:
+                logger.warning(f"Oda {room.id} için aktif program bulunamadı, sistemleri kapatıyorum")
+                self.profiler.count('forced_off', 'no_schedule')
+            else:
+                logger.info(f"Oda {room.id} için aktif zaman dilimi bulunamadı, sistemleri kapatıyorum")
+                self.profiler.count('forced_off', 'no_slot')
             if heating_schedule_active:
-                self._control_heating(room.id, False)
+                changed |= self._control_heating(device_status, False)
             if fan_schedule_active:
-                self._control_fan(room.id, False)
-            return
+                changed |= self._control_fan(device_status, False)
+            return changed
         
         # Sıcaklık hedefini ve fan/ısıtma ayarlarını al
         desired_temperature = current_time_slot.desired_temperature
         is_heating_active = current_time_slot.is_heating_active
         is_fan_active = current_time_slot.is_fan_active
         
-        # Mevcut sıcaklığı al
-        current_temperature = latest_reading.temperature
-        
         # Isıtma kontrolü (sadece schedule modundaysa)
         if heating_schedule_active:
             if is_heating_active:
                 # Sıcaklık kontrol toleransına göre ısıtmayı açıp kapat
                 if current_temperature < desired_temperature - self.temperature_threshold:
                     # Sıcaklık düşük, ısıtmayı aç
-                    self._control_heating(room.id, True)
+                    changed |= self._control_heating(device_status, True)
                 elif current_temperature > desired_temperature + self.temperature_threshold:
                     # Sıcaklık yüksek, ısıtmayı kapat
-                    self._control_heating(room.id, False)
+                    changed |= self._control_heating(device_status, False)
             else:
                 # Isıtma programda kapalı, kapalı tut
-                self._control_heating(room.id, False)
+                changed |= self._control_heating(device_status, False)
             
             logger.info(
                 f"Oda {room.id} ısıtma - Şu anki: {current_temperature}°C, Hedef: {desired_temperature}°C, "
@@ -157,100 +533,96 @@ class DecisionEngine:
         
         # Fan kontrolü (sadece schedule modundaysa)
         if fan_schedule_active:
-            if is_fan_active:
-                # Fan durumunu programdan al
-                self._control_fan(room.id, True)
-            else:
-                # Fan programda kapalı
-                self._control_fan(room.id, False)
+            # Fan durumunu programdan al
+            changed |= self._control_fan(device_status, is_fan_active)
             
             logger.info(
                 f"Oda {room.id} fan - Program Aktif: {is_fan_active}, "
                 f"Fan: {'Açık' if device_status.fan_status else 'Kapalı'}"
             )
-    
-    def _get_current_time_slot(self, schedule):
-        """Şu anki gün ve saat için program ayarlarını bul"""
-        from schedules.models import ScheduleTime
-        from django.db.models import F
         
-        now = timezone.now()
+        return changed
+    
+    def _load_latest_temperatures(self, room_ids):
+        """Odaların son sıcaklıkları: önce bellekten (deadband), eksikler için tek sorgu"""
+        from django.db.models import OuterRef, Subquery
+        from sensors.deadband import deadband_filter
+        from sensors.models import Room, SensorReading
         
-        # Şu anki günü bul (1-7, Pazartesi-Pazar)
-        current_day_of_week = now.weekday() + 1  # Django günleri 0-6, biz 1-7 kullanıyoruz
-        current_time = now.time()
+        temperatures = {}
+        missing = []
+        for room_id in room_ids:
+            reading = deadband_filter.latest(room_id)
+            if reading is None:
+                missing.append(room_id)
+            else:
+                temperatures[room_id] = reading.temperature
         
-        # Günü ve şu anki saate uygun program ayarını bul
-        try:
-            return ScheduleTime.objects.filter(
-                schedule_id=schedule,
-                day_id=current_day_of_week,
-                hour_id__start_time__lte=current_time,
-                hour_id__end_time__gte=current_time
-            ).first()
-        except Exception as e:
-            logger.error(f"Zaman dilimi bulma hatası: {str(e)}")
-            return None
+        if missing:
+            latest_temperature = SensorReading.objects.filter(
+                room=OuterRef('pk')
+            ).order_by('-timestamp').values('temperature')[:1]
+            temperatures.update(
+                Room.objects.filter(id__in=missing)
+                .annotate(latest_temperature=Subquery(latest_temperature))
+                .values_list('id', 'latest_temperature')
+            )
+        return temperatures
     
-    def _control_heating(self, room_id, turn_on):
-        """Isıtma kontrolü (vanaları aç/kapat)"""
+    def _load_device_statuses(self, room_ids):
+        """Odaların cihaz durumları (oda ID -> DeviceStatus), olmayanlar oluşturulur"""
         from sensors.models import DeviceStatus
-        from sensors.mqtt_client import mqtt_client
         
-        # Mevcut durumu kontrol et
-        try:
-            device_status = DeviceStatus.objects.get(room_id=room_id)
-            
-            # Eğer durum zaten istenilen gibi ise, işlem yapma
-            if device_status.valve_status == turn_on:
-                return
-            
-            # MQTT ile vanayı kontrol et
-            if mqtt_client.is_connected and mqtt_client.publish_valve_command(room_id, turn_on):
-                # Veritabanındaki durumu güncelle
-                device_status.valve_status = turn_on
-                device_status.save(update_fields=['valve_status', 'last_updated'])
-                
-                logger.info(f"Oda {room_id} - Vana durumu güncellendi: {'Açık' if turn_on else 'Kapalı'}")
-            else:
-                logger.warning(f"Oda {room_id} için MQTT vana komutu gönderilemedi")
-        except DeviceStatus.DoesNotExist:
-            logger.warning(f"Oda {room_id} için cihaz durumu bulunamadı")
+        statuses = {}
+        for device_status in DeviceStatus.objects.filter(room_id__in=room_ids).order_by('-id'):
+            statuses[device_status.room_id] = device_status  # Birden fazla kayıt varsa en eskisi kullanılır
+        
+        missing = [room_id for room_id in room_ids if room_id not in statuses]
+        if missing:
+            DeviceStatus.objects.bulk_create([DeviceStatus(room_id=room_id) for room_id in missing])
+            for device_status in DeviceStatus.objects.filter(room_id__in=missing):
+                statuses.setdefault(device_status.room_id, device_status)
+        return statuses
     
-    def _control_fan(self, room_id, turn_on):
-        """Fan kontrolü (fanları aç/kapat)"""
-        from sensors.models import DeviceStatus
-        from sensors.mqtt_client import mqtt_client
+    def _control_heating(self, device_status, turn_on):
+        """Isıtma kontrolü (vanaları aç/kapat), durum değiştiyse True döndürür"""
+        from schedules.command_coalescer import command_coalescer
         
-        # Mevcut durumu kontrol et
-        try:
-            device_status = DeviceStatus.objects.get(room_id=room_id)
-            
-            # Eğer durum zaten istenilen gibi ise, işlem yapma
-            if device_status.fan_status == turn_on:
-                return
-            
-            # MQTT ile fanı kontrol et
-            if mqtt_client.is_connected and mqtt_client.publish_fan_command(room_id, turn_on):
-                # Veritabanındaki durumu güncelle
-                device_status.fan_status = turn_on
-                device_status.save(update_fields=['fan_status', 'last_updated'])
-                
-                logger.info(f"Oda {room_id} için fan durumu güncellendi: {'Açık' if turn_on else 'Kapalı'}")
-            else:
-                logger.warning(f"Oda {room_id} için MQTT fan komutu gönderilemedi")
-        except DeviceStatus.DoesNotExist:
-            logger.warning(f"Oda {room_id} için cihaz durumu bulunamadı")
-
-
-    def _get_active_schedule(self, room):
-        """Oda için aktif programı bul"""
-        from schedules.models import RoomSchedule
-        try:
-            active_room_schedule = RoomSchedule.objects.get(room_id=room, is_active=True)
-            return active_room_schedule.schedule_id
-        except RoomSchedule.DoesNotExist:
-            return None
+        room_id = device_status.room_id
+        
+        # Komut birleştiriciye ilet: durum zaten istenilen gibiyse gönderilmez,
+        # son yön değişiminden bu yana bekleme süresi dolmadıysa ertelenir. Gönderim
+        # zamanlayıcısına alınan komut ('queued') gönderilince DeviceStatus'u birleştirici günceller
+        with self.profiler.phase('publish'):
+            result = command_coalescer.request(room_id, 'valve', turn_on, current=device_status.valve_status)
+        if result != 'suppressed':
+            self.profiler.count('commands', result)
+        if result == 'sent':
+            device_status.valve_status = turn_on
+            logger.info(f"Oda {room_id} - Vana durumu güncellendi: {'Açık' if turn_on else 'Kapalı'}")
+            return True
+        if result == 'failed':
+            logger.warning(f"Oda {room_id} için MQTT vana komutu gönderilemedi")
+        return False
+    
+    def _control_fan(self, device_status, turn_on):
+        """Fan kontrolü (fanları aç/kapat), durum değiştiyse True döndürür"""
+        from schedules.command_coalescer import command_coalescer
+        
+        room_id = device_status.room_id
+        
+        # Komut birleştiriciye ilet (bkz. _control_heating)
+        with self.profiler.phase('publish'):
+            result = command_coalescer.request(room_id, 'fan', turn_on, current=device_status.fan_status)
+        if result != 'suppressed':
+            self.profiler.count('commands', result)
+        if result == 'sent':
+            device_status.fan_status = turn_on
+            logger.info(f"Oda {room_id} için fan durumu güncellendi: {'Açık' if turn_on else 'Kapalı'}")
+            return True
+        if result == 'failed':
+            logger.warning(f"Oda {room_id} için MQTT fan komutu gönderilemedi")
+        return False
 
 # Singleton instance
 decision_engine = DecisionEngine()
\ No newline at end of file
@@ -0,0 +1,293 @@
+# schedules/dispatcher.py
+import heapq
+import logging
+import threading
+import time
+import zlib
+from django.conf import settings
+from django.db import connection
+from sensors.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+def room_jitter(room_id, device, window):
+    """Oda ve cihaz için [0, window) aralığında deterministik gecikme (her çalıştırmada aynı)"""
+    return zlib.crc32(f"{room_id}:{device}".encode()) / 2 ** 32 * window
+
+
+class _QueuedCommand:
+    """Gönderim zamanını bekleyen tek bir komut"""
+
+    __slots__ = ('value', 'submitted_at', 'due', 'burst', 'callback')
+
+    def __init__(self, value, submitted_at, due, burst, callback=None):
+        self.value = value
+        self.submitted_at = submitted_at  # monotonic
+        self.due = due  # monotonic
+        self.burst = burst  # Ait olduğu yoğunluk (burst) numarası
+        self.callback = callback  # callback(room_id, device, value), komut kuyruğuna iletilince çağrılır
+
+
+class CommandDispatcher:
+    """
+    Komut birleştirici ile MQTT komut kuyruğu arasındaki zamanlayıcı.
+
+    Program sınırlarında (ör. 06:00) çok sayıda oda aynı anda komut üretir. Bir saniye
+    içinde BURST_THRESHOLD'dan fazla komut gelirse, eşiği aşan komutlar WINDOW saniyelik
+    pencereye oda bazlı deterministik gecikmeyle yayılır. Tüm gönderimler ayrıca MAX_RATE
+    komut/saniye ile sınırlandırılır (token bucket). Böylece cihaz onayları da
+    _process_device_status'a tek seferde gelmez.
+
+    Kuyruktaki bir komut için yeni istek gelirse değer güncellenir, gönderim zamanı korunur.
+    Gönderim zamanı gelen komut onay takipli MQTT komut kuyruğuna (CommandQueue) iletilir;
+    bağlantı kopukluğunda ve onay gelmediğinde yeniden deneme yalnızca orada yapılır. İletim,
+    komutla verilen callback'e bildirilir (komut birleştirici cihaz durumunu ancak o zaman günceller).
+    """
+
+    def __init__(self):
+        dispatch_settings = getattr(settings, 'COMMAND_DISPATCH', {})
+        self.window = dispatch_settings.get('WINDOW', 30)  # saniye
+        self.burst_threshold = dispatch_settings.get('BURST_THRESHOLD', 10)  # komut/saniye
+        self.max_rate = dispatch_settings.get('MAX_RATE', 20)  # komut/saniye
+        self.drain_timeout = dispatch_settings.get('DRAIN_TIMEOUT', 5)  # saniye, kapatılırken kuyruğu boşaltma süresi
+
+        self._queued = {}  # (room_id, device) -> _QueuedCommand
+        self._heap = []  # (due, sıra, (room_id, device))
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._thread = None
+        self.running = False
+
+        # Yoğunluk tespiti: son bir saniyede gelen komutlar
+        self._burst = 0
+        self._burst_started = 0.0
+        self._burst_size = 0
+
+        # Token bucket
+        self._tokens = float(self.max_rate)
+        self._tokens_updated = time.monotonic()
+
+        self.latency = Histogram()  # Kuyrukta bekleme süresi (saniye)
+        self.dispatched_count = 0
+        self.replaced_count = 0  # Kuyruktaki komut daha yeni bir istekle güncellendi
+        self.spread_count = 0  # Pencereye yayılan komutlar
+        self.handed_over_count = 0  # Kapatılırken gönderim zamanı beklenmeden komut kuyruğuna devredilen
+        self._last_burst = None  # [numara, komut sayısı, ilk gönderim, son gönderim]
+
+    def start(self):
+        """Gönderim thread'ini başlat"""
+        if self.running:
+            return
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run_dispatch_loop, name='command-dispatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Thread'i durdur. Kuyrukta kalan komutlar hız sınırına uyarak DRAIN_TIMEOUT süresince
+        gönderilir; kalanlar hız sınırına göre aralıklı gönderilmek üzere MQTT komut kuyruğuna
+        devredilir (karar motoru durum dosyasına da yazılır, yeniden başlatmadan sonra gönderilir).
+        """
+        if not self.running:
+            return
+
+        self.running = False
+        self._wake_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(2.0)  # Maksimum 2 saniye bekle
+        self._thread = None
+
+        sent = self._drain(time.monotonic() + self.drain_timeout)
+
+        with self._lock:
+            remaining = sorted(self._queued.items(), key=lambda item: item[1].due)
+            self._queued = {}
+            self._heap = []
+        if remaining:
+            self._hand_over(remaining)
+        if sent or remaining:
+            logger.info(
+                f"Kapatılırken kuyruktaki {sent} komut gönderildi, {len(remaining)} komut "
+                f"komut kuyruğuna devredildi"
+            )
+
+    def submit(self, room_id, device, value, immediate=False, callback=None):
+        """
+        Komutu gönderim kuyruğuna al: 'queued' döner, komut MQTT komut kuyruğuna iletilince
+        callback(room_id, device, value) çağrılır. Thread çalışmıyorsa veya immediate=True ise
+        (ör. manuel kontrol) komut hemen gönderilir ve 'sent' veya 'failed' döner.
+        """
+        key = (int(room_id), device)
+        now = time.monotonic()
+
+        if immediate or not self.running:
+            with self._lock:
+                # Kuyrukta aynı cihaz için daha eski bir komut varsa iptal et
+                self._queued.pop(key, None)
+            return 'sent' if self._publish(key[0], device, value) else 'failed'
+
+        with self._lock:
+            existing = self._queued.get(key)
+            if existing is not None:
+                existing.value = value
+                existing.callback = callback
+                self.replaced_count += 1
+                return 'queued'
+
+            if now - self._burst_started >= 1.0:
+                self._burst += 1
+                self._burst_started = now
+                self._burst_size = 0
+            self._burst_size += 1
+
+            due = now
+            if self._burst_size > self.burst_threshold and self.window > 0:
+                due = self._burst_started + room_jitter(key[0], device, self.window)
+                self.spread_count += 1
+
+            self._queued[key] = _QueuedCommand(value, now, due, self._burst, callback)
+            self._sequence += 1
+            heapq.heappush(self._heap, (due, self._sequence, key))
+
+        self._wake_event.set()
+        return 'queued'
+
+    def stats(self):
+        """Kuyruk durumu, bekleme süresi dağılımı ve son yoğunluğun yayılımı"""
+        with self._lock:
+            queued = len(self._queued)
+            last_burst = self._last_burst
+        return {
+            'queued': queued,
+            'dispatched': self.dispatched_count,
+            'replaced': self.replaced_count,
+            'spread': self.spread_count,
+            'handed_over': self.handed_over_count,
+            'queue_latency_seconds': self.latency.as_dict(),
+            'last_burst': {
+                'commands': last_burst[1],
+                'spread_seconds': last_burst[3] - last_burst[2],
+            } if last_burst else None,
+        }
+
+    def _publish(self, room_id, device, value):
+        """Hemen gönderim (immediate): broker'a bağlı değilse False"""
+        from sensors.mqtt_client import mqtt_client
+
+        if device == 'valve':
+            return mqtt_client.publish_valve_command(room_id, value)
+        return mqtt_client.publish_fan_command(room_id, value)
+
+    def _enqueue(self, room_id, device, value, delay=0.0):
+        """Komutu onay takipli MQTT komut kuyruğuna ilet; bağlantı yoksa kuyruk yeniden dener"""
+        from sensors.mqtt_client import mqtt_client
+
+        mqtt_client.command_queue.submit(room_id, device, value, delay=delay)
+
+    def _take_token(self, now):
+        """Token bucket: gönderim hakkı varsa True, yoksa bir sonraki token'a kalan süre"""
+        self._tokens = min(float(self.max_rate), self._tokens + (now - self._tokens_updated) * self.max_rate)
+        self._tokens_updated = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True, 0.0
+        return False, (1.0 - self._tokens) / self.max_rate
+
+    def _dispatch(self, key, command, now):
+        """Komutu MQTT komut kuyruğuna ilet ve sonucu bildir"""
+        room_id, device = key
+        self._enqueue(room_id, device, command.value)
+        self.dispatched_count += 1
+        self.latency.observe(now - command.submitted_at)
+        self._track_burst(command, now)
+        self._notify(key, command)
+
+    def _track_burst(self, command, now):
+        last_burst = self._last_burst
+        if last_burst is None or last_burst[0] != command.burst:
+            self._last_burst = [command.burst, 1, now, now]
+        else:
+            last_burst[1] += 1
+            last_burst[3] = now
+
+    def _notify(self, key, command):
+        if command.callback is None:
+            return
+        try:
+            command.callback(key[0], key[1], command.value)
+        except Exception as e:
+            logger.error(f"Komut gönderim sonucu işlenirken hata: {str(e)}", exc_info=True)
+
+    def _next_due(self, now, ignore_due=False):
+        """Gönderim zamanı gelen ve hız sınırına takılmayan komut: (key, komut, bekleme süresi)"""
+        with self._lock:
+            while self._heap:
+                due, _, key = self._heap[0]
+                command = self._queued.get(key)
+                if command is None or command.due != due:
+                    heapq.heappop(self._heap)  # Gönderilmiş veya yeniden zamanlanmış komutun eski kaydı
+                    continue
+                if due > now and not ignore_due:
+                    return None, None, due - now
+                allowed, wait = self._take_token(now)
+                if not allowed:
+                    return None, None, wait
+                heapq.heappop(self._heap)
+                del self._queued[key]
+                return key, command, 0.0
+        return None, None, None
+
+    def _drain(self, deadline):
+        """Kuyruğu gönderim zamanlarını beklemeden, hız sınırına uyarak deadline'a kadar gönder"""
+        sent = 0
+        while True:
+            now = time.monotonic()
+            key, command, wait = self._next_due(now, ignore_due=True)
+            if command is not None:
+                self._dispatch(key, command, now)
+                sent += 1
+                continue
+            if wait is None or now + wait > deadline:
+                return sent
+            time.sleep(wait)
+
+    def _hand_over(self, commands):
+        """
+        Kalan komutları MQTT komut kuyruğuna devret. Komut kuyruğu onları hız sınırına göre
+        aralıklı gönderir; çağıran tarafa iletilmiş olarak bildirilir.
+        """
+        for index, (key, command) in enumerate(commands):
+            self._enqueue(key[0], key[1], command.value, delay=(index + 1) / self.max_rate)
+            self._notify(key, command)
+        self.handed_over_count += len(commands)
+
+    def _run_dispatch_loop(self):
+        """Gönderim zamanı gelen komutları hız sınırına uyarak gönder"""
+        try:
+            while self.running:
+                timeout = 0.5
+                try:
+                    while self.running:
+                        now = time.monotonic()
+                        key, command, wait = self._next_due(now)
+                        if command is None:
+                            if wait is not None:
+                                timeout = min(timeout, wait)
+                            break
+                        self._dispatch(key, command, now)
+                except Exception as e:
+                    logger.error(f"Komut gönderim döngüsünde hata: {str(e)}", exc_info=True)
+
+                self._wake_event.wait(timeout)
+                self._wake_event.clear()
+        finally:
+            # Bu thread'e ait veritabanı bağlantısını kapat (gönderim sonucu callback'leri)
+            connection.close()
+
+
+# Singleton instance oluştur
+command_dispatcher = CommandDispatcher()
@@ -0,0 +1,91 @@
+# schedules/engine_state.py
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# 2: Kararlardan histerezis konumu çıkarıldı (tolerans bandı içindeki vana durumu DeviceStatus'ta kalıcı)
+SNAPSHOT_VERSION = 2
+
+
+class RoomDecision:
+    """Karar motorunun bir oda için verdiği son karar"""
+
+    __slots__ = ('valve', 'fan', 'decided_at')
+
+    def __init__(self, valve, fan, decided_at):
+        self.valve = valve
+        self.fan = fan
+        self.decided_at = decided_at  # epoch saniye
+
+    def to_list(self):
+        return [self.valve, self.fan, self.decided_at]
+
+    @classmethod
+    def from_list(cls, values):
+        valve, fan, decided_at = values
+        return cls(bool(valve), bool(fan), float(decided_at))
+
+
+def write_snapshot(path, decisions, coalescer_state, pending_commands):
+    """
+    Karar motoru durumunu atomik olarak JSON dosyasına yaz.
+    decisions: oda ID -> RoomDecision
+    coalescer_state: CommandCoalescer.export_state() çıktısı
+    pending_commands: CommandQueue.export_pending() çıktısı
+    """
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'saved_at': time.time(),
+        'pid': os.getpid(),
+        'decisions': {str(room_id): decision.to_list() for room_id, decision in decisions.items()},
+        'coalescer': coalescer_state,
+        'pending_commands': pending_commands,
+    }
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+def read_snapshot(path, max_age=None):
+    """
+    Snapshot dosyasını oku. Dosya yoksa, bozuksa, sürümü farklıysa veya max_age
+    saniyeden eskiyse None döner. Kararlar oda ID -> RoomDecision olarak çözülür.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Karar motoru durum dosyası okunamadı ({path}): {str(e)}")
+        return None
+
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        logger.warning(f"Karar motoru durum dosyası sürümü desteklenmiyor: {snapshot.get('version')}")
+        return None
+
+    age = time.time() - snapshot.get('saved_at', 0)
+    if max_age is not None and age > max_age:
+        logger.info(f"Karar motoru durum dosyası çok eski ({age:.0f}s), kullanılmıyor")
+        return None
+
+    try:
+        snapshot['decisions'] = {
+            int(room_id): RoomDecision.from_list(values)
+            for room_id, values in snapshot.get('decisions', {}).items()
+        }
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Karar motoru durum dosyası bozuk: {str(e)}")
+        return None
+    snapshot.setdefault('coalescer', [])
+    snapshot.setdefault('pending_commands', [])
+    return snapshot
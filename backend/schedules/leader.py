@@ -0,0 +1,262 @@
+# schedules/leader.py
+import logging
+import os
+import socket
+import sys
+import threading
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseLease:
+    """
+    Veritabanındaki EngineLease satırı ile liderlik.
+    Birden fazla sunucuda çalışır; sunucu saatlerinin senkron olduğu varsayılır.
+    """
+
+    def __init__(self, name, owner, ttl):
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+
+    def acquire(self):
+        """Kiralamayı al veya yenile, lider olunduysa True"""
+        from schedules.models import EngineLease
+
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+
+        # Kiralama bizdeyse veya süresi dolduysa tek bir koşullu UPDATE ile al
+        updated = EngineLease.objects.filter(name=self.name).filter(
+            Q(owner=self.owner) | Q(expires_at__lte=now)
+        ).update(owner=self.owner, expires_at=expires_at, renewed_at=now)
+        if updated:
+            return True
+
+        if EngineLease.objects.filter(name=self.name).exists():
+            return False
+
+        # İlk kez: kiralama satırını oluştur (aynı anda oluşturan diğer süreç kazanır)
+        try:
+            EngineLease.objects.create(name=self.name, owner=self.owner, expires_at=expires_at, renewed_at=now)
+            return True
+        except IntegrityError:
+            return False
+
+    def release(self):
+        """Kiralamayı hemen bırak, böylece diğer süreçler TTL beklemeden devralır"""
+        from schedules.models import EngineLease
+
+        EngineLease.objects.filter(name=self.name, owner=self.owner).update(expires_at=timezone.now())
+
+    def current_owner(self):
+        from schedules.models import EngineLease
+
+        lease = EngineLease.objects.filter(name=self.name, expires_at__gt=timezone.now()).first()
+        return lease.owner if lease else None
+
+
+class FileLease:
+    """
+    Dosya kilidi ile liderlik (tek sunuculu kurulumlar için).
+    Süreç öldüğünde kilidi işletim sistemi bırakır, yenileme gerekmez.
+    """
+
+    def __init__(self, path, owner):
+        self.path = path
+        self.owner = owner
+        self._file = None
+
+    def acquire(self):
+        if self._file is not None:
+            return True
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        # Kilidi tutan süreci dosyaya yaz (yalnızca bilgi amaçlı)
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(self.owner)
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def current_owner(self):
+        if self._file is not None:
+            return self.owner
+        try:
+            with open(self.path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+
+class LeaderElection:
+    """
+    Karar motoru ve zamanlayıcı için süreçler arası lider seçimi.
+
+    Her süreç HEARTBEAT_INTERVAL saniyede bir kiralamayı almaya/yenilemeye çalışır.
+    Lider olunduğunda on_elected, liderlik kaybedildiğinde on_demoted çağrılır.
+    BACKEND: 'db' (EngineLease satırı, çoklu sunucu), 'file' (dosya kilidi, tek sunucu)
+    veya None (seçim yok, her süreç lider).
+    """
+
+    def __init__(self):
+        leader_settings = getattr(settings, 'LEADER_ELECTION', {})
+        self.enabled = leader_settings.get('ENABLED', True)
+        self.server_commands = leader_settings.get('SERVER_COMMANDS', ('runserver', 'runserver_with_decision_engine'))
+        self.backend = leader_settings.get('BACKEND', 'db')
+        self.lease_ttl = leader_settings.get('LEASE_TTL', 15)  # saniye
+        self.heartbeat_interval = leader_settings.get('HEARTBEAT_INTERVAL', 5)  # saniye
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        if self.backend == 'db':
+            self.lease = DatabaseLease(leader_settings.get('LEASE_NAME', 'decision_engine'), self.owner, self.lease_ttl)
+        elif self.backend == 'file':
+            self.lease = FileLease(leader_settings.get('LOCK_FILE', 'logs/decision_engine.lock'), self.owner)
+        else:
+            self.lease = None
+
+        self.is_leader = False
+        self.on_elected = None
+        self.on_demoted = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.running = False
+
+    def should_start(self, argv=None):
+        """
+        Seçim bu süreçte başlatılmalı mı: ENABLED açık olmalı ve süreç bir sunucu olmalı.
+        manage.py ile çalışan süreçlerde yalnızca SERVER_COMMANDS motoru çalıştırır; manage.py
+        dışındaki süreçler (gunicorn, uwsgi, daphne) sunucu kabul edilir.
+        """
+        if not self.enabled:
+            return False
+        argv = sys.argv if argv is None else argv
+        program = os.path.basename(argv[0]) if argv else ''
+        if program in ('manage.py', 'django-admin', 'django-admin.py', '__main__.py'):
+            return len(argv) > 1 and argv[1] in self.server_commands
+        return True
+
+    def start(self, on_elected, on_demoted):
+        """Seçim thread'ini başlat"""
+        if self.running:
+            return
+
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.running = True
+
+        if self.lease is None:
+            # Seçim kapalı: bu süreç her zaman lider
+            self._set_leader(True)
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='leader-election')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Seçimi durdur, liderse kiralamayı bırak"""
+        if not self.running:
+            return
+
+        self.running = False
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(2.0)
+        self._thread = None
+
+        if self.is_leader:
+            self._set_leader(False)
+            if self.lease is not None:
+                try:
+                    self.lease.release()
+                except Exception as e:
+                    logger.warning(f"Liderlik kiralaması bırakılamadı: {str(e)}")
+
+    def status(self):
+        """Liderlik durumu"""
+        try:
+            leader = self.lease.current_owner() if self.lease is not None else self.owner
+        except Exception:
+            leader = None
+        return {
+            'enabled': self.enabled,
+            'running': self.running,
+            'backend': self.backend,
+            'is_leader': self.is_leader,
+            'owner': self.owner,
+            'leader': leader,
+        }
+
+    def _run(self):
+        try:
+            while self.running:
+                try:
+                    acquired = self.lease.acquire()
+                except Exception as e:
+                    # Veritabanı erişilemiyorsa kiralama yenilenemez; liderlik bırakılır
+                    logger.warning(f"Liderlik kiralaması alınamadı: {str(e)}")
+                    acquired = False
+
+                if acquired != self.is_leader:
+                    self._set_leader(acquired)
+
+                self._stop_event.wait(self.heartbeat_interval)
+        finally:
+            # Bu thread'e ait veritabanı bağlantısını kapat
+            connection.close()
+
+    def _set_leader(self, is_leader):
+        self.is_leader = is_leader
+        callback = self.on_elected if is_leader else self.on_demoted
+        if is_leader:
+            logger.info(f"Bu süreç lider seçildi: {self.owner}")
+        else:
+            logger.info(f"Bu süreç liderliği bıraktı: {self.owner}")
+        try:
+            if callback:
+                callback()
+        except Exception as e:
+            logger.error(f"Liderlik değişikliği işlenirken hata: {str(e)}", exc_info=True)
+
+
+# Singleton instance oluştur
+leader_election = LeaderElection()
@@ -0,0 +1,148 @@
+# schedules/management/commands/benchmark_decision_engine.py
+import logging
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from schedules.decision_engine import decision_engine
+from schedules.schedule_cache import SlotSetting
+from schedules import vectorized
+from sensors.models import DeviceStatus
+
+
+class Command(BaseCommand):
+    help = 'Karar motorunun oda bazlı ve NumPy tabanlı değerlendirme maliyetini sentetik odalarla ölçer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Virgülle ayrılmış oda sayıları')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Her ölçüm için tekrar sayısı (en iyi süre raporlanır)')
+        parser.add_argument('--changed', type=float, default=0.02,
+                            help='Cihaz durumu istenen durumdan farklı olan oda oranı (komut gönderilecek odalar)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        """Komut çalıştırıldığında yürütülecek ana metod"""
+        if not vectorized.available():
+            raise CommandError("NumPy yüklü değil")
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes virgülle ayrılmış tam sayılar olmalı")
+
+        # Komutlar gönderilmez, yalnızca kaydedilir (birleştirici gibi mevcut duruma eşit olanlar
+        # bastırılır); oda başına loglar ölçüme dahil edilmez
+        commands = []
+
+        def record(device, field):
+            def control(device_status, turn_on):
+                if getattr(device_status, field) == turn_on:
+                    return False
+                commands.append((device_status.room_id, device, turn_on))
+                return True
+            return control
+
+        control_heating, control_fan = decision_engine._control_heating, decision_engine._control_fan
+        decision_engine._control_heating = record('valve', 'valve_status')
+        decision_engine._control_fan = record('fan', 'fan_status')
+        engine_logger = logging.getLogger('schedules.decision_engine')
+        log_level = engine_logger.level
+        engine_logger.setLevel(logging.ERROR)
+
+        self.stdout.write(f"Karar motoru ölçümü (en iyi {options['repeat']} tekrar, sentetik veri)")
+        self.stdout.write(f"  {'oda':>8} {'oda bazlı':>12} {'diziler':>12} {'hesaplama':>12} {'toplam':>12} {'hız':>8} {'komut':>8}")
+        try:
+            for size in sizes:
+                rng = random.Random(options['seed'])
+                scalar_seconds = vector_seconds = layout_seconds = float('inf')
+                for _ in range(options['repeat']):
+                    data = self._generate(size, rng, options['changed'])
+
+                    commands.clear()
+                    started = time.perf_counter()
+                    decision_engine._evaluate_rooms(*data)
+                    scalar_seconds = min(scalar_seconds, time.perf_counter() - started)
+                    scalar_commands = sorted(commands)
+
+                    # Oda bazlı geçiş cihaz durumlarını değiştirmedi (komutlar kaydedildi), aynı veriyle ölç
+                    commands.clear()
+                    rooms, latest_temperatures, device_statuses, active_schedules, current_slots = data
+                    room_ids = [room.id for room in rooms]
+                    started = time.perf_counter()
+                    vectorized.FleetArrays.build(
+                        room_ids, latest_temperatures, device_statuses, active_schedules, current_slots,
+                        decision_engine.temperature_threshold
+                    )
+                    layout_seconds = min(layout_seconds, time.perf_counter() - started)
+
+                    started = time.perf_counter()
+                    decision_engine._evaluate_rooms_vectorized(
+                        room_ids, latest_temperatures, device_statuses, active_schedules, current_slots
+                    )
+                    vector_seconds = min(vector_seconds, time.perf_counter() - started)
+
+                    if sorted(commands) != scalar_commands:
+                        raise CommandError(f"{size} oda: oda bazlı ve toplu değerlendirme farklı komutlar üretti")
+
+                self.stdout.write(
+                    f"  {size:>8,} {scalar_seconds * 1000:>10.1f}ms {layout_seconds * 1000:>10.1f}ms "
+                    f"{(vector_seconds - layout_seconds) * 1000:>10.1f}ms {vector_seconds * 1000:>10.1f}ms "
+                    f"{scalar_seconds / vector_seconds:>7.1f}x {len(scalar_commands):>8,}"
+                )
+        finally:
+            decision_engine._control_heating, decision_engine._control_fan = control_heating, control_fan
+            engine_logger.setLevel(log_level)
+
+        self.stdout.write(self.style.SUCCESS("Ölçüm tamamlandı"))
+
+    def _generate(self, size, rng, changed):
+        """
+        Oda, sıcaklık, cihaz durumu ve program verilerinden oluşan sentetik bir tick.
+        Kararlı durumu taklit etmek için cihazlar, 'changed' oranındaki odalar dışında
+        zaten istenen durumdadır.
+        """
+        rooms = [_Room(room_id) for room_id in range(1, size + 1)]
+        modes = ['schedule'] * 9 + ['manual']
+        latest_temperatures = {}
+        device_statuses = {}
+        active_schedules = {}
+        for room in rooms:
+            if rng.random() < 0.99:
+                latest_temperatures[room.id] = round(rng.uniform(15.0, 27.0), 1)
+            device_statuses[room.id] = DeviceStatus(
+                room_id=room.id,
+                valve_status=rng.random() < 0.5,
+                fan_status=rng.random() < 0.5,
+                heating_control_mode=rng.choice(modes),
+                fan_control_mode=rng.choice(modes),
+            )
+            if rng.random() < 0.95:
+                active_schedules[room.id] = rng.randrange(1, 51)
+
+        current_slots = {}
+        for schedule_id in range(1, 51):
+            if rng.random() < 0.9:
+                current_slots[schedule_id] = SlotSetting(
+                    schedule_id, rng.choice([19.0, 20.0, 21.0, 22.0]), rng.random() < 0.8, rng.random() < 0.5
+                )
+
+        room_ids = [room.id for room in rooms]
+        decision = vectorized.evaluate_fleet(vectorized.FleetArrays.build(
+            room_ids, latest_temperatures, device_statuses, active_schedules, current_slots,
+            decision_engine.temperature_threshold
+        ))
+        for index, room_id in enumerate(room_ids):
+            if rng.random() >= changed:
+                device_status = device_statuses[room_id]
+                device_status.valve_status = bool(decision.valve[index])
+                device_status.fan_status = bool(decision.fan[index])
+        return rooms, latest_temperatures, device_statuses, active_schedules, current_slots
+
+
+class _Room:
+    """Değerlendirmenin kullandığı tek alan (id) ile hafif oda nesnesi"""
+
+    __slots__ = ('id',)
+
+    def __init__(self, room_id):
+        self.id = room_id
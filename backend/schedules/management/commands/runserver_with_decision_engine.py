@@ -1,7 +1,9 @@
+import os
 import signal
 import sys
 from django.core.management.commands.runserver import Command as RunserverCommand
-from schedules.decision_engine import decision_engine
+from schedules.apps import on_elected, on_demoted
+from schedules.leader import leader_election
 
 class Command(RunserverCommand):
     help = 'Decision Engine ile birlikte Django geliştirme sunucusunu çalıştırır'
@@ -11,13 +13,17 @@ class Command(RunserverCommand):
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
         
-        # Karar motorunu başlat
-        decision_engine.start()
+        # Karar motorunu lider seçimi üzerinden başlat: motor yalnızca lider seçilirse çalışır,
+        # böylece diğer sunucu süreçlerinin yanında ikinci bir motor çalışmaz.
+        # Uygulama yüklenirken başlatıldıysa (bkz. apps.py) tekrar başlatılmaz
+        if leader_election.enabled and os.environ.get('RUN_MAIN', None) != 'true':
+            leader_election.start(on_elected, on_demoted)
         
         # Orijinal runserver komutunu çalıştır
         super().handle(*args, **options)
     
     def signal_handler(self, sig, frame):
         print('\nSunucu kapatılıyor...')
-        decision_engine.stop()
-        sys.exit(0)
\ No newline at end of file
+        # Liderse motoru durdurur ve kiralamayı bırakır
+        leader_election.stop()
+        sys.exit(0)
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.21 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedules', '0006_alter_roomschedule_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EngineLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('owner', models.CharField(blank=True, max_length=200)),
+                ('expires_at', models.DateTimeField()),
+                ('renewed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -85,4 +85,36 @@ class RoomSchedule(models.Model):
             # Odanın diğer program ilişkilerini sil
             RoomSchedule.objects.filter(room_id=self.room_id).delete()
         
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class EngineLease(models.Model):
+    """
+    Karar motoru liderlik kiralaması - birden fazla süreçten yalnızca kiralamayı
+    tutan (owner) süreç karar motorunu ve zamanlayıcıyı çalıştırır.
+    Lider kiralamayı düzenli olarak yeniler; süresi dolan kiralamayı başka bir süreç devralır.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=200, blank=True)
+    expires_at = models.DateTimeField()
+    renewed_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.name} - {self.owner} (bitiş: {self.expires_at})"
+
+
+class ScheduleChange(models.Model):
+    """
+    Program değişiklik kaydı - değişikliği yapan süreçten bağımsız olarak karar motorunun
+    çalıştığı süreçteki program önbelleğini güncel tutar (bkz. schedule_cache.py).
+    room_id boşsa schedule_id programının zaman dilimleri, doluysa odanın program ataması
+    değişmiştir (schedule_id: odanın yeni aktif programı, yoksa boş).
+    Program veya oda silindikten sonra da okunabilmesi için yabancı anahtar kullanılmaz.
+    """
+    schedule_id = models.IntegerField(null=True, blank=True)
+    room_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        if self.room_id is not None:
+            return f"Oda {self.room_id} -> program {self.schedule_id} ({self.created_at})"
+        return f"Program {self.schedule_id} ({self.created_at})"
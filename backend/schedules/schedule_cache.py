@@ -0,0 +1,323 @@
+# schedules/schedule_cache.py
+import bisect
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+# Derlenmiş tablolarda tutulan zaman dilimi ayarları (ScheduleTime alanlarının alt kümesi)
+SlotSetting = namedtuple('SlotSetting', ['id', 'desired_temperature', 'is_heating_active', 'is_fan_active'])
+
+
+def second_of_week(day_id, time_value):
+    """Gün (1-7, Pazartesi-Pazar) ve saati haftanın saniyesine çevir (mikrosaniye dahil)"""
+    return (
+        (day_id - 1) * SECONDS_PER_DAY
+        + time_value.hour * 3600 + time_value.minute * 60 + time_value.second
+        + time_value.microsecond / 1_000_000
+    )
+
+
+class CompiledSchedule:
+    """
+    Bir programın haftalık zaman dilimi tablosu.
+
+    Hafta, sıralı sınır noktalarıyla ardışık aralıklara bölünür; her aralık için
+    geçerli zaman dilimi (veya None) önceden hesaplanır. Sorgu bisect ile O(log n).
+    """
+
+    __slots__ = ('boundaries', 'slots')
+
+    def __init__(self, intervals):
+        # intervals: [(başlangıç saniyesi, bitiş saniyesi (dahil), id, SlotSetting)]
+        # Bitiş dahil olduğu için aralık [başlangıç, bitiş + 1µs) olarak tutulur
+        points = set()
+        for start, end, slot_id, slot in intervals:
+            points.add(start)
+            points.add(end + 1e-6)
+        self.boundaries = sorted(points)
+
+        # Her aralık için çakışan dilimlerden en küçük ID'li olanı seç (veritabanı sorgusundaki .first() gibi)
+        self.slots = [None] * len(self.boundaries)
+        for start, end, slot_id, slot in sorted(intervals, key=lambda item: item[2], reverse=True):
+            first = bisect.bisect_left(self.boundaries, start)
+            last = bisect.bisect_left(self.boundaries, end + 1e-6)
+            for index in range(first, last):
+                self.slots[index] = slot
+
+    def lookup(self, second):
+        """Haftanın verilen saniyesinde geçerli zaman dilimi"""
+        index = bisect.bisect_right(self.boundaries, second) - 1
+        if index < 0:
+            return None
+        return self.slots[index]
+
+    def seconds_until_change(self, second):
+        """
+        Verilen saniyeden sonra geçerli zaman diliminin değiştiği ilk ana kadar geçen süre.
+        Hafta sonundan başa sarar; tablo hiç değişmiyorsa None.
+        """
+        count = len(self.boundaries)
+        if not count:
+            return None
+
+        index = bisect.bisect_right(self.boundaries, second)
+        current = self.slots[index - 1] if index > 0 else None
+        for step in range(count):
+            position = index + step
+            boundary = self.boundaries[position % count] + SECONDS_PER_WEEK * (position // count)
+            if self.slots[position % count] is not current:
+                return boundary - second
+        return None
+
+
+def _reverse_index(room_schedules):
+    """Oda -> program eşlemesinden program -> {oda} indeksi"""
+    schedule_rooms = {}
+    for room_id, schedule_id in room_schedules.items():
+        schedule_rooms.setdefault(schedule_id, set()).add(room_id)
+    return schedule_rooms
+
+
+class ScheduleCache:
+    """
+    Programların derlenmiş haftalık tabloları ve oda -> aktif program eşlemesi.
+
+    Kararlı durumda sorgular veritabanına gitmez. ScheduleTime, Hour ve RoomSchedule
+    değişikliklerinde sinyallerle güncellenir (bkz. signals.py); program -> oda ters
+    indeksi sayesinde yalnızca etkilenen odalar yeniden değerlendirilir.
+
+    Sinyaller yalnızca değişikliği yapan süreçte çalışır. Diğer süreçlerdeki değişiklikler
+    ScheduleChange kayıtlarından sync() ile alınır; sinyal dışı yollar (ör. queryset.update)
+    için önbellek ayrıca TTL saniyede bir tamamen yenilenir.
+    """
+
+    def __init__(self):
+        cache_settings = getattr(settings, 'SCHEDULE_CACHE', {})
+        self.change_poll_interval = cache_settings.get('CHANGE_POLL_INTERVAL', 2)  # saniye
+        self.ttl = cache_settings.get('TTL', 300)  # saniye
+        self.change_retention = cache_settings.get('CHANGE_RETENTION', 3600)  # saniye
+
+        self._compiled = {}  # schedule_id -> CompiledSchedule
+        self._room_schedules = None  # room_id -> schedule_id (aktif)
+        self._schedule_rooms = None  # schedule_id -> {room_id} (ters indeks)
+        self._lock = threading.Lock()
+        self._generation = 0  # Her geçersiz kılmada artar, eski yüklemelerin yazılmasını önler
+        self._last_change_id = None  # İşlenen son ScheduleChange kaydı
+        self._next_change_poll = 0.0  # monotonic
+        self._next_refresh = 0.0  # monotonic, bir sonraki tam yenileme (TTL)
+
+    @property
+    def generation(self):
+        """Önbellek her geçersiz kılındığında artan sayaç"""
+        return self._generation
+
+    def sync(self, force=False):
+        """
+        Diğer süreçlerde yapılan program değişikliklerini uygula (karar motoru thread'inden
+        çağrılır). En fazla CHANGE_POLL_INTERVAL saniyede bir tek sorgu çalıştırır.
+        Değişiklikten etkilenen oda ID'lerini döndürür; önbellek tamamen yenilendiyse None.
+        """
+        from schedules.models import ScheduleChange
+
+        now = time.monotonic()
+        if not force and now < self._next_change_poll:
+            return set()
+        self._next_change_poll = now + self.change_poll_interval
+
+        if self._last_change_id is None or now >= self._next_refresh:
+            # İlk senkronizasyon veya TTL: her şeyi yeniden yükle, eski değişiklik kayıtlarını sil
+            last = ScheduleChange.objects.order_by('-id').values_list('id', flat=True).first()
+            self._last_change_id = last or 0
+            self._next_refresh = now + self.ttl
+            self.invalidate_all()
+            cutoff = timezone.now() - timedelta(seconds=self.change_retention)
+            ScheduleChange.objects.filter(created_at__lt=cutoff).delete()
+            return None
+
+        changes = list(
+            ScheduleChange.objects.filter(id__gt=self._last_change_id)
+            .order_by('id').values_list('id', 'schedule_id', 'room_id')
+        )
+        if not changes:
+            return set()
+
+        room_ids = set()
+        schedule_ids = set()
+        for change_id, schedule_id, room_id in changes:
+            if room_id is not None:
+                self.assign_room(room_id, schedule_id)
+                room_ids.add(room_id)
+            else:
+                schedule_ids.add(schedule_id)
+        for schedule_id in schedule_ids:
+            self.invalidate_schedule(schedule_id)
+        room_ids.update(self.rooms_for_schedules(schedule_ids))
+
+        self._last_change_id = changes[-1][0]
+        logger.debug(f"{len(changes)} program değişikliği uygulandı, {len(room_ids)} oda etkilendi")
+        return room_ids
+
+    def seconds_until_sync(self):
+        """Bir sonraki değişiklik sorgusuna kalan süre"""
+        return max(0.0, self._next_change_poll - time.monotonic())
+
+    def ensure_compiled(self, schedule_ids):
+        """Önbellekte olmayan programları tek sorguda derle"""
+        missing = [schedule_id for schedule_id in schedule_ids if schedule_id not in self._compiled]
+        if missing:
+            self._compile_many(missing)
+
+    def next_transition(self, schedule_id, now):
+        """Programın zaman diliminin bir sonraki değişim zamanı (değişmiyorsa None)"""
+        compiled = self._compiled.get(schedule_id)
+        if compiled is None:
+            compiled = self._compile(schedule_id)
+        delay = compiled.seconds_until_change(second_of_week(now.weekday() + 1, now.time()))
+        if delay is None:
+            return None
+        return now + timedelta(seconds=delay)
+
+    def all_active_schedules(self):
+        """Aktif programı olan tüm odalar (oda ID -> program ID)"""
+        room_schedules = self._room_schedules
+        if room_schedules is None:
+            room_schedules = self._load_room_schedules()
+        return dict(room_schedules)
+
+    def current_slot(self, schedule_id, now):
+        """Program için şu anki zaman dilimi (yoksa None)"""
+        compiled = self._compiled.get(schedule_id)
+        if compiled is None:
+            compiled = self._compile(schedule_id)
+        local_time = now.time()
+        return compiled.lookup(second_of_week(now.weekday() + 1, local_time))
+
+    def current_slots(self, schedule_ids, now):
+        """Birden fazla program için şu anki zaman dilimleri (program ID -> SlotSetting)"""
+        self.ensure_compiled(schedule_ids)
+        slots = {}
+        for schedule_id in schedule_ids:
+            slot = self.current_slot(schedule_id, now)
+            if slot is not None:
+                slots[schedule_id] = slot
+        return slots
+
+    def active_schedules(self, room_ids):
+        """Odaların aktif programları (oda ID -> program ID)"""
+        room_schedules = self._room_schedules
+        if room_schedules is None:
+            room_schedules = self._load_room_schedules()
+        return {room_id: room_schedules[room_id] for room_id in room_ids if room_id in room_schedules}
+
+    def rooms_for_schedules(self, schedule_ids):
+        """Programlardan birine aktif olarak atanmış odalar"""
+        schedule_rooms = self._schedule_rooms
+        if schedule_rooms is None:
+            schedule_rooms = _reverse_index(self._load_room_schedules())
+        room_ids = set()
+        for schedule_id in schedule_ids:
+            room_ids.update(schedule_rooms.get(schedule_id, ()))
+        return room_ids
+
+    def assign_room(self, room_id, schedule_id):
+        """Odanın aktif programını güncelle (schedule_id=None: aktif program yok)"""
+        with self._lock:
+            self._generation += 1
+            if self._room_schedules is None:
+                return  # Eşleme henüz yüklenmedi, ilk kullanımda veritabanından okunur
+
+            # Okuyucular kilitsiz eriştiği için sözlükler yerinde değiştirilmez, kopyalanır
+            room_schedules = dict(self._room_schedules)
+            schedule_rooms = dict(self._schedule_rooms)
+            previous = room_schedules.pop(room_id, None)
+            if previous is not None and previous in schedule_rooms:
+                schedule_rooms[previous] = schedule_rooms[previous] - {room_id}
+                if not schedule_rooms[previous]:
+                    del schedule_rooms[previous]
+            if schedule_id is not None:
+                room_schedules[room_id] = schedule_id
+                schedule_rooms[schedule_id] = schedule_rooms.get(schedule_id, frozenset()) | {room_id}
+            self._room_schedules = room_schedules
+            self._schedule_rooms = schedule_rooms
+
+    def invalidate_schedule(self, schedule_id):
+        """Bir programın derlenmiş tablosunu geçersiz kıl"""
+        with self._lock:
+            self._generation += 1
+            self._compiled.pop(schedule_id, None)
+
+    def invalidate_all_schedules(self):
+        """Tüm derlenmiş tabloları geçersiz kıl (ör. Hour değişikliği)"""
+        with self._lock:
+            self._generation += 1
+            self._compiled = {}
+
+    def invalidate_room_schedules(self):
+        """Oda -> program eşlemesini geçersiz kıl"""
+        with self._lock:
+            self._generation += 1
+            self._room_schedules = None
+            self._schedule_rooms = None
+
+    def invalidate_all(self):
+        """Tüm önbelleği geçersiz kıl (ör. diğer süreçlerde yapılan değişiklikleri almak için)"""
+        with self._lock:
+            self._generation += 1
+            self._compiled = {}
+            self._room_schedules = None
+            self._schedule_rooms = None
+
+    def _compile(self, schedule_id):
+        return self._compile_many([schedule_id])[schedule_id]
+
+    def _compile_many(self, schedule_ids):
+        """Programların zaman dilimlerini tek sorguda yükle ve derle"""
+        from schedules.models import ScheduleTime
+
+        generation = self._generation
+        intervals = {schedule_id: [] for schedule_id in schedule_ids}
+        rows = ScheduleTime.objects.filter(schedule_id__in=schedule_ids).values_list(
+            'id', 'schedule_id', 'day_id', 'hour_id__start_time', 'hour_id__end_time',
+            'desired_temperature', 'is_heating_active', 'is_fan_active'
+        )
+        for slot_id, schedule_id, day_id, start_time, end_time, desired_temperature, heating, fan in rows:
+            if end_time < start_time:
+                continue  # Gece yarısını aşan dilimler veritabanı sorgusunda da eşleşmez
+            slot = SlotSetting(slot_id, desired_temperature, heating, fan)
+            intervals[schedule_id].append(
+                (second_of_week(day_id, start_time), second_of_week(day_id, end_time), slot_id, slot)
+            )
+
+        compiled = {schedule_id: CompiledSchedule(items) for schedule_id, items in intervals.items()}
+        with self._lock:
+            if generation == self._generation:
+                self._compiled.update(compiled)
+        logger.debug(f"{len(compiled)} program derlendi")
+        return compiled
+
+    def _load_room_schedules(self):
+        from schedules.models import RoomSchedule
+
+        generation = self._generation
+        room_schedules = dict(
+            RoomSchedule.objects.filter(is_active=True).values_list('room_id', 'schedule_id')
+        )
+        schedule_rooms = _reverse_index(room_schedules)
+        with self._lock:
+            if generation == self._generation:
+                self._room_schedules = room_schedules
+                self._schedule_rooms = schedule_rooms
+        return room_schedules
+
+
+# Singleton instance oluştur
+schedule_cache = ScheduleCache()
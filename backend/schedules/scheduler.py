@@ -5,11 +5,17 @@ from django_apscheduler.jobstores import DjangoJobStore
 from django_apscheduler.models import DjangoJobExecution
 import sys
 
+_scheduler = None
+
 def check_schedules_job():
     """Programları kontrol eder ve uygular"""
     management.call_command('check_schedules')
 
 def start():
+    global _scheduler
+    if _scheduler is not None:
+        return
+
     scheduler = BackgroundScheduler()
     scheduler.add_jobstore(DjangoJobStore(), "default")
     
@@ -23,4 +29,15 @@ def start():
     )
     
     scheduler.start()
-    print("Scheduler started...", file=sys.stdout)
\ No newline at end of file
+    _scheduler = scheduler
+    print("Scheduler started...", file=sys.stdout)
+
+def stop():
+    """Zamanlayıcıyı durdur (liderlik kaybedildiğinde)"""
+    global _scheduler
+    if _scheduler is None:
+        return
+
+    _scheduler.shutdown(wait=False)
+    _scheduler = None
+    print("Scheduler stopped...", file=sys.stdout)
@@ -0,0 +1,83 @@
+# schedules/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Hour, ScheduleTime, RoomSchedule, ScheduleChange
+from .schedule_cache import schedule_cache
+
+
+def _reevaluate_rooms(room_ids):
+    """
+    Odaları karar motorunun bir sonraki olay tabanlı değerlendirmesine ekle.
+    Oda yoksa da motor uyandırılır, program geçiş zamanlarını yeniden hesaplasın.
+    """
+    from .decision_engine import decision_engine
+    if room_ids:
+        decision_engine.enqueue_rooms(room_ids)
+    else:
+        decision_engine.wake()
+
+
+def _on_schedules_changed(schedule_ids):
+    """Programların tablolarını geçersiz kıl ve yalnızca bu programlara atanmış odaları değerlendir"""
+    for schedule_id in schedule_ids:
+        schedule_cache.invalidate_schedule(schedule_id)
+    _reevaluate_rooms(schedule_cache.rooms_for_schedules(schedule_ids))
+
+
+# Her değişiklik, düzenlemeyle aynı transaction içinde ScheduleChange olarak kaydedilir; karar
+# motoru başka bir süreçte çalışıyorsa değişiklikleri bu kayıtlardan alır (ScheduleCache.sync).
+# Bu süreçteki önbellek güncellemeleri transaction commit edildikten sonra yapılır; aksi halde karar
+# motoru thread'i henüz commit edilmemiş değişiklikleri göremeden tabloları eski veriyle derleyebilir
+@receiver(post_save, sender=ScheduleTime)
+@receiver(post_delete, sender=ScheduleTime)
+def schedule_time_changed(sender, instance, **kwargs):
+    """Zaman dilimi değiştiğinde programın derlenmiş tablosunu geçersiz kıl"""
+    if kwargs.get('raw'):
+        return  # loaddata
+    schedule_id = instance.schedule_id_id
+    ScheduleChange.objects.create(schedule_id=schedule_id)
+    transaction.on_commit(lambda: _on_schedules_changed((schedule_id,)))
+
+
+@receiver(post_save, sender=Hour)
+def hour_changed(sender, instance, **kwargs):
+    """
+    Saat dilimi birden fazla programda kullanılabilir, onu kullanan programları geçersiz kıl.
+    Silinen saatlere bağlı zaman dilimleri önce silinir ve kendi sinyalleriyle işlenir.
+    """
+    if kwargs.get('raw'):
+        return
+    schedule_ids = set(
+        ScheduleTime.objects.filter(hour_id=instance.id).values_list('schedule_id', flat=True)
+    )
+    if schedule_ids:
+        ScheduleChange.objects.bulk_create([ScheduleChange(schedule_id=schedule_id) for schedule_id in schedule_ids])
+        transaction.on_commit(lambda: _on_schedules_changed(schedule_ids))
+
+
+@receiver(post_save, sender=RoomSchedule)
+def room_schedule_saved(sender, instance, **kwargs):
+    """Oda program ataması değiştiğinde ters indeksi güncelle ve odayı değerlendir"""
+    if kwargs.get('raw'):
+        return
+    room_id = instance.room_id_id
+    schedule_id = instance.schedule_id_id if instance.is_active else None
+    ScheduleChange.objects.create(room_id=room_id, schedule_id=schedule_id)
+
+    def on_commit():
+        schedule_cache.assign_room(room_id, schedule_id)
+        _reevaluate_rooms({room_id})
+    transaction.on_commit(on_commit)
+
+
+@receiver(post_delete, sender=RoomSchedule)
+def room_schedule_deleted(sender, instance, **kwargs):
+    """Oda program ataması silindiğinde odayı programsız olarak değerlendir"""
+    room_id = instance.room_id_id
+    ScheduleChange.objects.create(room_id=room_id, schedule_id=None)
+
+    def on_commit():
+        schedule_cache.assign_room(room_id, None)
+        _reevaluate_rooms({room_id})
+    transaction.on_commit(on_commit)
@@ -1,3 +1,831 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from sensors.command_queue import CommandQueue
+from sensors.metrics import IngestMetrics
+from sensors.models import DeviceStatus, Room, SensorReading
+from sensors.mqtt_client import mqtt_client
+from sensors.signals import device_status_changed, readings_committed
+from . import signals, vectorized
+from .apps import on_demoted, on_elected
+from .command_coalescer import CommandCoalescer, command_coalescer
+from .decision_engine import decision_engine
+from .dispatcher import CommandDispatcher, room_jitter
+from .engine_state import RoomDecision, read_snapshot, write_snapshot
+from .leader import DatabaseLease, FileLease, LeaderElection, leader_election
+from .models import Day, EngineLease, Hour, RoomSchedule, Schedule, ScheduleTime
+from .schedule_cache import ScheduleCache, SlotSetting
+from .tick_profiler import TICKS_GAUGE, TickProfiler, read_tick_snapshots
+
+# 1 Ocak 2024 Pazartesi
+MONDAY = datetime(2024, 1, 1)
+
+
+def baseline_slot(schedule, now):
+    """Derlenmiş tablolardan önceki veritabanı sorgusu"""
+    current_time = now.time()
+    return ScheduleTime.objects.filter(
+        schedule_id=schedule,
+        day_id=now.weekday() + 1,
+        hour_id__start_time__lte=current_time,
+        hour_id__end_time__gte=current_time,
+    ).first()
+
+
+def slot_id(slot):
+    return slot.id if slot is not None else None
+
+
+class ScheduleCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for day_id, name in enumerate(('Pazartesi', 'Salı', 'Çarşamba', 'Perşembe', 'Cuma', 'Cumartesi', 'Pazar'), 1):
+            Day.objects.create(id=day_id, day=name)
+        cls.schedule = Schedule.objects.create(name='Ev')
+        cls.other_schedule = Schedule.objects.create(name='İş')
+
+        hours = [
+            Hour.objects.create(start_time=start, end_time=end)
+            for start, end in (
+                (dt_time(0, 0), dt_time(6, 59, 59)),
+                (dt_time(7, 0), dt_time(9, 0)),
+                (dt_time(8, 30), dt_time(12, 0)),  # Öncekiyle çakışır
+                (dt_time(9, 0), dt_time(17, 30)),  # Sınırda çakışır
+                (dt_time(18, 0), dt_time(23, 59, 59)),
+                (dt_time(22, 0), dt_time(2, 0)),  # Gece yarısını aşar, sorguda hiç eşleşmez
+            )
+        ]
+        for day_id in (1, 2, 3, 5, 7):
+            for index, hour in enumerate(hours):
+                if (day_id + index) % 3 == 0:
+                    continue  # Günlere göre farklı, boşluklu tablolar
+                ScheduleTime.objects.create(
+                    day_id_id=day_id, hour_id=hour, schedule_id=cls.schedule,
+                    desired_temperature=18.0 + index + day_id / 10,
+                )
+        ScheduleTime.objects.create(day_id_id=4, hour_id=hours[1], schedule_id=cls.other_schedule)
+
+        cls.room = Room.objects.create(name='Salon', user=User.objects.create(username='schedule'))
+
+    def setUp(self):
+        self.cache = ScheduleCache()
+
+    def week_instants(self):
+        """Haftanın her 7 dakikası ve tüm dilim sınırlarının hemen öncesi/sonrası"""
+        instants = [MONDAY + timedelta(minutes=minute) for minute in range(0, 7 * 24 * 60, 7)]
+        for hour in Hour.objects.all():
+            for day in range(7):
+                for boundary in (hour.start_time, hour.end_time):
+                    at = datetime.combine(MONDAY.date() + timedelta(days=day), boundary)
+                    instants.extend((at - timedelta(microseconds=1), at, at + timedelta(microseconds=1)))
+        return instants
+
+    def test_current_slot_matches_database_query(self):
+        for schedule in (self.schedule, self.other_schedule):
+            for now in self.week_instants():
+                with self.subTest(schedule=schedule.name, now=now):
+                    self.assertEqual(
+                        slot_id(self.cache.current_slot(schedule.id, now)), slot_id(baseline_slot(schedule, now))
+                    )
+
+    def test_current_slot_settings(self):
+        slot = self.cache.current_slot(self.schedule.id, MONDAY.replace(hour=10))
+        expected = baseline_slot(self.schedule, MONDAY.replace(hour=10))
+
+        self.assertEqual(slot.desired_temperature, expected.desired_temperature)
+        self.assertEqual(slot.is_heating_active, expected.is_heating_active)
+        self.assertEqual(slot.is_fan_active, expected.is_fan_active)
+
+    def test_next_transition_is_next_slot_change(self):
+        for now in self.week_instants()[::5]:
+            with self.subTest(now=now):
+                transition = self.cache.next_transition(self.schedule.id, now)
+                current = slot_id(baseline_slot(self.schedule, now))
+                # Geçiş anına kadar dilim değişmez, geçiş anında değişir
+                self.assertEqual(slot_id(baseline_slot(self.schedule, transition - timedelta(microseconds=1))),
+                                 current)
+                self.assertNotEqual(slot_id(baseline_slot(self.schedule, transition)), current)
+                self.assertLessEqual(transition - now, timedelta(days=7))
+
+    def test_next_transition_wraps_week(self):
+        # Perşembe 09:00'dan sonraki ilk değişim bir sonraki haftanın Perşembe 07:00'si
+        now = MONDAY.replace(hour=10) + timedelta(days=3)
+        self.assertEqual(
+            self.cache.next_transition(self.other_schedule.id, now),
+            MONDAY.replace(hour=7) + timedelta(days=10),
+        )
+        self.assertIsNone(self.cache.next_transition(Schedule.objects.create(name='Boş').id, now))
+
+    def test_sync_applies_changes_from_other_processes(self):
+        self.assertIsNone(self.cache.sync(force=True))  # İlk senkronizasyon: tam yükleme
+        self.assertEqual(self.cache.active_schedules([self.room.id]), {})
+        now = MONDAY.replace(hour=10)
+        self.assertEqual(self.cache.current_slot(self.schedule.id, now).desired_temperature, 21.1)
+
+        # Değişiklikler başka bir süreçte yapılmış gibi: yalnızca ScheduleChange kayıtları görülür
+        RoomSchedule.objects.create(room_id=self.room, schedule_id=self.schedule)
+        self.assertEqual(self.cache.sync(force=True), {self.room.id})
+        self.assertEqual(self.cache.active_schedules([self.room.id]), {self.room.id: self.schedule.id})
+
+        ScheduleTime.objects.get(id=self.cache.current_slot(self.schedule.id, now).id).delete()
+        self.assertEqual(self.cache.sync(force=True), {self.room.id})
+        self.assertEqual(slot_id(self.cache.current_slot(self.schedule.id, now)),
+                         slot_id(baseline_slot(self.schedule, now)))
+
+        self.assertEqual(self.cache.sync(force=True), set())
+        self.cache._next_refresh = 0  # TTL doldu
+        self.assertIsNone(self.cache.sync(force=True))
+
+    def test_sync_is_rate_limited(self):
+        self.cache.sync(force=True)
+        RoomSchedule.objects.create(room_id=self.room, schedule_id=self.schedule)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.sync(), set())
+        self.assertGreater(self.cache.seconds_until_sync(), 0)
+
+    def test_reverse_index_follows_room_assignments(self):
+        self.cache.all_active_schedules()
+        self.cache.assign_room(self.room.id, self.schedule.id)
+        self.cache.assign_room(self.room.id + 1, self.schedule.id)
+        self.assertEqual(self.cache.rooms_for_schedules({self.schedule.id}), {self.room.id, self.room.id + 1})
+
+        self.cache.assign_room(self.room.id, self.other_schedule.id)
+        self.assertEqual(self.cache.rooms_for_schedules({self.schedule.id}), {self.room.id + 1})
+        self.assertEqual(self.cache.rooms_for_schedules({self.other_schedule.id}), {self.room.id})
+
+        self.cache.assign_room(self.room.id + 1, None)
+        self.assertEqual(self.cache.rooms_for_schedules({self.schedule.id, self.other_schedule.id}), {self.room.id})
+        self.assertEqual(self.cache.all_active_schedules(), {self.room.id: self.other_schedule.id})
+
+    def test_schedule_edit_reevaluates_only_assigned_rooms(self):
+        other_room = Room.objects.create(name='Ofis', user=self.room.user)
+        RoomSchedule.objects.create(room_id=self.room, schedule_id=self.schedule)
+        RoomSchedule.objects.create(room_id=other_room, schedule_id=self.other_schedule)
+        now = MONDAY.replace(hour=10)
+        self.cache.current_slot(self.schedule.id, now)
+        self.cache.current_slot(self.other_schedule.id, now)
+
+        with mock.patch.object(signals, 'schedule_cache', self.cache), \
+                mock.patch.object(decision_engine, 'enqueue_rooms') as enqueue_rooms:
+            with self.captureOnCommitCallbacks(execute=True):
+                slot = ScheduleTime.objects.filter(schedule_id=self.schedule).first()
+                slot.desired_temperature = 30.0
+                slot.save()
+
+        enqueue_rooms.assert_called_once_with({self.room.id})
+        # Yalnızca düzenlenen programın tablosu yeniden derlenir
+        self.assertNotIn(self.schedule.id, self.cache._compiled)
+        self.assertIn(self.other_schedule.id, self.cache._compiled)
+
+
+@override_settings(COMMAND_COALESCER={
+    'VALVE_MIN_DWELL': 300, 'FAN_MIN_DWELL': 30, 'MANUAL_VALVE_MIN_DWELL': 30, 'MANUAL_FAN_MIN_DWELL': 5,
+})
+class CommandCoalescerTests(TestCase):
+    def setUp(self):
+        self.coalescer = CommandCoalescer()
+        publish = mock.patch.object(self.coalescer, '_publish', return_value='sent')
+        self.publish = publish.start()
+        self.addCleanup(publish.stop)
+
+    def elapse(self, seconds):
+        """Son gönderimlerden bu yana süre geçmiş gibi"""
+        for state in self.coalescer._states.values():
+            state.last_change -= seconds
+
+    def test_suppresses_command_for_current_state(self):
+        self.assertEqual(self.coalescer.request(1, 'valve', True, current=True), 'suppressed')
+        self.assertEqual(self.coalescer.request(1, 'valve', True), 'sent')
+        # Bilinen durum verilmezse son gönderilen durum kullanılır
+        self.assertEqual(self.coalescer.request(1, 'valve', True), 'suppressed')
+
+        self.assertEqual(self.publish.call_count, 1)
+        self.assertEqual(self.coalescer.stats()['suppressed'], 2)
+
+    def test_dwell_defers_and_coalesces_reversals(self):
+        self.assertEqual(self.coalescer.request(1, 'fan', True, current=False), 'sent')
+        self.assertEqual(self.coalescer.request(1, 'fan', False, current=True), 'deferred')
+        self.assertEqual(self.coalescer.pending_keys(), {(1, 'fan')})
+        self.assertEqual(self.coalescer._flush_due(), [])
+
+        self.elapse(30)
+        self.assertEqual(self.coalescer._flush_due(), [(1, 'fan', False)])
+        self.assertEqual(self.coalescer.pending_count(), 0)
+        self.publish.assert_called_with(1, 'fan', False, immediate=False)
+        # Bekleme süresi cihaz bazında
+        self.assertEqual(self.coalescer.request(1, 'valve', True, current=False), 'sent')
+
+    def test_pending_request_cancelled_when_state_reverts(self):
+        self.coalescer.request(1, 'valve', True, current=False)
+        self.assertEqual(self.coalescer.request(1, 'valve', False, current=True), 'deferred')
+        self.assertEqual(self.coalescer.request(1, 'valve', True, current=True), 'suppressed')
+
+        self.assertEqual(self.coalescer.pending_count(), 0)
+        self.assertEqual(self.coalescer.stats()['cancelled'], 1)
+        self.elapse(300)
+        self.assertEqual(self.coalescer._flush_due(), [])
+
+    def test_force_bypasses_dwell(self):
+        self.coalescer.request(1, 'valve', True, current=False)
+        self.assertEqual(self.coalescer.request(1, 'valve', False, current=True, force=True), 'sent')
+        self.publish.assert_called_with(1, 'valve', False, immediate=True)
+
+    def test_manual_command_applies_shorter_dwell(self):
+        self.coalescer.request(1, 'valve', True, current=False)
+        # Aynı yöndeki manuel komut yeniden gönderilir
+        self.assertEqual(self.coalescer.request(1, 'valve', True, manual=True), 'sent')
+        self.assertEqual(self.coalescer.request(1, 'valve', False, manual=True), 'deferred')
+
+        self.elapse(29)
+        self.assertEqual(self.coalescer._flush_due(), [])
+        self.elapse(1)
+        self.assertEqual(self.coalescer._flush_due(), [(1, 'valve', False)])
+        self.publish.assert_called_with(1, 'valve', False, immediate=True)
+
+    def test_failed_publish_keeps_state(self):
+        self.publish.return_value = 'failed'
+        self.assertEqual(self.coalescer.request(1, 'fan', True, current=False), 'failed')
+
+        self.publish.return_value = 'sent'
+        self.assertEqual(self.coalescer.request(1, 'fan', True, current=False), 'sent')
+
+    def test_queued_command_updates_status_when_dispatched(self):
+        room = Room.objects.create(name='Salon', user=User.objects.create(username='coalescer'))
+        DeviceStatus.objects.create(room=room)
+        self.publish.return_value = 'queued'
+
+        self.assertEqual(self.coalescer.request(room.id, 'valve', True, current=False), 'queued')
+        # Zamanlayıcıdaki komut DeviceStatus'a yansımadan tekrar istenirse yeniden gönderilmez
+        self.assertEqual(self.coalescer.request(room.id, 'valve', True, current=False), 'queued')
+        self.assertEqual(self.publish.call_count, 1)
+        self.assertFalse(DeviceStatus.objects.get(room=room).valve_status)
+        self.coalescer._on_dispatched(room.id, 'valve', True)
+        self.assertTrue(DeviceStatus.objects.get(room=room).valve_status)
+        self.assertEqual(self.coalescer.stats()['sent'], 1)
+
+        # Zamanlayıcıdaki komutun yerine daha yeni bir komut geçtiyse eski bildirim yok sayılır
+        self.coalescer.request(room.id, 'fan', True, current=False)
+        self.coalescer.request(room.id, 'fan', False, current=True, force=True)
+        self.coalescer._on_dispatched(room.id, 'fan', True)
+        self.assertFalse(DeviceStatus.objects.get(room=room).fan_status)
+
+    def test_state_survives_restart(self):
+        self.coalescer.request(1, 'valve', True, current=False)
+        self.coalescer.request(1, 'valve', False, current=True)
+        self.publish.return_value = 'queued'
+        self.coalescer.request(2, 'fan', True, current=False)
+
+        restored = CommandCoalescer()
+        self.assertEqual(restored.restore_state(self.coalescer.export_state()), 2)
+        self.assertEqual(restored.pending_keys(), {(1, 'valve'), (2, 'fan')})
+        with mock.patch.object(restored, '_publish', return_value='sent'):
+            self.assertEqual(restored._flush_due(), [(2, 'fan', True)])
+            # Vana bekleme süresi yeniden başlatmadan sonra da geçerli
+            self.assertEqual(restored.request(1, 'valve', True, current=True), 'suppressed')
+            self.assertEqual(restored.request(1, 'valve', False, current=True), 'deferred')
+
+
+@override_settings(COMMAND_DISPATCH={'WINDOW': 30, 'BURST_THRESHOLD': 10, 'MAX_RATE': 1000})
+class CommandDispatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.dispatcher = CommandDispatcher()
+        self.dispatcher.running = True  # Gönderim thread'i yerine testler _next_due ile sürer
+        publish = mock.patch.object(self.dispatcher, '_publish', return_value=True)
+        self.publish = publish.start()
+        self.addCleanup(publish.stop)
+        self.enqueue_patch = mock.patch.object(self.dispatcher, '_enqueue')
+        self.enqueue = self.enqueue_patch.start()
+        self.addCleanup(mock.patch.stopall)
+        self.callback = mock.Mock()
+
+    def dispatch_due(self, now):
+        """Verilen anda gönderim zamanı gelen tüm komutları gönder"""
+        while True:
+            key, command, wait = self.dispatcher._next_due(now)
+            if command is None:
+                return
+            self.dispatcher._dispatch(key, command, now)
+
+    def test_room_jitter_is_deterministic_and_within_window(self):
+        delays = [room_jitter(room_id, 'valve', 30) for room_id in range(500)]
+
+        self.assertEqual(delays, [room_jitter(room_id, 'valve', 30) for room_id in range(500)])
+        self.assertTrue(all(0 <= delay < 30 for delay in delays))
+        self.assertGreater(len({int(delay) for delay in delays}), 25)  # Pencereye yayılır
+        self.assertNotEqual(room_jitter(1, 'valve', 30), room_jitter(1, 'fan', 30))
+
+    def test_burst_beyond_threshold_is_spread_over_window(self):
+        for room_id in range(25):
+            self.assertEqual(self.dispatcher.submit(room_id, 'valve', True, callback=self.callback), 'queued')
+
+        started = self.dispatcher._burst_started
+        dues = {key[0]: command.due for key, command in self.dispatcher._queued.items()}
+        immediate = [room_id for room_id, due in dues.items() if due - started < 1.0]
+        self.assertEqual(self.dispatcher.stats()['spread'], 15)
+        self.assertGreaterEqual(len(immediate), 10)
+        for room_id in range(10, 25):
+            self.assertEqual(dues[room_id], started + room_jitter(room_id, 'valve', 30))
+
+        self.dispatch_due(started + 0.001)
+        self.assertEqual(self.callback.call_count, len([due for due in dues.values() if due <= started + 0.001]))
+        self.dispatch_due(started + 30)
+        self.assertEqual(self.callback.call_count, 25)
+        self.callback.assert_any_call(24, 'valve', True)
+        self.assertEqual(self.dispatcher.stats()['last_burst']['commands'], 25)
+
+    def test_newer_request_replaces_queued_command(self):
+        self.dispatcher.submit(1, 'fan', True, callback=self.callback)
+        self.dispatcher.submit(1, 'fan', False, callback=self.callback)
+        self.dispatch_due(time.monotonic())
+
+        self.enqueue.assert_called_once_with(1, 'fan', False)
+        self.callback.assert_called_once_with(1, 'fan', False)
+        self.assertEqual(self.dispatcher.stats()['replaced'], 1)
+
+    def test_rate_limit(self):
+        self.dispatcher.max_rate = 5
+        self.dispatcher._tokens = 5.0
+        for room_id in range(8):
+            self.dispatcher.submit(room_id, 'fan', True)
+        now = time.monotonic()
+
+        self.dispatch_due(now)
+        self.assertEqual(self.enqueue.call_count, 5)
+        self.assertAlmostEqual(self.dispatcher._next_due(now)[2], 0.2)
+        self.dispatch_due(now + 0.5)  # 2.5 token
+        self.assertEqual(self.enqueue.call_count, 7)
+
+    def test_due_command_is_retried_by_command_queue_while_disconnected(self):
+        self.enqueue_patch.stop()
+        queue = CommandQueue(publish=mock.Mock(return_value=False))
+        self.dispatcher.submit(1, 'valve', True, callback=self.callback)
+
+        with mock.patch.object(mqtt_client, 'command_queue', queue):
+            self.dispatch_due(time.monotonic())
+
+        # Zamanlayıcı yeniden denemez: komut kuyruğu bağlantı gelene kadar bekletir
+        self.callback.assert_called_once_with(1, 'valve', True)
+        self.assertEqual(self.dispatcher.stats()['queued'], 0)
+        self.assertEqual(queue.export_pending(), [[1, 'valve', True, 0]])
+        queue.publish.assert_called_once_with('esp32/stepper/control/1', 'CCW')
+
+    def test_immediate_command_bypasses_queue(self):
+        self.dispatcher.submit(1, 'valve', False, callback=self.callback)
+        self.assertEqual(self.dispatcher.submit(1, 'valve', True, immediate=True), 'sent')
+        self.publish.return_value = False
+        self.assertEqual(self.dispatcher.submit(2, 'valve', True, immediate=True), 'failed')
+
+        self.assertEqual(self.dispatcher.stats()['queued'], 0)
+        self.callback.assert_not_called()
+
+    def test_stop_drains_within_rate_limit_and_hands_over_rest(self):
+        self.dispatcher.max_rate = 5
+        self.dispatcher.drain_timeout = 0.5
+        for room_id in range(6):
+            self.dispatcher.submit(room_id, 'valve', True, callback=self.callback)
+        self.dispatcher._tokens, self.dispatcher._tokens_updated = 2.0, time.monotonic()
+
+        self.dispatcher.stop()
+
+        # 2 token hemen, DRAIN_TIMEOUT içinde 5 komut/s ile (0.2 ve 0.4 s'de) 2 token daha;
+        # kalanlar komut kuyruğunda hız sınırına göre aralıklı gönderilir
+        self.assertEqual(self.enqueue.call_args_list, [
+            mock.call(0, 'valve', True), mock.call(1, 'valve', True),
+            mock.call(2, 'valve', True), mock.call(3, 'valve', True),
+            mock.call(4, 'valve', True, delay=0.2), mock.call(5, 'valve', True, delay=0.4),
+        ])
+        # Devredilen komutlar da iletilmiş sayılır, birleştirici cihaz durumunu günceller
+        self.assertEqual(self.callback.call_args_list, [mock.call(room_id, 'valve', True) for room_id in range(6)])
+        self.assertEqual(self.dispatcher.stats()['handed_over'], 2)
+        self.assertEqual(self.dispatcher.stats()['queued'], 0)
+
+
+class DecisionEngineTickTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='engine')
+        self.rooms = [Room.objects.create(name=f'Oda {index}', user=user) for index in range(3)]
+        for room in self.rooms:
+            DeviceStatus.objects.create(room=room, heating_control_mode='schedule', fan_control_mode='schedule')
+        # Isıtma açık, fan kapalı bir zaman dilimi; tüm odalar soğuk
+        slot = SlotSetting(1, 22.0, True, False)
+        for target, kwargs in (
+            ('_load_latest_temperatures', {'return_value': {room.id: 15.0 for room in self.rooms}}),
+            ('schedules.schedule_cache.schedule_cache.active_schedules',
+             {'side_effect': lambda room_ids: {room_id: 1 for room_id in room_ids}}),
+            ('schedules.schedule_cache.schedule_cache.current_slots', {'return_value': {1: slot}}),
+        ):
+            if target.startswith('_'):
+                patcher = mock.patch.object(decision_engine, target, **kwargs)
+            else:
+                patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def request(self, room_id, device, value, current=None, force=False):
+        return 'suppressed' if value == current else 'sent'
+
+    def test_concurrent_ack_survives_tick(self):
+        acked_room = self.rooms[0]
+
+        def request_with_ack(room_id, device, value, current=None, force=False):
+            if room_id == acked_room.id and device == 'valve':
+                # Tick sırasında cihaz fanın açıldığını bildirdi (ör. manuel kontrol)
+                DeviceStatus.objects.filter(room=acked_room).update(fan_status=True, battery_level=50)
+            return self.request(room_id, device, value, current=current)
+
+        with mock.patch('schedules.command_coalescer.command_coalescer.request', side_effect=request_with_ack), \
+                self.assertLogs('schedules.decision_engine', 'INFO'):
+            decision_engine._process_rooms(self.rooms)
+
+        acked = DeviceStatus.objects.get(room=acked_room)
+        self.assertTrue(acked.valve_status)  # Motorun kararı yazıldı
+        self.assertTrue(acked.fan_status)  # Onay üzerine yazılmadı
+        self.assertEqual(acked.battery_level, 50)
+        self.assertEqual(
+            list(DeviceStatus.objects.exclude(room=acked_room).values_list('valve_status', 'fan_status')),
+            [(True, False), (True, False)],
+        )
+
+    def test_unchanged_statuses_are_not_written(self):
+        DeviceStatus.objects.update(valve_status=True)
+
+        with mock.patch('schedules.command_coalescer.command_coalescer.request', side_effect=self.request), \
+                self.assertLogs('schedules.decision_engine', 'INFO'):
+            with self.assertNumQueries(1):  # Yalnızca cihaz durumları okunur, değişiklik yazılmaz
+                decision_engine._process_rooms(self.rooms)
+
+    def test_tick_query_count_does_not_grow_with_room_count(self):
+        user = User.objects.create(username='engine-more')
+        rooms = self.rooms + [Room.objects.create(name=f'Ek oda {index}', user=user) for index in range(7)]
+        DeviceStatus.objects.bulk_create([
+            DeviceStatus(room=room, heating_control_mode='schedule', fan_control_mode='schedule')
+            for room in rooms[3:]
+        ])
+
+        with mock.patch.object(decision_engine, '_load_latest_temperatures',
+                               side_effect=lambda room_ids: dict.fromkeys(room_ids, 15.0)), \
+                mock.patch('schedules.command_coalescer.command_coalescer.request', side_effect=self.request), \
+                self.assertLogs('schedules.decision_engine', 'INFO'):
+            # Cihaz durumları tek sorguyla okunur, 10 odanın vanası tek UPDATE ile yazılır
+            with self.assertNumQueries(2):
+                decision_engine._process_rooms(rooms)
+
+        self.assertEqual(DeviceStatus.objects.filter(valve_status=True).count(), 10)
+
+
+class SetBasedLoadingTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='loading')
+        self.rooms = [Room.objects.create(name=f'Oda {index}', user=user) for index in range(4)]
+        now = timezone.now()
+        for room, temperatures in zip(self.rooms, ([19.0, 20.0], [18.0], [], [])):
+            for minutes, temperature in enumerate(temperatures):
+                SensorReading.objects.create(
+                    room=room, temperature=temperature, humidity=40.0, timestamp=now + timedelta(minutes=minutes)
+                )
+        DeviceStatus.objects.create(room=self.rooms[3], valve_status=True)
+        self.room_ids = [room.id for room in self.rooms]
+
+        latest = mock.patch('sensors.deadband.deadband_filter.latest', return_value=None)
+        self.latest = latest.start()
+        self.addCleanup(latest.stop)
+
+    def test_latest_temperatures_are_loaded_in_one_query(self):
+        with self.assertNumQueries(1):
+            temperatures = decision_engine._load_latest_temperatures(self.room_ids)
+
+        self.assertEqual(temperatures, dict(zip(self.room_ids, (20.0, 18.0, None, None))))
+
+    def test_latest_temperatures_from_deadband_cache_need_no_query(self):
+        self.latest.return_value = SensorReading(temperature=23.0, humidity=40.0)
+        with self.assertNumQueries(0):
+            self.assertEqual(decision_engine._load_latest_temperatures(self.room_ids), dict.fromkeys(self.room_ids, 23.0))
+
+    def test_missing_device_statuses_are_created_in_bulk(self):
+        with self.assertNumQueries(3):  # Okuma, toplu ekleme, eklenenleri okuma
+            statuses = decision_engine._load_device_statuses(self.room_ids)
+
+        self.assertEqual(set(statuses), set(self.room_ids))
+        self.assertTrue(statuses[self.rooms[3].id].valve_status)
+        self.assertEqual(DeviceStatus.objects.count(), 4)
+
+
+class EngineStateTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'state', 'engine.json')
+
+    def test_snapshot_round_trip(self):
+        coalescer_state = [[1, 'valve', True, 1_700_000_000.0, None]]
+        pending = [[1, 'valve', True, 2]]
+        write_snapshot(self.path, {1: RoomDecision(True, False, 1_700_000_000.0)}, coalescer_state, pending)
+
+        snapshot = read_snapshot(self.path, max_age=60)
+        decision = snapshot['decisions'][1]
+        self.assertEqual((decision.valve, decision.fan, decision.decided_at), (True, False, 1_700_000_000.0))
+        self.assertEqual(snapshot['coalescer'], coalescer_state)
+        self.assertEqual(snapshot['pending_commands'], pending)
+
+    def test_stale_missing_or_unsupported_snapshot_is_ignored(self):
+        self.assertIsNone(read_snapshot(self.path))
+
+        with mock.patch('schedules.engine_state.time.time', return_value=time.time() - 120):
+            write_snapshot(self.path, {}, [], [])
+        with self.assertLogs('schedules.engine_state', 'INFO'):
+            self.assertIsNone(read_snapshot(self.path, max_age=60))
+
+        # Sürüm 1: kararlarda histerezis konumu vardı
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"version": 1, "saved_at": %f, "decisions": {"1": [true, false, "inside", 0]}}' % time.time())
+        with self.assertLogs('schedules.engine_state', 'WARNING'):
+            self.assertIsNone(read_snapshot(self.path))
+
+    def test_engine_restores_command_history_and_pending_acks(self):
+        coalescer_state = [[1, 'valve', True, time.time() - 10, None]]
+        pending = [[2, 'fan', False, 1]]
+        with mock.patch.object(decision_engine, 'state_file', self.path), \
+                mock.patch.object(decision_engine, '_decisions', {1: RoomDecision(True, False, time.time())}), \
+                mock.patch.object(command_coalescer, 'export_state', return_value=coalescer_state), \
+                mock.patch.object(mqtt_client.command_queue, 'export_pending', return_value=pending):
+            decision_engine._save_state()
+
+        with mock.patch.object(decision_engine, 'state_file', self.path), \
+                mock.patch.object(decision_engine, '_decisions', {}), \
+                mock.patch.object(command_coalescer, 'restore_state', return_value=1) as restore_state, \
+                mock.patch.object(mqtt_client.command_queue, 'restore_pending', return_value=1) as restore_pending, \
+                self.assertLogs('schedules.decision_engine', 'INFO'):
+            decision_engine._restore_state()
+            self.assertTrue(decision_engine._decisions[1].valve)
+
+        restore_state.assert_called_once_with(coalescer_state)
+        restore_pending.assert_called_once_with(pending)
+
+    def test_restored_dwell_defers_reversal_after_restart(self):
+        coalescer = CommandCoalescer()
+        coalescer.restore_state([[1, 'valve', True, time.time() - 10, None]])
+        with mock.patch.object(coalescer, '_publish', return_value='sent') as publish, self.assertLogs(
+            'schedules.command_coalescer', 'INFO'
+        ):
+            # Yeniden başlatmadan 10 saniye önce açılan vana hemen kapatılmaz
+            self.assertEqual(coalescer.request(1, 'valve', False, current=True), 'deferred')
+        publish.assert_not_called()
+
+
+class TickSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.metrics = IngestMetrics()
+        self.metrics.metrics_dir = directory.name
+
+    def test_tick_profile_is_read_from_engine_process_snapshot(self):
+        # Karar motoru çalıştırmayan başka bir süreç
+        with open(os.path.join(self.metrics.metrics_dir, '99999.json'), 'w', encoding='utf-8') as f:
+            json.dump({'pid': 99999, 'timestamp': time.time(), 'gauges': {'buffer_pending': 0}}, f)
+
+        profiler = TickProfiler()
+        with profiler.tick('poll'):
+            profiler.add_rooms(3)
+        self.metrics.register_gauge(TICKS_GAUGE, profiler.snapshot)
+        self.metrics.write_snapshot()
+
+        ticks = read_tick_snapshots(self.metrics.metrics_dir, max_age=60)
+        self.assertEqual(len(ticks), 1)
+        self.assertEqual(ticks[0]['pid'], os.getpid())
+        self.assertEqual(ticks[0]['totals']['rooms'], 3)
+        self.assertEqual(ticks[0]['last_tick']['kind'], 'poll')
+
+        # Motor durdurulunca süreç artık tick profili yayınlamaz
+        self.metrics.unregister_gauge(TICKS_GAUGE)
+        self.metrics.write_snapshot()
+        self.assertEqual(read_tick_snapshots(self.metrics.metrics_dir, max_age=60), [])
+
+
+@skipUnless(vectorized.available(), "NumPy yüklü değil")
+class VectorizedEvaluationTests(SimpleTestCase):
+    def setUp(self):
+        self.commands = []
+        request = mock.patch('schedules.command_coalescer.command_coalescer.request', side_effect=self.request)
+        request.start()
+        self.addCleanup(request.stop)
+        pending_keys = mock.patch('schedules.command_coalescer.command_coalescer.pending_keys', return_value=set())
+        self.pending_keys = pending_keys.start()
+        self.addCleanup(pending_keys.stop)
+
+    def request(self, room_id, device, value, current=None, force=False):
+        """Birleştiricinin yerine: cihaz zaten istenen durumdaysa bastır, değilse hemen gönder"""
+        if value == current:
+            return 'suppressed'
+        self.commands.append((room_id, device, value))
+        return 'sent'
+
+    def make_fleet(self, seed, size=400):
+        """Tüm karar dallarını kapsayan rastgele oda girdileri"""
+        rng = random.Random(seed)
+        threshold = decision_engine.temperature_threshold
+        slots = {
+            1: SlotSetting(1, 21.0, True, False),
+            2: SlotSetting(2, 18.5, True, True),
+            3: SlotSetting(3, 24.0, False, True),
+        }
+        room_ids = list(range(1, size + 1))
+        latest_temperatures, device_statuses, active_schedules = {}, {}, {}
+        for room_id in room_ids:
+            if rng.random() > 0.05:
+                setpoint = rng.choice((21.0, 18.5, 24.0))
+                # Histerezis sınırları dahil
+                latest_temperatures[room_id] = rng.choice((
+                    setpoint - threshold, setpoint + threshold, round(rng.uniform(setpoint - 5, setpoint + 5), 1)
+                ))
+            schedule_id = rng.choice((None, 1, 2, 3, 4))  # 4: şu an zaman dilimi yok
+            if schedule_id is not None:
+                active_schedules[room_id] = schedule_id
+            device_statuses[room_id] = DeviceStatus(
+                id=room_id, room_id=room_id,
+                valve_status=rng.random() < 0.5, fan_status=rng.random() < 0.5,
+                heating_control_mode=rng.choice(('schedule', 'schedule', 'manual')),
+                fan_control_mode=rng.choice(('schedule', 'schedule', 'manual')),
+            )
+        return room_ids, latest_temperatures, device_statuses, active_schedules, slots
+
+    def evaluate(self, vectorized_path, fleet):
+        room_ids, latest_temperatures, device_statuses, active_schedules, slots = fleet
+        self.commands = []
+        with self.assertLogs('schedules.decision_engine', 'DEBUG'):  # Oda bazlı loglar çıktıya yazılmasın
+            if vectorized_path:
+                changed = decision_engine._evaluate_rooms_vectorized(
+                    room_ids, latest_temperatures, device_statuses, active_schedules, slots
+                )
+            else:
+                changed = decision_engine._evaluate_rooms(
+                    [Room(id=room_id) for room_id in room_ids], latest_temperatures, device_statuses,
+                    active_schedules, slots
+                )
+        states = {
+            room_id: (device_status.valve_status, device_status.fan_status)
+            for room_id, device_status in device_statuses.items()
+        }
+        return sorted(self.commands), sorted(device_status.room_id for device_status in changed), states
+
+    def test_vectorized_matches_scalar(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                scalar = self.evaluate(False, self.make_fleet(seed))
+                self.assertEqual(self.evaluate(True, self.make_fleet(seed)), scalar)
+                self.assertTrue(scalar[0])
+
+    def test_pending_requests_reach_coalescer(self):
+        fleet = self.make_fleet(0, size=50)
+        room_ids, latest_temperatures, device_statuses, active_schedules, slots = fleet
+        # Fanı zaten istenen durumda olan, schedule modundaki oda
+        room_id = next(
+            room_id for room_id in room_ids
+            if room_id in latest_temperatures and device_statuses[room_id].fan_control_mode == 'schedule'
+            and slots.get(active_schedules.get(room_id)) is not None
+            and device_statuses[room_id].fan_status == slots[active_schedules[room_id]].is_fan_active
+        )
+        self.pending_keys.return_value = {(room_id, 'fan')}
+
+        with mock.patch('schedules.command_coalescer.command_coalescer.request', return_value='suppressed') as request, \
+                self.assertLogs('schedules.decision_engine', 'DEBUG'):
+            decision_engine._evaluate_rooms_vectorized(
+                room_ids, latest_temperatures, device_statuses, active_schedules, slots
+            )
+
+        # Bekleyen (ertelenmiş) isteğin iptal edilebilmesi için istek yine de iletilir
+        request.assert_any_call(room_id, 'fan', device_statuses[room_id].fan_status,
+                                current=device_statuses[room_id].fan_status)
+
+
+class EventDrivenEngineTests(SimpleTestCase):
+    def setUp(self):
+        for name, value in (('mode', 'event'), ('_dirty_rooms', set()), ('_transitions', [])):
+            patcher = mock.patch.object(decision_engine, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        decision_engine._connect_signals()
+        self.addCleanup(readings_committed.disconnect, dispatch_uid='decision_engine_readings')
+        self.addCleanup(device_status_changed.disconnect, dispatch_uid='decision_engine_status')
+
+    def test_committed_readings_enqueue_rooms(self):
+        readings_committed.send(sender=None, room_ids={1, 2})
+        self.assertEqual(decision_engine._dirty_rooms, {1, 2})
+        self.assertTrue(decision_engine._wake_event.is_set())
+
+    def test_only_decision_inputs_enqueue_on_status_change(self):
+        device_status_changed.send(sender=None, room_id=1, changed_fields=['battery_level', 'connection_status'])
+        self.assertEqual(decision_engine._dirty_rooms, set())
+
+        device_status_changed.send(sender=None, room_id=1, changed_fields=['battery_level', 'valve_status'])
+        device_status_changed.send(sender=None, room_id=2, changed_fields=['fan_status'])
+        self.assertEqual(decision_engine._dirty_rooms, {1, 2})
+
+    def test_due_transitions_are_popped_and_rescheduled(self):
+        now = time.time()
+        decision_engine._transitions = [(now - 1, 1, 10), (now + 60, 2, 20)]
+        next_due = datetime.fromtimestamp(now + 3600, tz=dt_timezone.utc)
+
+        with mock.patch('schedules.schedule_cache.schedule_cache.next_transition',
+                        return_value=next_due) as next_transition:
+            self.assertEqual(decision_engine._pop_due_transitions(), {1})
+
+        next_transition.assert_called_once()
+        self.assertEqual(next_transition.call_args.args[0], 10)
+        self.assertEqual(sorted(room_id for _, room_id, _ in decision_engine._transitions), [1, 2])
+        self.assertEqual(decision_engine._transitions[0][1], 2)
+        self.assertGreater(max(due for due, _, _ in decision_engine._transitions), now + 3600)
+
+
+class LeaderElectionTests(TestCase):
+    @override_settings(LEADER_ELECTION={'ENABLED': True, 'BACKEND': None})
+    def test_should_start_only_in_server_processes(self):
+        election = LeaderElection()
+        for argv, expected in (
+            (['manage.py', 'runserver'], True),
+            (['/srv/backend/manage.py', 'runserver_with_decision_engine', '0.0.0.0:8000'], True),
+            (['manage.py', 'migrate'], False),
+            (['manage.py', 'test'], False),
+            (['manage.py'], False),
+            (['django-admin', 'shell'], False),
+            (['/usr/bin/gunicorn', 'backend.wsgi'], True),
+            (['daphne', 'backend.asgi:application'], True),
+        ):
+            with self.subTest(argv=argv):
+                self.assertEqual(election.should_start(argv), expected)
+
+    @override_settings(LEADER_ELECTION={'ENABLED': False})
+    def test_disabled_never_starts(self):
+        self.assertFalse(LeaderElection().should_start(['manage.py', 'runserver']))
+
+    @override_settings(LEADER_ELECTION={})
+    def test_enabled_by_default(self):
+        self.assertTrue(LeaderElection().should_start(['manage.py', 'runserver']))
+
+    def test_management_command_starts_engine_through_election(self):
+        with mock.patch.object(leader_election, 'start') as start, \
+                mock.patch.object(decision_engine, 'start') as engine_start:
+            call_command('start_decision_engine', 'start', stdout=mock.Mock())
+
+        start.assert_called_once_with(on_elected, on_demoted)
+        engine_start.assert_not_called()
+
+    @override_settings(LEADER_ELECTION={'ENABLED': True, 'BACKEND': None})
+    def test_without_backend_process_is_always_leader(self):
+        election = LeaderElection()
+        on_elected, on_demoted = mock.Mock(), mock.Mock()
+
+        election.start(on_elected, on_demoted)
+        self.assertTrue(election.is_leader)
+        on_elected.assert_called_once_with()
+        election.stop()
+        self.assertFalse(election.is_leader)
+        on_demoted.assert_called_once_with()
+
+    def test_database_lease_has_single_owner(self):
+        first = DatabaseLease('decision_engine', 'first', ttl=15)
+        second = DatabaseLease('decision_engine', 'second', ttl=15)
+
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertTrue(first.acquire())  # Yenileme
+        self.assertEqual(second.current_owner(), 'first')
+
+        first.release()
+        self.assertIsNone(first.current_owner())
+        self.assertTrue(second.acquire())
+        self.assertFalse(first.acquire())
+
+    def test_expired_database_lease_is_taken_over(self):
+        first = DatabaseLease('decision_engine', 'first', ttl=15)
+        second = DatabaseLease('decision_engine', 'second', ttl=15)
+        self.assertTrue(first.acquire())
+
+        # Lider TTL içinde yenilemedi (ör. süreç öldü)
+        EngineLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(second.acquire())
+        self.assertFalse(first.acquire())
+        self.assertEqual(EngineLease.objects.get().owner, 'second')
+
+    def test_file_lease_has_single_owner(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'engine.lock')
+            first, second = FileLease(path, 'first'), FileLease(path, 'second')
+
+            self.assertTrue(first.acquire())
+            self.assertFalse(second.acquire())
+            self.assertEqual(second.current_owner(), 'first')
+            first.release()
+            self.assertTrue(second.acquire())
+            second.release()
@@ -0,0 +1,195 @@
+# schedules/tick_profiler.py
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from django.db import connection
+from sensors.metrics import Histogram, read_snapshots
+
+# Karar motoru tick'inin aşamaları
+PHASES = ('load', 'resolve', 'decide', 'publish', 'persist')
+
+# Tick süresi histogramının kova üst sınırları (saniye)
+TICK_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Karar motorunu çalıştıran süreç tick profilini ingest metrik snapshot'ına bu göstergeyle yazar
+TICKS_GAUGE = 'decision_engine_ticks'
+
+
+class TickRecord:
+    """
+    Tek bir tick'in ölçümleri. Aşamalar iç içe açılabilir (ör. karar verirken komut
+    gönderimi); iç aşamanın süresi dış aşamadan düşülür.
+    """
+
+    __slots__ = ('kind', 'started', 'duration', 'phases', 'queries', 'rooms', 'skipped', 'forced_off',
+                 'commands', '_stack')
+
+    def __init__(self, kind):
+        self.kind = kind  # 'poll', 'sweep' veya 'event'
+        self.started = time.time()
+        self.duration = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.rooms = 0  # Değerlendirilen oda sayısı
+        self.skipped = {}  # Neden -> oda sayısı (sensör verisi yok, manuel mod)
+        self.forced_off = {}  # Neden -> oda sayısı (aktif program veya zaman dilimi yok)
+        self.commands = {}  # Birleştirici sonucu (sent, queued, deferred, failed) -> komut sayısı
+        self._stack = []  # [aşama, başlangıç] (perf_counter)
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.phases[outer[0]] += now - outer[1]
+        self._stack.append([name, now])
+
+    def exit(self):
+        now = time.perf_counter()
+        name, started = self._stack.pop()
+        self.phases[name] += now - started
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'started': self.started,
+            'duration': self.duration,
+            'phases': dict(self.phases),
+            'queries': self.queries,
+            'rooms': self.rooms,
+            'skipped': dict(self.skipped),
+            'forced_off': dict(self.forced_off),
+            'commands': dict(self.commands),
+        }
+
+
+class TickProfiler:
+    """
+    Karar motoru tick'lerinin profili: aşama süreleri, sorgu sayısı, oda ve komut sayıları.
+    Son WINDOW tick'in süre histogramı ve check_interval'ı aşan tick sayısı tutulur.
+    Ölçümler yalnızca tick'i başlatan thread'de kaydedilir; diğer thread'lerdeki çağrılar
+    (ör. API'den tek oda işleme) etkilenmez.
+    """
+
+    def __init__(self, window=1000):
+        self._recent = deque(maxlen=window)  # (tick süresi, aşırı mı)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last = None
+        self._totals = {
+            'ticks': 0,
+            'overruns': 0,
+            'rooms': 0,
+            'queries': 0,
+            'commands': {},
+            'skipped': {},
+        }
+
+    @property
+    def current(self):
+        """Bu thread'de süren tick (yoksa None)"""
+        return getattr(self._local, 'record', None)
+
+    @contextmanager
+    def tick(self, kind, budget=None):
+        """Bir tick'i ölç; budget (saniye) aşılırsa aşım sayacı artar"""
+        if self.current is not None:
+            yield self.current  # İç içe tick açılmaz
+            return
+
+        record = TickRecord(kind)
+        self._local.record = record
+
+        def count_query(execute, sql, params, many, context):
+            record.queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_query):
+                yield record
+        finally:
+            record.duration = time.perf_counter() - started
+            self._local.record = None
+            self._finish(record, budget)
+
+    @contextmanager
+    def phase(self, name):
+        """Süren tick'te bir aşamayı ölç (tick yoksa hiçbir şey yapmaz)"""
+        record = self.current
+        if record is None:
+            yield
+            return
+        record.enter(name)
+        try:
+            yield
+        finally:
+            record.exit()
+
+    def count(self, field, key, amount=1):
+        """Süren tick'te skipped/forced_off/commands sayaçlarından birini artır"""
+        record = self.current
+        if record is None or not amount:
+            return
+        counters = getattr(record, field)
+        counters[key] = counters.get(key, 0) + amount
+
+    def add_rooms(self, amount):
+        record = self.current
+        if record is not None:
+            record.rooms += amount
+
+    def _finish(self, record, budget):
+        overrun = budget is not None and record.duration > budget
+        with self._lock:
+            self._recent.append((record.duration, overrun))
+            self._last = record
+            totals = self._totals
+            totals['ticks'] += 1
+            totals['overruns'] += overrun
+            totals['rooms'] += record.rooms
+            totals['queries'] += record.queries
+            for field in ('commands', 'skipped'):
+                for key, value in getattr(record, field).items():
+                    totals[field][key] = totals[field].get(key, 0) + value
+
+    def snapshot(self):
+        """Son tick, son WINDOW tick'in süre dağılımı ve başlangıçtan beri toplamlar"""
+        with self._lock:
+            recent = list(self._recent)
+            last = self._last.as_dict() if self._last else None
+            totals = {
+                key: dict(value) if isinstance(value, dict) else value
+                for key, value in self._totals.items()
+            }
+
+        histogram = Histogram(TICK_BUCKETS)
+        for duration, _ in recent:
+            histogram.observe(duration)
+        buckets = {
+            f"le_{bound}": count for bound, count in zip(TICK_BUCKETS, histogram.buckets)
+        }
+        buckets['inf'] = histogram.buckets[-1]
+
+        return {
+            'last_tick': last,
+            'recent': {
+                'ticks': len(recent),
+                'overruns': sum(1 for _, overrun in recent if overrun),
+                'duration_seconds': histogram.as_dict(),
+                'buckets': buckets,
+            },
+            'totals': totals,
+        }
+
+
+def read_tick_snapshots(metrics_dir, max_age=None):
+    """Karar motoru çalıştıran süreçlerin metrik snapshot'larındaki tick profilleri, en yenisi önce"""
+    ticks = [
+        {'pid': snapshot['pid'], 'timestamp': snapshot['timestamp'], **snapshot['gauges'][TICKS_GAUGE]}
+        for snapshot in read_snapshots(metrics_dir, max_age)
+        if snapshot.get('gauges', {}).get(TICKS_GAUGE)
+    ]
+    return sorted(ticks, key=lambda snapshot: snapshot['timestamp'], reverse=True)
@@ -0,0 +1,129 @@
+# schedules/vectorized.py
+import logging
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy isteğe bağlı; yoksa karar motoru oda bazlı değerlendirmeye döner
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Tüm odalar için hesaplanan kararlar (her alan oda sırasına göre bir dizi)
+FleetDecision = namedtuple('FleetDecision', [
+    'valve',  # İstenen vana durumu
+    'fan',  # İstenen fan durumu
+    'valve_controlled',  # Vana karar motorunun kontrolünde (schedule modu ve sıcaklık verisi var)
+    'fan_controlled',  # Fan karar motorunun kontrolünde
+    'valve_changed',  # Komut gönderilmesi gereken vanalar (istenen != mevcut)
+    'fan_changed',  # Komut gönderilmesi gereken fanlar
+])
+
+
+def available():
+    """NumPy yüklü mü"""
+    return np is not None
+
+
+class FleetArrays:
+    """
+    Karar girdilerinin oda başına bir eleman olacak şekilde dizilere yerleştirilmiş hali.
+    Sıcaklık verisi olmayan odalarda temperature, zaman dilimi olmayanlarda setpoint NaN'dir.
+    """
+
+    __slots__ = (
+        'room_ids', 'temperature', 'setpoint', 'threshold',
+        'heating_active', 'fan_active', 'heating_schedule', 'fan_schedule',
+        'valve', 'fan',
+    )
+
+    def __init__(self, room_ids, temperature, setpoint, threshold,
+                 heating_active, fan_active, heating_schedule, fan_schedule, valve, fan):
+        self.room_ids = room_ids
+        self.temperature = temperature
+        self.setpoint = setpoint
+        self.threshold = threshold
+        self.heating_active = heating_active
+        self.fan_active = fan_active
+        self.heating_schedule = heating_schedule
+        self.fan_schedule = fan_schedule
+        self.valve = valve
+        self.fan = fan
+
+    def __len__(self):
+        return len(self.room_ids)
+
+    @classmethod
+    def build(cls, room_ids, latest_temperatures, device_statuses, active_schedules, current_slots, threshold):
+        """
+        Karar motorunun toplu yüklediği verilerden dizileri oluştur.
+        threshold: Tüm odalar için tek değer veya oda ID -> tolerans sözlüğü.
+        """
+        count = len(room_ids)
+        nan = float('nan')
+
+        slots = [current_slots.get(active_schedules.get(room_id)) for room_id in room_ids]
+        statuses = [device_statuses[room_id] for room_id in room_ids]
+
+        temperature = np.fromiter(
+            (nan if (value := latest_temperatures.get(room_id)) is None else value for room_id in room_ids),
+            dtype=np.float64, count=count
+        )
+        setpoint = np.fromiter(
+            (nan if slot is None else slot.desired_temperature for slot in slots),
+            dtype=np.float64, count=count
+        )
+        if isinstance(threshold, dict):
+            threshold = np.fromiter((threshold[room_id] for room_id in room_ids), dtype=np.float64, count=count)
+        else:
+            threshold = np.full(count, threshold, dtype=np.float64)
+
+        return cls(
+            room_ids=np.fromiter(room_ids, dtype=np.int64, count=count),
+            temperature=temperature,
+            setpoint=setpoint,
+            threshold=threshold,
+            heating_active=np.fromiter((slot is not None and slot.is_heating_active for slot in slots),
+                                       dtype=bool, count=count),
+            fan_active=np.fromiter((slot is not None and slot.is_fan_active for slot in slots),
+                                   dtype=bool, count=count),
+            heating_schedule=np.fromiter((status.heating_control_mode == 'schedule' for status in statuses),
+                                         dtype=bool, count=count),
+            fan_schedule=np.fromiter((status.fan_control_mode == 'schedule' for status in statuses),
+                                     dtype=bool, count=count),
+            valve=np.fromiter((status.valve_status for status in statuses), dtype=bool, count=count),
+            fan=np.fromiter((status.fan_status for status in statuses), dtype=bool, count=count),
+        )
+
+
+def evaluate_fleet(arrays):
+    """
+    Tüm odalar için vana ve fan kararlarını tek geçişte hesapla.
+    Kurallar DecisionEngine._evaluate_room ile aynıdır:
+    - Sıcaklık verisi olmayan odalar ve manuel moddaki cihazlar kontrol edilmez
+    - Zaman dilimi yoksa veya programda ısıtma kapalıysa vana kapatılır
+    - Sıcaklık hedef ± tolerans aralığındaysa vana durumu korunur (histerezis)
+    - Fan programdaki duruma getirilir
+    """
+    has_temperature = ~np.isnan(arrays.temperature)
+    heating_on = ~np.isnan(arrays.setpoint) & arrays.heating_active
+
+    # NaN karşılaştırmaları False döner, bu yüzden veri olmayan odalar vanayı değiştirmez
+    with np.errstate(invalid='ignore'):
+        too_cold = arrays.temperature < arrays.setpoint - arrays.threshold
+        too_hot = arrays.temperature > arrays.setpoint + arrays.threshold
+
+    valve = heating_on & (too_cold | (arrays.valve & ~too_hot))
+    fan = arrays.fan_active.copy()
+
+    valve_controlled = has_temperature & arrays.heating_schedule
+    fan_controlled = has_temperature & arrays.fan_schedule
+
+    return FleetDecision(
+        valve=valve,
+        fan=fan,
+        valve_controlled=valve_controlled,
+        fan_controlled=fan_controlled,
+        valve_changed=valve_controlled & (valve != arrays.valve),
+        fan_changed=fan_controlled & (fan != arrays.fan),
+    )
@@ -139,15 +139,37 @@ class ScheduleViewSet(viewsets.ModelViewSet):
     def decision_engine_status(self, request):
         if request.method == 'GET':
             # Mevcut durumu döndür
+            from schedules.command_coalescer import command_coalescer
+            from schedules.dispatcher import command_dispatcher
+            from schedules.leader import leader_election
+            from schedules.tick_profiler import read_tick_snapshots
+            from sensors.metrics import ingest_metrics
+            from sensors.mqtt_client import mqtt_client
+            # Karar motoru lider süreçte çalışır; tick profili onun metrik snapshot dosyasından okunur
+            ticks = read_tick_snapshots(ingest_metrics.metrics_dir, max_age=max(ingest_metrics.interval, 1) * 3)
             return Response({
                 'running': decision_engine.running,
+                'mode': decision_engine.mode,
                 'check_interval': decision_engine.check_interval,
-                'temperature_threshold': decision_engine.temperature_threshold
+                'temperature_threshold': decision_engine.temperature_threshold,
+                'leader': leader_election.status(),
+                'ticks': ticks[0] if ticks else None,
+                'command_queue': mqtt_client.command_queue.stats(),
+                'command_coalescer': command_coalescer.stats(),
+                'command_dispatcher': command_dispatcher.stats(),
+                'ingest_metrics': ingest_metrics.snapshot()
             })
         elif request.method == 'POST':
             # Durumu değiştir
             action = request.data.get('action')
             if action == 'start':
+                from schedules.leader import leader_election
+                if leader_election.running and not leader_election.is_leader:
+                    # Seçim açıkken motor yalnızca lider süreçte çalışabilir
+                    return Response(
+                        {'error': 'Bu süreç lider değil', 'leader': leader_election.status()['leader']},
+                        status=status.HTTP_409_CONFLICT
+                    )
                 decision_engine.start()
                 return Response({'status': 'Decision Engine başlatıldı'})
             elif action == 'stop':
@@ -9,7 +9,7 @@ class RoomAdmin(admin.ModelAdmin):
 
 @admin.register(SensorReading)
 class SensorReadingAdmin(admin.ModelAdmin):
-    list_display = ['room', 'temperature', 'humidity', 'presence', 'timestamp']
+    list_display = ['room', 'temperature', 'humidity', 'presence', 'timestamp', 'received_at']
     list_filter = ['room', 'presence', 'timestamp']
     search_fields = ['room__name']
     date_hierarchy = 'timestamp'
@@ -5,6 +5,9 @@ class SensorsConfig(AppConfig):
     name = 'sensors'
     
     def ready(self):
+        # Oda kaydını güncel tutan sinyalleri bağla
+        from . import signals  # noqa: F401
+        
         # Uygulamayı yeniden yüklerken tekrar çalışmaması için kontrol
         import sys
         if 'runserver' not in sys.argv:
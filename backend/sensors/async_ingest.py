@@ -0,0 +1,315 @@
+# sensors/async_ingest.py
+import asyncio
+import logging
+import time
+import paho.mqtt.client as mqtt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, OperationalError
+from .deadband import deadband_filter
+from .message_log import message_log
+from .metrics import ingest_metrics
+from .mqtt_client import SENSOR_TOPIC, STATUS_TOPIC, SENSOR_TYPES
+from .payloads import parse_sensor_value, parse_telemetry
+from .persistence import build_sensor_reading, write_sensor_readings, readings_with_existing_rooms, save_status_delta
+from .reassembly import ReassemblyCache
+from .room_registry import room_registry
+from .signals import readings_committed, device_status_changed
+from .status_parser import parse_status
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncioMqttAdapter:
+    """
+    paho istemcisini asyncio olay döngüsüne bağlar.
+    Soket okuma/yazma işlemleri loop_start thread'i yerine olay döngüsünde yapılır.
+    """
+
+    def __init__(self, loop, client):
+        self.loop = loop
+        self.client = client
+        self.misc_task = None
+
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self.misc_task = self.loop.create_task(self._misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self.misc_task:
+            self.misc_task.cancel()
+            self.misc_task = None
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def _misc_loop(self):
+        """Keepalive ve yeniden gönderim gibi periyodik paho işlemleri"""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                break
+
+
+class AsyncIngestService:
+    """
+    Thread tabanlı MQTTClient'a alternatif asyncio veri alım servisi.
+
+    Tek bir olay döngüsünde çalışır; aynı anda işlenen mesaj sayısı
+    ASYNC_MAX_IN_FLIGHT, eşzamanlı veritabanı işlemleri ASYNC_DB_CONCURRENCY
+    semaforu ile sınırlandırılır. Sensör okumaları partiler halinde yazılır.
+    """
+
+    def __init__(self, shared_group=None):
+        ingest_settings = getattr(settings, 'MQTT_INGEST', {})
+        self.max_in_flight = ingest_settings.get('ASYNC_MAX_IN_FLIGHT', 1000)
+        self.db_concurrency = ingest_settings.get('ASYNC_DB_CONCURRENCY', 2)
+        self.batch_size = ingest_settings.get('BUFFER_MAX_BATCH_SIZE', 500)
+        self.max_pending = ingest_settings.get('BUFFER_MAX_PENDING', 20000)
+        self.flush_interval = ingest_settings.get('BUFFER_FLUSH_INTERVAL', 1.0)
+        self.subscribe_qos = ingest_settings.get('SUBSCRIBE_QOS', 0)
+        self.shared_group = shared_group or ingest_settings.get('SHARED_GROUP')
+
+        self.reassembly_cache = ReassemblyCache()
+        self.client = None
+        self.is_connected = False
+        self.dropped_count = 0  # İşlem kapasitesi dolduğu için atılan mesaj sayısı
+        self._tasks = set()  # İşlenmekte olan mesaj görevleri
+        self._batch = []  # Yazılmayı bekleyen okumalar
+
+        ingest_metrics.register_gauge('in_flight', lambda: len(self._tasks))
+        ingest_metrics.register_gauge('buffer_pending', lambda: len(self._batch))
+        ingest_metrics.register_gauge('dropped.in_flight_limit', lambda: self.dropped_count)
+        ingest_metrics.register_gauge('reassembly', self.reassembly_cache.stats)
+
+    async def run(self, timeout=0):
+        """Broker'a bağlan ve durdurulana (veya timeout saniye geçene) kadar mesajları işle"""
+        self._loop = asyncio.get_running_loop()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._db_slots = asyncio.Semaphore(self.db_concurrency)
+        self._stopping = asyncio.Event()
+
+        # Oda kaydını önceden yükle, mesaj işlerken olay döngüsünde sorgu yapılmasın
+        await sync_to_async(room_registry.preload)()
+
+        self.client = mqtt.Client()
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.on_disconnect = self.on_disconnect
+        AsyncioMqttAdapter(self._loop, self.client)
+
+        mqtt_broker = getattr(settings, 'MQTT_BROKER', 'localhost')
+        mqtt_port = getattr(settings, 'MQTT_PORT', 1883)
+        mqtt_keepalive = getattr(settings, 'MQTT_KEEPALIVE', 60)
+        logger.info(f"MQTT broker'a bağlanılıyor (asyncio): {mqtt_broker}:{mqtt_port}")
+        self.client.connect(mqtt_broker, mqtt_port, mqtt_keepalive)
+
+        self.reassembly_cache.start()
+        message_log.start()
+        ingest_metrics.start()
+        flush_task = self._loop.create_task(self._run_flush_loop())
+        try:
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self._stopping.wait()
+        finally:
+            self._stopping.set()
+            self.client.disconnect()
+            flush_task.cancel()
+            self.reassembly_cache.stop()
+
+            # İşlenmekte olan mesajları bekle ve kalan okumaları yaz
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            # Geçici veritabanı hatasında geri konan partiler için deneme sayısı sınırlı
+            for _ in range(-(-len(self._batch) // self.batch_size)):
+                await self._flush()
+            message_log.stop()
+            ingest_metrics.stop()
+            logger.info("Asyncio MQTT veri alım servisi durduruldu")
+
+    def stop(self):
+        """Servisi durdur (olay döngüsü thread'inden çağrılmalı)"""
+        self._stopping.set()
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            logger.error(f"MQTT broker'a bağlanılamadı, hata kodu: {rc}")
+            return
+
+        self.is_connected = True
+        # Yalnızca veri alım servisi (komut göndermez): durum mesajları da grupla paylaşılır
+        prefix = f"$share/{self.shared_group}/" if self.shared_group else ''
+        sensor_topic = f"{prefix}{SENSOR_TOPIC}"
+        status_topic = f"{prefix}{STATUS_TOPIC}"
+        client.subscribe([(sensor_topic, self.subscribe_qos), (status_topic, self.subscribe_qos)])
+        logger.info(f"MQTT broker'a bağlandı (asyncio), abone olundu: {sensor_topic}, {status_topic}")
+
+    def on_disconnect(self, client, userdata, rc):
+        self.is_connected = False
+        if rc != 0 and not self._stopping.is_set():
+            logger.warning(f"Beklenmeyen MQTT bağlantı kesintisi, hata kodu: {rc}; yeniden bağlanılacak")
+            self._loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Bağlantı geri gelene kadar artan aralıklarla yeniden bağlan"""
+        delay = 1
+        while not self._stopping.is_set() and not self.is_connected:
+            try:
+                self.client.reconnect()
+                return
+            except Exception as e:
+                logger.warning(f"Yeniden bağlanma başarısız: {str(e)}, {delay} saniye sonra tekrar denenecek")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    def on_message(self, client, userdata, msg):
+        """Mesaj alındığında çağrılır (olay döngüsü içinde)"""
+        received_at = time.time()
+        message_log.append(msg.topic, msg.payload, received_at)
+        # Eşzamanlı işlenen mesaj sınırına ulaşıldıysa mesajı at
+        if self._in_flight.locked():
+            self.dropped_count += 1
+            if self.dropped_count % 1000 == 1:
+                logger.warning(f"Asyncio servis kapasitesi dolu, toplam {self.dropped_count} mesaj atıldı")
+            return
+
+        task = self._loop.create_task(self._handle_message(msg.topic, msg.payload, received_at))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle_message(self, topic, raw_payload, received_at):
+        async with self._in_flight:
+            kind = 'ignored'
+            try:
+                payload = raw_payload.decode('utf-8').strip()
+                parts = topic.split('/')
+
+                if parts[0] == 'room' and len(parts) == 3 and parts[1].isdigit() and parts[2] in SENSOR_TYPES:
+                    kind = parts[2]
+                    ingest_metrics.incr(f"received.{kind}")
+                    room_id = parts[1]
+                    if parts[2] == 'telemetry':
+                        data = parse_telemetry(payload)
+                    else:
+                        field, value = parse_sensor_value(parts[2], payload)
+                        data = self.reassembly_cache.update(room_id, field, value)
+                    if data is not None:
+                        await self._add_reading(room_id, data, received_at)
+
+                elif parts[0] == 'esp32' and len(parts) == 3 and parts[1] == 'status' and parts[2].isdigit():
+                    kind = 'status'
+                    ingest_metrics.incr('received.status')
+                    delta = parse_status(payload)
+                    if delta.is_empty():
+                        return
+                    room_id = await self._resolve_room(parts[2])
+                    if room_id is None:
+                        return
+                    async with self._db_slots:
+                        started = time.monotonic()
+                        changed_fields = await sync_to_async(save_status_delta, thread_sensitive=False)(room_id, delta)
+                        ingest_metrics.observe('status_write_seconds', time.monotonic() - started)
+                    if changed_fields:
+                        device_status_changed.send(sender=self.__class__, room_id=room_id, changed_fields=changed_fields)
+
+                else:
+                    ingest_metrics.incr('received.ignored')
+
+            except ValueError as e:
+                ingest_metrics.incr(f"parse_errors.{kind}")
+                logger.warning(f"Geçersiz MQTT mesajı: {topic}, {e}")
+            except Exception as e:
+                logger.error(f"MQTT mesaj işleme hatası: {str(e)}", exc_info=True)
+
+    async def _resolve_room(self, room_id):
+        """Bilinen odalar bellekten; bilinmeyen odalar için veritabanı işlemi semafor altında yapılır"""
+        if room_registry.exists(room_id):
+            return int(room_id)
+        async with self._db_slots:
+            resolved = await sync_to_async(room_registry.resolve, thread_sensitive=False)(room_id)
+        if resolved is None:
+            ingest_metrics.incr('dropped.unknown_room')
+        return resolved
+
+    async def _add_reading(self, room_id, data, received_at):
+        room_id = await self._resolve_room(room_id)
+        if room_id is None:
+            return
+        reading = build_sensor_reading(room_id, data, received_at)
+        if not deadband_filter.should_store(reading):
+            ingest_metrics.incr('readings.suppressed')
+            return
+        self._batch.append(reading)
+        if len(self._batch) >= self.batch_size:
+            await self._flush()
+
+    async def _flush(self):
+        """Bekleyen okumalardan en fazla batch_size kadarını veritabanına yaz"""
+        batch = self._batch[:self.batch_size]
+        del self._batch[:len(batch)]
+        if not batch:
+            return
+
+        async with self._db_slots:
+            started = time.monotonic()
+            try:
+                try:
+                    await sync_to_async(write_sensor_readings, thread_sensitive=False)(batch)
+                except IntegrityError as e:
+                    # Başka bir süreçte silinmiş oda: yalnızca o odanın okumalarını at, kalanları yeniden yaz.
+                    # Oda kaydı temizlenmez; yeniden yükleme olay döngüsünde senkron sorgu çalıştırırdı
+                    kept = await sync_to_async(readings_with_existing_rooms, thread_sensitive=False)(batch)
+                    kept_ids = {id(reading) for reading in kept}
+                    deadband_filter.discard(reading for reading in batch if id(reading) not in kept_ids)
+                    ingest_metrics.incr('readings.write_failed', len(batch) - len(kept))
+                    logger.warning(f"Silinmiş odalara ait {len(batch) - len(kept)} sensör okuması atıldı: {str(e)}")
+                    batch = kept
+                    if not batch:
+                        return
+                    await sync_to_async(write_sensor_readings, thread_sensitive=False)(batch)
+            except OperationalError as e:
+                # Geçici veritabanı hatası: partiyi kapasite kadar bekleyen okumaların başına geri koy
+                space = self.max_pending - len(self._batch)
+                kept = batch[max(0, len(batch) - space):] if space > 0 else []
+                self._batch[:0] = kept
+                deadband_filter.discard(batch[:len(batch) - len(kept)])
+                ingest_metrics.incr('readings.requeued', len(kept))
+                ingest_metrics.incr('readings.write_failed', len(batch) - len(kept))
+                logger.error(
+                    f"Toplu sensör verisi kayıt hatası ({len(kept)} okuma yeniden denenecek, "
+                    f"{len(batch) - len(kept)} okuma kaybedildi): {str(e)}"
+                )
+                return
+            except Exception as e:
+                deadband_filter.discard(batch)
+                ingest_metrics.incr('readings.write_failed', len(batch))
+                logger.error(f"Toplu sensör verisi kayıt hatası ({len(batch)} okuma kaybedildi): {str(e)}")
+                return
+
+            committed_at = time.time()
+            ingest_metrics.observe('db_write_seconds', time.monotonic() - started)
+            ingest_metrics.observe_many(
+                'ingest_lag_seconds', [committed_at - reading.received_at.timestamp() for reading in batch]
+            )
+            ingest_metrics.incr('readings.written', len(batch))
+            readings_committed.send(sender=self.__class__, room_ids={reading.room_id for reading in batch})
+
+    async def _run_flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
@@ -0,0 +1,192 @@
+# sensors/command_queue.py
+import logging
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Cihaz tipi -> (komut topic'i, True komutu, False komutu)
+COMMAND_TOPICS = {
+    'valve': ('esp32/stepper/control/{room_id}', 'CCW', 'CW'),  # CCW=Aç, CW=Kapat
+    'fan': ('esp32/fan/control/{room_id}', 'ON', 'OFF'),
+}
+
+
+class PendingCommand:
+    """Onay (ack) bekleyen tek bir cihaz komutu"""
+
+    __slots__ = ('room_id', 'device', 'value', 'topic', 'payload', 'attempts', 'next_attempt', 'created')
+
+    def __init__(self, room_id, device, value):
+        topic_template, on_payload, off_payload = COMMAND_TOPICS[device]
+        self.room_id = room_id
+        self.device = device
+        self.value = value
+        self.topic = topic_template.format(room_id=room_id)
+        self.payload = on_payload if value else off_payload
+        self.attempts = 0  # Gönderim sayısı
+        self.next_attempt = 0.0  # Bir sonraki gönderim zamanı (monotonic)
+        self.created = time.monotonic()
+
+
+class CommandQueue:
+    """
+    Cihazlara giden komutlar için onay takipli kuyruk.
+
+    Her oda ve cihaz (valf/fan) için yalnızca en son istenen komut tutulur.
+    Komut, cihaz esp32/status/{room_id} üzerinden aynı durumu bildirene kadar
+    (ör. "Stepper completed CCW", "Fans: ON") artan aralıklarla yeniden gönderilir.
+    MAX_ATTEMPTS gönderimden sonra onay gelmezse komut zaman aşımına uğrar.
+    """
+
+    def __init__(self, publish):
+        command_settings = getattr(settings, 'MQTT_COMMANDS', {})
+        self.ack_timeout = command_settings.get('ACK_TIMEOUT', 5)  # saniye, ilk yeniden deneme aralığı
+        self.max_attempts = command_settings.get('MAX_ATTEMPTS', 5)
+        self.backoff_max = command_settings.get('BACKOFF_MAX', 60)  # saniye
+
+        self.publish = publish  # publish(topic, payload) -> bool
+        self._commands = {}  # (room_id, device) -> PendingCommand
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._retry_thread = None
+        self.running = False
+
+        self.acked_count = 0
+        self.retry_count = 0
+        self.timed_out_count = 0
+
+    def start(self):
+        """Yeniden deneme thread'ini başlat"""
+        if self.running:
+            return
+
+        self.running = True
+        self._retry_thread = threading.Thread(target=self._run_retry_loop)
+        self._retry_thread.daemon = True
+        self._retry_thread.start()
+
+    def stop(self):
+        """Yeniden deneme thread'ini durdur (bekleyen komutlar bellekte kalır)"""
+        self.running = False
+        self._wake_event.set()
+        if self._retry_thread and self._retry_thread.is_alive():
+            self._retry_thread.join(2.0)  # Maksimum 2 saniye bekle
+        self._retry_thread = None
+
+    def submit(self, room_id, device, value, delay=0.0):
+        """
+        Oda ve cihaz için istenen durumu kuyruğa al.
+        Aynı komut zaten onay bekliyorsa tekrar gönderilmez.
+        delay: Komut hemen değil, bu kadar saniye sonra yeniden deneme döngüsünde gönderilir
+        (ör. gönderim zamanlayıcısı kapatılırken devredilen komutlar, hız sınırına uymak için).
+        """
+        key = (int(room_id), device)
+        with self._lock:
+            existing = self._commands.get(key)
+            if existing is not None and existing.value == value:
+                return
+            command = PendingCommand(key[0], device, value)
+            self._commands[key] = command
+            if delay > 0:
+                command.next_attempt = time.monotonic() + delay
+            else:
+                self._send(command)
+
+    def acknowledge(self, room_id, device, value):
+        """Cihazdan gelen durum bilgisiyle bekleyen komutu eşleştir"""
+        key = (int(room_id), device)
+        with self._lock:
+            command = self._commands.get(key)
+            if command is None or command.value != value:
+                return False
+            del self._commands[key]
+            self.acked_count += 1
+
+        logger.debug(
+            f"Komut onaylandı: Oda={command.room_id}, Cihaz={device}, Komut={command.payload}, "
+            f"Deneme={command.attempts}, Süre={time.monotonic() - command.created:.1f}s"
+        )
+        return True
+
+    def export_pending(self):
+        """Onay bekleyen komutlar: [oda ID, cihaz, durum, gönderim sayısı]"""
+        with self._lock:
+            return [
+                [command.room_id, command.device, command.value, command.attempts]
+                for command in self._commands.values()
+            ]
+
+    def restore_pending(self, entries):
+        """
+        export_pending() çıktısını kuyruğa geri yükle. Komutlar hemen gönderilmez:
+        cihazın durum bildirmesi için ACK_TIMEOUT beklenir, onay gelmezse yeniden denenir.
+        """
+        restored = 0
+        with self._lock:
+            for room_id, device, value, attempts in entries:
+                if device not in COMMAND_TOPICS:
+                    continue
+                key = (int(room_id), device)
+                if key in self._commands:
+                    continue
+                command = PendingCommand(key[0], device, value)
+                command.attempts = min(attempts, self.max_attempts - 1)
+                command.next_attempt = time.monotonic() + self.ack_timeout
+                self._commands[key] = command
+                restored += 1
+        return restored
+
+    def stats(self):
+        """Kuyruk durumu ve sayaçlar"""
+        with self._lock:
+            in_flight = sum(1 for command in self._commands.values() if command.attempts > 0)
+            pending = len(self._commands) - in_flight
+        return {
+            'in_flight': in_flight,
+            'pending': pending,
+            'acked': self.acked_count,
+            'retries': self.retry_count,
+            'timed_out': self.timed_out_count,
+        }
+
+    def _send(self, command):
+        """Komutu gönder ve bir sonraki deneme zamanını ayarla (self._lock tutulurken çağrılır)"""
+        if not self.publish(command.topic, command.payload):
+            # Broker'a bağlı değil; deneme sayılmaz, bağlantı gelince tekrar denenir
+            command.next_attempt = time.monotonic() + 1.0
+            return
+
+        command.attempts += 1
+        backoff = min(self.ack_timeout * (2 ** (command.attempts - 1)), self.backoff_max)
+        command.next_attempt = time.monotonic() + backoff
+
+    def _retry_due(self, now):
+        """Zamanı gelen komutları yeniden gönder, MAX_ATTEMPTS'e ulaşanları zaman aşımıyla sil"""
+        with self._lock:
+            for key, command in list(self._commands.items()):
+                if command.next_attempt > now:
+                    continue
+                if command.attempts >= self.max_attempts:
+                    del self._commands[key]
+                    self.timed_out_count += 1
+                    logger.warning(
+                        f"Komut zaman aşımına uğradı: Oda={command.room_id}, Cihaz={command.device}, "
+                        f"Komut={command.payload}, Deneme={command.attempts}"
+                    )
+                    continue
+                if command.attempts > 0:
+                    self.retry_count += 1
+                self._send(command)
+
+    def _run_retry_loop(self):
+        """Onay gelmeyen komutları artan aralıklarla yeniden gönder"""
+        while self.running:
+            self._wake_event.wait(0.5)
+            self._wake_event.clear()
+
+            try:
+                self._retry_due(time.monotonic())
+            except Exception as e:
+                logger.error(f"Komut kuyruğu döngüsünde hata: {str(e)}", exc_info=True)
@@ -0,0 +1,97 @@
+# sensors/deadband.py
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DeadbandFilter:
+    """
+    Değişim tabanlı (deadband) sensör okuma kaydı.
+
+    Bir okuma yalnızca şu durumlarda veritabanına yazılır:
+    - Sıcaklık, son kaydedilen değerden TEMPERATURE_EPSILON'dan fazla değiştiyse
+    - Nem, son kaydedilen değerden HUMIDITY_EPSILON'dan fazla değiştiyse
+    - Hareket (presence) durumu değiştiyse
+    - Son kayıttan bu yana HEARTBEAT_INTERVAL saniye geçtiyse
+
+    Karşılaştırma son alınan değerle değil son kaydedilen değerle yapılır, böylece
+    yavaş kaymalar da eşiği aştığında kaydedilir. Yazılamayan okumalar discard() ile
+    bildirilir; o odanın bir sonraki okuması eşikten bağımsız olarak kaydedilir. Atlanan okumalar dahil her odanın
+    en son okuması bellekte tutulur (karar motoru için, bkz. latest()).
+    Eşikler SENSOR_DEADBAND['ROOMS'] ile oda bazında değiştirilebilir.
+    """
+
+    def __init__(self):
+        deadband_settings = getattr(settings, 'SENSOR_DEADBAND', {})
+        self.enabled = deadband_settings.get('ENABLED', True)
+        self.defaults = {
+            'TEMPERATURE_EPSILON': deadband_settings.get('TEMPERATURE_EPSILON', 0.2),  # °C
+            'HUMIDITY_EPSILON': deadband_settings.get('HUMIDITY_EPSILON', 1.0),  # %
+            'HEARTBEAT_INTERVAL': deadband_settings.get('HEARTBEAT_INTERVAL', 300),  # saniye
+        }
+        self.room_overrides = {
+            int(room_id): overrides for room_id, overrides in deadband_settings.get('ROOMS', {}).items()
+        }
+
+        self._stored = {}  # room_id -> son kaydedilen SensorReading
+        self._latest = {}  # room_id -> son alınan SensorReading (kaydedilmemiş olabilir)
+        self._lock = threading.Lock()
+
+    def thresholds(self, room_id):
+        """Oda için geçerli eşikler (varsayılanlar + oda ayarları)"""
+        overrides = self.room_overrides.get(room_id)
+        if not overrides:
+            return self.defaults
+        return {**self.defaults, **overrides}
+
+    def should_store(self, reading):
+        """Okumayı en son değer olarak kaydet ve veritabanına yazılması gerekip gerekmediğini döndür"""
+        room_id = reading.room_id
+        with self._lock:
+            self._latest[room_id] = reading
+            if not self.enabled:
+                return True
+
+            stored = self._stored.get(room_id)
+            if stored is None or self._changed(room_id, stored, reading):
+                self._stored[room_id] = reading
+                return True
+            return False
+
+    def _changed(self, room_id, stored, reading):
+        thresholds = self.thresholds(room_id)
+        if reading.presence != stored.presence:
+            return True
+        if abs(reading.temperature - stored.temperature) > thresholds['TEMPERATURE_EPSILON']:
+            return True
+        if abs(reading.humidity - stored.humidity) > thresholds['HUMIDITY_EPSILON']:
+            return True
+        # Cihaz saati geri gittiyse (ör. yeniden başlatma) de kaydet
+        elapsed = (reading.timestamp - stored.timestamp).total_seconds()
+        return elapsed >= thresholds['HEARTBEAT_INTERVAL'] or elapsed < 0
+
+    def discard(self, readings):
+        """
+        Veritabanına yazılamayan (atılan) okumaları bildir. Son kaydedilen okuma bunlardan
+        biriyse unutulur, böylece veritabanında olmayan bir değer eşik karşılaştırmasında kullanılmaz.
+        """
+        with self._lock:
+            for reading in readings:
+                if self._stored.get(reading.room_id) is reading:
+                    del self._stored[reading.room_id]
+
+    def latest(self, room_id):
+        """Odanın bellekteki en son okuması (bu süreçte alınmadıysa None)"""
+        return self._latest.get(room_id)
+
+    def forget(self, room_id):
+        """Oda silindiğinde bellekteki değerleri temizle"""
+        with self._lock:
+            self._stored.pop(room_id, None)
+            self._latest.pop(room_id, None)
+
+
+# Singleton instance oluştur
+deadband_filter = DeadbandFilter()
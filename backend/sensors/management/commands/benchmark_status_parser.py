@@ -0,0 +1,59 @@
+# sensors/management/commands/benchmark_status_parser.py
+import time
+from django.core.management.base import BaseCommand
+from sensors.status_parser import parse_status
+
+# Her mesaj formatı için örnek durum mesajları
+SAMPLE_PAYLOADS = {
+    'text': [
+        "Fans: ON",
+        "Fans: OFF",
+        "Stepper completed CW rotation (valve closed)",
+        "Stepper completed CCW rotation (valve open)",
+        "Battery: 85%",
+        "Network signal: Strong",
+        "System online",
+        "Valve position: Normal",
+    ],
+    'json': [
+        '{"fan": "on", "valve": "open", "battery": 85, "signal": "strong"}',
+        '{"fan": false, "battery": 42}',
+        '{"valve": "closed"}',
+    ],
+    'key_value': [
+        "fan=on;valve=open;battery=85;signal=strong",
+        "fan=off,battery=42",
+        "valve=closed",
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = 'Cihaz durum mesajı ayrıştırıcısının işleme hızını ölçer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000,
+                            help='Her format için ayrıştırılacak mesaj sayısı')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        self.stdout.write(f"Durum ayrıştırıcı ölçümü ({iterations} mesaj/format)")
+        for format_name, payloads in SAMPLE_PAYLOADS.items():
+            # Isınma turu
+            for payload in payloads:
+                parse_status(payload)
+
+            count = len(payloads)
+            started = time.perf_counter()
+            for i in range(iterations):
+                parse_status(payloads[i % count])
+            elapsed = time.perf_counter() - started
+
+            rate = iterations / elapsed if elapsed > 0 else float('inf')
+            self.stdout.write(
+                f"  {format_name:<10} {rate:>12,.0f} mesaj/s  "
+                f"({elapsed * 1e6 / iterations:.2f} µs/mesaj)"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Ölçüm tamamlandı"))
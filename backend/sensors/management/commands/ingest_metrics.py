@@ -0,0 +1,73 @@
+# sensors/management/commands/ingest_metrics.py
+import json
+from django.core.management.base import BaseCommand
+from sensors.metrics import ingest_metrics, read_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Çalışan ingest süreçlerinin metrik snapshot\'larını gösterir (kuyruk derinliği, gecikme, hız, atılan mesajlar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true',
+                            help='Snapshot\'ları ham JSON olarak yazdır')
+        parser.add_argument('--all', action='store_true',
+                            help='Eski (kapanmış süreçlere ait) snapshot\'ları da göster')
+
+    def handle(self, *args, **options):
+        """Komut çalıştırıldığında yürütülecek ana metod"""
+        # Varsayılan olarak son üç yazma aralığı içinde güncellenmiş snapshot'lar gösterilir
+        max_age = None if options['all'] else max(ingest_metrics.interval, 1) * 3
+        snapshots = read_snapshots(ingest_metrics.metrics_dir, max_age=max_age)
+
+        if options['json']:
+            self.stdout.write(json.dumps(snapshots, indent=2))
+            return
+
+        if not snapshots:
+            self.stdout.write(self.style.WARNING(
+                f"{ingest_metrics.metrics_dir} altında güncel metrik snapshot'ı bulunamadı "
+                f"(ingest süreci çalışıyor mu?)"
+            ))
+            return
+
+        for snapshot in snapshots:
+            self._write_snapshot(snapshot)
+
+        if len(snapshots) > 1:
+            self._write_totals(snapshots)
+
+    def _write_snapshot(self, snapshot):
+        self.stdout.write(self.style.SUCCESS(
+            f"Süreç pid={snapshot['pid']} (çalışma süresi {snapshot['uptime']:.0f}s)"
+        ))
+
+        self.stdout.write("  Sayaçlar (toplam, saniyelik hız):")
+        for name, value in sorted(snapshot['counters'].items()):
+            self.stdout.write(f"    {name:<28} {value:>10}  {snapshot['rates'].get(name, 0.0):>8.1f}/s")
+
+        self.stdout.write("  Histogramlar (saniye):")
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            self.stdout.write(
+                f"    {name:<28} n={histogram['count']} ort={histogram['avg']:.4f} "
+                f"p50<={histogram['p50']:.4f} p95<={histogram['p95']:.4f} "
+                f"p99<={histogram['p99']:.4f} maks={histogram['max']:.4f}"
+            )
+
+        self.stdout.write("  Göstergeler:")
+        for name, value in sorted(snapshot['gauges'].items()):
+            if isinstance(value, dict):
+                value = ', '.join(f"{key}={item}" for key, item in value.items())
+            self.stdout.write(f"    {name:<28} {value}")
+
+    def _write_totals(self, snapshots):
+        """Tüm süreçlerin sayaç ve hız toplamları"""
+        totals = {}
+        rates = {}
+        for snapshot in snapshots:
+            for name, value in snapshot['counters'].items():
+                totals[name] = totals.get(name, 0) + value
+                rates[name] = rates.get(name, 0.0) + snapshot['rates'].get(name, 0.0)
+
+        self.stdout.write(self.style.SUCCESS(f"Toplam ({len(snapshots)} süreç)"))
+        for name, value in sorted(totals.items()):
+            self.stdout.write(f"    {name:<28} {value:>10}  {rates[name]:>8.1f}/s")
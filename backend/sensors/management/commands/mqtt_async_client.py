@@ -0,0 +1,36 @@
+# sensors/management/commands/mqtt_async_client.py
+import asyncio
+import os
+from django.core.management.base import BaseCommand
+from sensors.async_ingest import AsyncIngestService
+
+
+class Command(BaseCommand):
+    help = 'Asyncio tabanlı MQTT veri alım servisini başlatır (thread tabanlı mqtt_client alternatifi)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=int, default=0,
+                            help='Çalışma süresi (saniye), 0=sonsuz')
+        parser.add_argument('--shared-group', default=None,
+                            help='Paylaşımlı abonelik grubu ($share/{grup}/room/+/+ ve esp32/status/+)')
+
+    def handle(self, *args, **options):
+        """Komut çalıştırıldığında yürütülecek ana metod"""
+        if os.name == 'nt':
+            # paho soketlerini olay döngüsüne bağlamak için add_reader gerekir (Proactor döngüsünde yok)
+            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+        service = AsyncIngestService(shared_group=options['shared_group'])
+        self.stdout.write(self.style.SUCCESS("Asyncio MQTT veri alım servisi başlatılıyor..."))
+        if options['timeout'] <= 0:
+            self.stdout.write("Durdurmak için Ctrl+C tuşlarına basın...")
+
+        try:
+            asyncio.run(service.run(timeout=options['timeout']))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Klavye kesintisi algılandı"))
+        except ConnectionError as e:
+            self.stderr.write(self.style.ERROR(f"MQTT bağlantı hatası: {str(e)}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS("Asyncio MQTT veri alım servisi durduruldu"))
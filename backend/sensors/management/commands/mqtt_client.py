@@ -1,6 +1,7 @@
 # sensors/management/commands/mqtt_client.py
 from django.core.management.base import BaseCommand
 import time
+from sensors.metrics import ingest_metrics, read_snapshots
 from sensors.mqtt_client import mqtt_client
 
 class Command(BaseCommand):
@@ -11,6 +12,8 @@ class Command(BaseCommand):
                           help='MQTT client işlemi (start/stop/status)')
         parser.add_argument('--timeout', type=int, default=0,
                           help='Çalışma süresi (saniye), 0=sonsuz')
+        parser.add_argument('--shared-group', default=None,
+                          help='Paylaşımlı abonelik grubu ($share/{grup}/room/+/+ ve esp32/status/+), ingest worker modu için')
     
     def handle(self, *args, **options):
         """Komut çalıştırıldığında yürütülecek ana metod"""
@@ -18,6 +21,12 @@ class Command(BaseCommand):
         timeout = options['timeout']
         
         if action == 'start':
+            # Bu süreç yalnızca veri alır, komut göndermez (durum mesajları da grupla paylaşılır)
+            mqtt_client.sends_commands = False
+            if options['shared_group']:
+                mqtt_client.shared_group = options['shared_group']
+                self.stdout.write(f"Paylaşımlı abonelik grubu: {mqtt_client.shared_group}")
+            
             self.stdout.write(self.style.SUCCESS("MQTT client başlatılıyor..."))
             mqtt_client.connect()
             
@@ -48,4 +57,21 @@ class Command(BaseCommand):
             if mqtt_client.is_connected:
                 self.stdout.write(self.style.SUCCESS("MQTT client çalışıyor ve broker'a bağlı"))
             else:
-                self.stdout.write(self.style.WARNING("MQTT client çalışmıyor veya broker'a bağlı değil"))
\ No newline at end of file
+                self.stdout.write(self.style.WARNING("MQTT client çalışmıyor veya broker'a bağlı değil"))
+            
+            # Komut kuyruğu çalışan süreçlerdedir; bu süreçteki kuyruk her zaman boştur.
+            # Değerler çalışan süreçlerin metrik snapshot'larından okunur
+            max_age = max(ingest_metrics.interval, 1) * 3
+            snapshots = [
+                snapshot for snapshot in read_snapshots(ingest_metrics.metrics_dir, max_age=max_age)
+                if 'command_queue' in snapshot.get('gauges', {})
+            ]
+            if not snapshots:
+                self.stdout.write("Komut kuyruğu: güncel metrik snapshot'ı bulunamadı (MQTT client çalışıyor mu?)")
+            for snapshot in snapshots:
+                stats = snapshot['gauges']['command_queue']
+                self.stdout.write(
+                    f"Komut kuyruğu (pid={snapshot['pid']}): gönderilmiş={stats['in_flight']}, "
+                    f"bekleyen={stats['pending']}, onaylanan={stats['acked']}, "
+                    f"yeniden deneme={stats['retries']}, zaman aşımı={stats['timed_out']}"
+                )
\ No newline at end of file
@@ -0,0 +1,90 @@
+# sensors/management/commands/replay_mqtt_log.py
+import time
+from django.core.management.base import BaseCommand, CommandError
+from sensors.message_log import message_log, list_segments, read_segment
+from sensors.mqtt_client import mqtt_client, STATUS_TOPIC
+from sensors.write_buffer import reading_buffer
+
+
+class Command(BaseCommand):
+    help = 'MQTT mesaj logu segmentlerini normal veri alım yolundan yeniden işler (kurtarma veya benchmark için)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('segments', nargs='*',
+                            help='İşlenecek segment dosyaları (varsayılan: log dizinindeki tüm segmentler)')
+        parser.add_argument('--speed', type=float, default=0,
+                            help='Oynatma hızı, gerçek zamanın katı (ör. 10=10x); 0=azami hız')
+        parser.add_argument('--since', type=float, default=None,
+                            help='Yalnızca bu zamandan (Unix epoch saniye) sonra alınan mesajları işle')
+        parser.add_argument('--until', type=float, default=None,
+                            help='Yalnızca bu zamandan (Unix epoch saniye) önce alınan mesajları işle')
+        parser.add_argument('--include-status', action='store_true',
+                            help=f'Cihaz durum mesajlarını ({STATUS_TOPIC}) da işle. Varsayılan olarak atlanır: '
+                                 'eski durumlar güncel DeviceStatus kayıtlarının üzerine yazar ve '
+                                 'ilgisiz bekleyen komutları onaylar')
+
+    def handle(self, *args, **options):
+        """Komut çalıştırıldığında yürütülecek ana metod"""
+        segments = options['segments'] or list_segments(message_log.log_dir)
+        if not segments:
+            raise CommandError(f"{message_log.log_dir} altında MQTT log segmenti bulunamadı")
+        speed = options['speed']
+        if speed < 0:
+            raise CommandError("--speed negatif olamaz")
+
+        # Yeniden işlenen mesajlar tekrar loglanmaz; azami hızda mesaj atılmaması için kuyruk beklemeli
+        message_log.enabled = False
+        # Cihaz zaman damgası olmayan okumalar benzersizlik kısıtına takılmaz, zaten yazılmışlar atlanır
+        reading_buffer.skip_replayed = True
+        mqtt_client.worker_pool.overflow_policy = 'block'
+        mqtt_client.start_pipeline()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(segments)} segment yeniden işleniyor (hız={'azami' if not speed else f'{speed}x'})..."
+        ))
+
+        status_prefix = STATUS_TOPIC.rstrip('+')
+        include_status = options['include_status']
+
+        count = 0
+        skipped_status = 0
+        started = time.monotonic()
+        first_received_at = None
+        try:
+            for path in segments:
+                for received_at, topic, payload in read_segment(path):
+                    if options['since'] is not None and received_at < options['since']:
+                        continue
+                    if options['until'] is not None and received_at >= options['until']:
+                        continue
+                    if not include_status and topic.startswith(status_prefix):
+                        skipped_status += 1
+                        continue
+
+                    if speed:
+                        # Mesajlar arasındaki orijinal aralıkları hız katına göre koru
+                        if first_received_at is None:
+                            first_received_at = received_at
+                        delay = (received_at - first_received_at) / speed - (time.monotonic() - started)
+                        if delay > 0:
+                            time.sleep(delay)
+
+                    mqtt_client.ingest(topic, payload, received_at)
+                    count += 1
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Klavye kesintisi algılandı"))
+        except ValueError as e:
+            self.stderr.write(self.style.ERROR(str(e)))
+        finally:
+            # Kuyruktaki mesajların işlenmesini ve okumaların yazılmasını bekle
+            mqtt_client.stop_pipeline()
+
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} mesaj {elapsed:.2f} saniyede yeniden işlendi ({rate:.0f} mesaj/s)"
+        ))
+        if skipped_status:
+            self.stdout.write(
+                f"{skipped_status} cihaz durum mesajı atlandı (işlemek için --include-status)"
+            )
@@ -0,0 +1,75 @@
+# sensors/management/commands/run_ingest_workers.py
+import os
+import signal
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Paylaşımlı MQTT aboneliği ile birden fazla ingest sürecini başlatır ve izler'
+
+    def add_arguments(self, parser):
+        ingest_settings = getattr(settings, 'MQTT_INGEST', {})
+        parser.add_argument('--workers', type=int, default=ingest_settings.get('INGEST_WORKERS', 4),
+                            help='Başlatılacak ingest süreci sayısı')
+        parser.add_argument('--group', default=ingest_settings.get('SHARED_GROUP') or 'ecoheat',
+                            help='Paylaşımlı abonelik grubu ($share/{grup}/room/+/+ ve esp32/status/+)')
+
+    def handle(self, *args, **options):
+        """Her worker kendi Python süreci, GIL'i ve veritabanı bağlantısı ile çalışır"""
+        worker_count = options['workers']
+        group = options['group']
+        if worker_count < 1:
+            self.stderr.write(self.style.ERROR("Worker sayısı en az 1 olmalı"))
+            return
+
+        manage_py = os.path.abspath(sys.argv[0])
+        command = [sys.executable, manage_py, 'mqtt_client', 'start', '--shared-group', group]
+
+        self.stdout.write(self.style.SUCCESS(f"{worker_count} ingest süreci başlatılıyor (grup={group})..."))
+        self.stdout.write(
+            "Not: Paylaşımlı abonelikte aynı odanın mesajları farklı süreçlere düşebilir, "
+            "sensörler room/{id}/telemetry formatını kullanmalı"
+        )
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._handle_sigterm)
+
+        workers = [subprocess.Popen(command) for _ in range(worker_count)]
+        try:
+            while not self.stopping:
+                time.sleep(1)
+                # Beklenmedik şekilde kapanan süreçleri yeniden başlat
+                for index, worker in enumerate(workers):
+                    if worker.poll() is not None and not self.stopping:
+                        self.stdout.write(self.style.WARNING(
+                            f"Ingest süreci {index} (pid={worker.pid}) kapandı, kod={worker.returncode}; yeniden başlatılıyor"
+                        ))
+                        workers[index] = subprocess.Popen(command)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Klavye kesintisi algılandı"))
+        finally:
+            self._stop_workers(workers)
+
+    def _handle_sigterm(self, sig, frame):
+        self.stopping = True
+
+    def _stop_workers(self, workers):
+        """Süreçlere SIGINT gönder (tamponlar boşaltılsın), kapanmayanları sonlandır"""
+        for worker in workers:
+            if worker.poll() is None:
+                if os.name == 'nt':
+                    worker.terminate()  # Windows'ta SIGINT gönderilemez
+                else:
+                    worker.send_signal(signal.SIGINT)
+
+        deadline = time.monotonic() + 15
+        for worker in workers:
+            try:
+                worker.wait(max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                worker.kill()
+        self.stdout.write(self.style.SUCCESS("Tüm ingest süreçleri durduruldu"))
@@ -1,8 +1,10 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from schedules.apps import on_elected, on_demoted
 from schedules.decision_engine import decision_engine
+from schedules.leader import leader_election
 
 class Command(BaseCommand):
-    help = 'Decision Engine\'i manuel olarak başlatır veya durdurur'
+    help = 'Decision Engine\'i manuel olarak başlatır veya durdurur (lider seçimi üzerinden)'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -16,13 +18,21 @@ class Command(BaseCommand):
         action = options['action']
         
         if action == 'start':
-            decision_engine.start()
-            self.stdout.write(self.style.SUCCESS('Decision Engine başlatıldı!'))
+            if not leader_election.enabled:
+                raise CommandError('Karar motoru kapalı (DECISION_ENGINE_ENABLED=0)')
+            # Motor yalnızca bu süreç lider seçilirse çalışır; başka bir süreç liderse başlatılmaz
+            leader_election.start(on_elected, on_demoted)
+            self.stdout.write(self.style.SUCCESS(
+                'Lider seçimi başlatıldı, Decision Engine bu süreç lider seçilirse çalışacak!'
+            ))
         
         elif action == 'stop':
-            decision_engine.stop()
+            # Liderse motoru durdurur ve kiralamayı bırakır
+            leader_election.stop()
             self.stdout.write(self.style.SUCCESS('Decision Engine durduruldu!'))
         
         elif action == 'status':
             status = 'Çalışıyor' if decision_engine.running else 'Durduruldu'
-            self.stdout.write(self.style.SUCCESS(f'Decision Engine durumu: {status}'))
\ No newline at end of file
+            self.stdout.write(self.style.SUCCESS(f'Decision Engine durumu: {status}'))
+            leader = leader_election.status()['leader']
+            self.stdout.write(f"Lider süreç: {leader or 'yok'}")
@@ -0,0 +1,270 @@
+# sensors/message_log.py
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Segment dosyası başlığı (format sürümü ile)
+SEGMENT_MAGIC = b'MQWAL\x01'
+SEGMENT_SUFFIX = '.wal'
+
+# Kayıt başlığı: crc32, alım zamanı (epoch saniye), topic uzunluğu, payload uzunluğu
+# crc32, başlığın geri kalanı + topic + payload üzerinden hesaplanır
+RECORD_HEADER = struct.Struct('<IdHI')
+RECORD_BODY_HEADER = struct.Struct('<dHI')
+
+
+class MessageLog:
+    """
+    Ham MQTT mesajları için segmentli, yalnızca ekleme yapılan ikili log (write-ahead log).
+
+    Her mesaj (topic, alım zamanı, payload) işlenmeden önce aktif segmente eklenir.
+    Diske yazma (fsync) her mesajda değil, FSYNC_BATCH kayıtta bir veya
+    FSYNC_INTERVAL saniyede bir toplu olarak yapılır. Segment SEGMENT_BYTES boyutuna
+    ulaşınca yeni segmente geçilir. Dizindeki tüm süreçlerin segmentlerinden MAX_AGE'den
+    eski olanlar ve MAX_SEGMENTS'i aşan en eskiler silinir; çalışan süreçlerin aktif
+    segmentlerine dokunulmaz.
+    fsync, dolan segmentlerin kapatılması ve silme yalnızca sync thread'inde yapılır;
+    mesajı ekleyen thread (ör. paho ağ thread'i) disk için beklemez.
+    Segmentler replay_mqtt_log komutu ile normal veri alım yolundan yeniden işlenebilir.
+    """
+
+    def __init__(self):
+        ingest_settings = getattr(settings, 'MQTT_INGEST', {})
+        self.enabled = ingest_settings.get('MESSAGE_LOG_ENABLED', True)
+        self.log_dir = ingest_settings.get('MESSAGE_LOG_DIR', 'logs/mqtt_wal')
+        self.segment_bytes = ingest_settings.get('MESSAGE_LOG_SEGMENT_BYTES', 16 * 1024 * 1024)
+        self.max_segments = ingest_settings.get('MESSAGE_LOG_MAX_SEGMENTS', 32)
+        self.max_age = ingest_settings.get('MESSAGE_LOG_MAX_AGE', 7 * 24 * 3600)  # saniye, None=sınırsız
+        self.fsync_interval = ingest_settings.get('MESSAGE_LOG_FSYNC_INTERVAL', 1.0)  # saniye
+        self.fsync_batch = ingest_settings.get('MESSAGE_LOG_FSYNC_BATCH', 1000)  # kayıt
+
+        self._file = None
+        self._segment_name = None
+        self._segment_sequence = 0  # Aynı milisaniyede açılan segmentlerin adları çakışmasın
+        self._segment_size = 0
+        self._unsynced = 0  # Son fsync'ten bu yana yazılan kayıt sayısı
+        self._rotated = []  # Dolan, sync thread'inde diske yazılıp kapatılacak segmentler
+        self._lock = threading.Lock()
+        self._sync_event = threading.Event()
+        self._sync_thread = None
+        self.running = False
+
+    def start(self):
+        """Yeni bir segment aç ve periyodik fsync thread'ini başlat"""
+        if self.running or not self.enabled:
+            return
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        with self._lock:
+            self._open_segment()
+        self._remove_old_segments()  # Önceki çalıştırmalardan kalan segmentler
+        self.running = True
+        self._sync_thread = threading.Thread(target=self._run_sync_loop, name='mqtt-wal-sync')
+        self._sync_thread.daemon = True
+        self._sync_thread.start()
+        logger.info(f"MQTT mesaj logu başlatıldı: {self.log_dir}")
+
+    def stop(self):
+        """Bekleyen kayıtları diske yaz ve segmenti kapat"""
+        if not self.running:
+            return
+
+        self.running = False
+        self._sync_event.set()
+        if self._sync_thread and self._sync_thread.is_alive():
+            self._sync_thread.join(2.0)
+        self._sync_thread = None
+
+        self._sync_pending()
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+    def append(self, topic, payload, received_at):
+        """Ham mesajı loga ekle (payload: bytes)"""
+        if not self.running:
+            return
+
+        topic_bytes = topic.encode('utf-8')
+        body = RECORD_BODY_HEADER.pack(received_at, len(topic_bytes), len(payload)) + topic_bytes + payload
+        record = struct.pack('<I', zlib.crc32(body)) + body
+
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(record)
+            except OSError as e:
+                logger.error(f"MQTT mesaj loguna yazılamadı: {str(e)}")
+                return
+            self._segment_size += len(record)
+            self._unsynced += 1
+
+            if self._segment_size >= self.segment_bytes:
+                # Dolan segment sync thread'inde diske yazılıp kapatılır
+                self._rotated.append(self._file)
+                self._open_segment()
+                self._sync_event.set()
+            elif self._unsynced >= self.fsync_batch:
+                self._sync_event.set()
+
+    def _open_segment(self):
+        """Yeni segment dosyası oluştur (self._lock tutulurken çağrılır)"""
+        # Ad: {başlangıç zamanı ms}-{pid}-{sıra}.wal, sıralama kronolojik olur ve süreçler çakışmaz.
+        # 'xb': var olan bir segmentin sonuna asla eklenmez
+        while True:
+            self._segment_sequence += 1
+            name = f"{int(time.time() * 1000):013d}-{os.getpid()}-{self._segment_sequence:06d}{SEGMENT_SUFFIX}"
+            try:
+                self._file = open(os.path.join(self.log_dir, name), 'xb')
+                break
+            except FileExistsError:
+                continue
+        self._segment_name = name
+        self._file.write(SEGMENT_MAGIC)
+        self._segment_size = len(SEGMENT_MAGIC)
+        self._unsynced = 0
+
+    def _sync_pending(self):
+        """
+        Aktif segmentteki kayıtları diske yaz, dolan segmentleri kapat ve eski segmentleri sil.
+        Yalnızca sync thread'i (ve durdurulurken stop()) çağırır; fsync kilit dışında yapılır.
+        """
+        with self._lock:
+            rotated, self._rotated = self._rotated, []
+            current = self._file if self._unsynced else None
+            if current is not None:
+                try:
+                    current.flush()
+                except OSError as e:
+                    logger.error(f"MQTT mesaj logu diske yazılamadı: {str(e)}")
+                    current = None
+                self._unsynced = 0
+
+        for segment in rotated:
+            try:
+                segment.flush()
+                os.fsync(segment.fileno())
+            except OSError as e:
+                logger.error(f"MQTT mesaj logu diske yazılamadı: {str(e)}")
+            finally:
+                segment.close()
+        if current is not None:
+            try:
+                os.fsync(current.fileno())
+            except (OSError, ValueError) as e:  # ValueError: segment bu arada kapatıldı
+                logger.error(f"MQTT mesaj logu diske yazılamadı: {str(e)}")
+        if rotated:
+            self._remove_old_segments()
+
+    def _remove_old_segments(self):
+        """
+        Dizindeki (tüm süreçlere ait) MAX_AGE'den eski ve MAX_SEGMENTS'i aşan en eski segmentleri
+        sil (sync thread'inde çağrılır). Çalışan her sürecin en yeni (aktif) segmenti korunur.
+        """
+        segments = sorted(
+            (name, owner) for name, owner in
+            ((name, parse_segment_name(name)) for name in os.listdir(self.log_dir))
+            if owner is not None
+        )
+        newest = {}  # pid -> süreç hâlâ yazıyor olabileceği son segment
+        for name, (_, pid) in segments:
+            newest[pid] = name
+        active = {name for pid, name in newest.items() if _writer_alive(pid)}
+        active.add(self._segment_name)
+
+        remaining = len(segments)
+        cutoff = time.time() - self.max_age if self.max_age is not None else None
+        for name, (started, _) in segments:
+            if remaining <= self.max_segments and (cutoff is None or started >= cutoff):
+                break
+            if name in active:
+                continue
+            try:
+                os.remove(os.path.join(self.log_dir, name))
+                remaining -= 1
+            except OSError as e:
+                logger.warning(f"Eski MQTT log segmenti silinemedi: {name}, {str(e)}")
+
+    def _run_sync_loop(self):
+        while self.running:
+            self._sync_event.wait(self.fsync_interval)
+            self._sync_event.clear()
+            self._sync_pending()
+
+
+def parse_segment_name(name):
+    """Segment adından (başlangıç zamanı epoch saniye, pid); segment değilse None"""
+    if not name.endswith(SEGMENT_SUFFIX):
+        return None
+    # {ms}-{pid}-{sıra}.wal veya eski biçim {ms}-{pid}.wal
+    parts = name[:-len(SEGMENT_SUFFIX)].split('-')
+    if len(parts) not in (2, 3) or not all(part.isdigit() for part in parts):
+        return None
+    return int(parts[0]) / 1000, int(parts[1])
+
+
+def _writer_alive(pid):
+    """Segmenti yazan süreç hâlâ çalışıyor mu"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # Windows'ta os.kill(pid, 0) süreci sonlandırır; açık segment zaten silinemez
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Başka kullanıcıya ait çalışan süreç
+    return True
+
+
+def list_segments(log_dir):
+    """Log dizinindeki segment dosyaları, kronolojik sırada"""
+    if not os.path.isdir(log_dir):
+        return []
+    return [
+        os.path.join(log_dir, name)
+        for name in sorted(os.listdir(log_dir))
+        if name.endswith(SEGMENT_SUFFIX)
+    ]
+
+
+def read_segment(path):
+    """
+    Segmentteki kayıtları sırayla döndür: (alım zamanı, topic, payload).
+    Yarım kalmış veya bozuk bir kayda gelindiğinde segmentin okunması durdurulur.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+            raise ValueError(f"Geçersiz MQTT log segmenti: {path}")
+
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < RECORD_HEADER.size:
+                logger.warning(f"Yarım kalmış kayıt, segment sonu: {path}")
+                return
+
+            crc, received_at, topic_length, payload_length = RECORD_HEADER.unpack(header)
+            data = f.read(topic_length + payload_length)
+            if len(data) < topic_length + payload_length:
+                logger.warning(f"Yarım kalmış kayıt, segment sonu: {path}")
+                return
+            if zlib.crc32(header[4:] + data) != crc:
+                logger.warning(f"Bozuk kayıt (crc uyuşmuyor), segment okuması durduruldu: {path}")
+                return
+
+            yield received_at, data[:topic_length].decode('utf-8'), data[topic_length:]
+
+
+# Singleton instance oluştur
+message_log = MessageLog()
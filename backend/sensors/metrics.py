@@ -0,0 +1,214 @@
+# sensors/metrics.py
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Gecikme histogramlarının kova üst sınırları (saniye)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Sabit kovalı histogram; yüzdelikler kova üst sınırlarından tahmin edilir"""
+
+    __slots__ = ('bounds', 'buckets', 'count', 'total', 'max')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)  # Son kova: en büyük sınırın üstü
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """q. yüzdeliğin üst sınır tahmini"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.buckets):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else 0.0,
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+        }
+
+
+class IngestMetrics:
+    """
+    Veri alım yolu için süreç içi metrikler.
+
+    - Sayaçlar (incr): alınan mesajlar, ayrıştırma hataları, yazılan okumalar vb.
+    - Histogramlar (observe): veritabanı yazma süresi, alımdan commit'e gecikme
+    - Göstergeler (register_gauge): kuyruk derinliği gibi anlık değerler, snapshot sırasında okunur
+
+    Çalışan süreç, snapshot'ı METRICS_INTERVAL saniyede bir METRICS_DIR altına
+    {pid}.json olarak yazar; ingest_metrics komutu bu dosyaları okur.
+    """
+
+    def __init__(self):
+        ingest_settings = getattr(settings, 'MQTT_INGEST', {})
+        self.metrics_dir = ingest_settings.get('METRICS_DIR', 'logs/ingest_metrics')
+        self.interval = ingest_settings.get('METRICS_INTERVAL', 10)  # saniye
+
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._last_counters = {}
+        self._last_snapshot_at = time.monotonic()
+
+        self._stop_event = threading.Event()
+        self._writer_thread = None
+        self.running = False
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def observe_many(self, name, values):
+        """Aynı histograma birden fazla değer ekle (tek kilit ile)"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            for value in values:
+                histogram.observe(value)
+
+    def register_gauge(self, name, func):
+        """Snapshot sırasında çağrılacak anlık değer fonksiyonu"""
+        self._gauges[name] = func
+
+    def unregister_gauge(self, name):
+        self._gauges.pop(name, None)
+
+    def snapshot(self, advance=False):
+        """
+        Tüm metriklerin anlık görüntüsü.
+        Oranlar son yazılan snapshot'tan bu yana hesaplanır; advance=True ise oran penceresi yeniden başlar.
+        """
+        now = time.monotonic()
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {name: histogram.as_dict() for name, histogram in self._histograms.items()}
+            elapsed = now - self._last_snapshot_at
+            rates = {
+                name: (value - self._last_counters.get(name, 0)) / elapsed if elapsed > 0 else 0.0
+                for name, value in counters.items()
+            }
+            if advance:
+                self._last_counters = counters
+                self._last_snapshot_at = now
+
+        gauges = {}
+        for name, func in list(self._gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                gauges[name] = None
+                logger.debug(f"Metrik göstergesi okunamadı: {name}, {str(e)}")
+
+        return {
+            'pid': os.getpid(),
+            'timestamp': time.time(),
+            'uptime': time.time() - self._started_at,
+            'counters': counters,
+            'rates': rates,
+            'histograms': histograms,
+            'gauges': gauges,
+        }
+
+    def start(self):
+        """Snapshot dosyası yazan thread'i başlat"""
+        if self.running or self.interval <= 0:
+            return
+
+        self.running = True
+        self._stop_event.clear()
+        self._writer_thread = threading.Thread(target=self._run_writer, name='ingest-metrics')
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+    def stop(self):
+        """Thread'i durdur ve son snapshot'ı yaz"""
+        if not self.running:
+            return
+        self.running = False
+        self._stop_event.set()
+        if self._writer_thread and self._writer_thread.is_alive():
+            self._writer_thread.join(2.0)
+        self._writer_thread = None
+        self.write_snapshot()
+
+    def snapshot_path(self):
+        return os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+
+    def write_snapshot(self):
+        """Snapshot'ı atomik olarak dosyaya yaz"""
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            path = self.snapshot_path()
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(advance=True), f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Metrik snapshot'ı yazılamadı: {str(e)}")
+
+    def _run_writer(self):
+        while not self._stop_event.wait(self.interval):
+            self.write_snapshot()
+
+
+def read_snapshots(metrics_dir, max_age=None):
+    """METRICS_DIR altındaki süreç snapshot'larını oku; max_age saniyeden eskiler atlanır"""
+    snapshots = []
+    if not os.path.isdir(metrics_dir):
+        return snapshots
+
+    now = time.time()
+    for name in sorted(os.listdir(metrics_dir)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(metrics_dir, name), encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if max_age is not None and now - snapshot.get('timestamp', 0) > max_age:
+            continue
+        snapshots.append(snapshot)
+    return snapshots
+
+
+# Singleton instance oluştur
+ingest_metrics = IngestMetrics()
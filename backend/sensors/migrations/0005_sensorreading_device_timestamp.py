@@ -0,0 +1,45 @@
+# Generated by Django 4.2.21 on 2026-10-18 13:19
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def copy_timestamp_to_received_at(apps, schema_editor):
+    # Mevcut okumalar için alım zamanı bilinmiyor, kayıt zamanı kullanılır
+    SensorReading = apps.get_model('sensors', 'SensorReading')
+    SensorReading.objects.update(received_at=models.F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0004_alter_devicestatus_fan_control_mode_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensorreading',
+            name='device_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensorreading',
+            name='received_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_timestamp_to_received_at, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='sensorreading',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sensorreading',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name='sensorreading',
+            constraint=models.UniqueConstraint(fields=('room', 'device_timestamp'), name='unique_room_device_timestamp'),
+        ),
+    ]
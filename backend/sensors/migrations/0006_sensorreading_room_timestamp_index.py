@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0005_sensorreading_device_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['room', '-timestamp'], name='sensorreading_room_ts_idx'),
+        ),
+    ]
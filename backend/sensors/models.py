@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Room(models.Model):
     name = models.CharField(max_length=100)
@@ -14,10 +15,22 @@ class SensorReading(models.Model):
     temperature = models.FloatField()
     humidity = models.FloatField()
     presence = models.BooleanField(default=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Ölçüm zamanı: cihaz zaman damgası varsa o, yoksa mesajın alındığı an
+    timestamp = models.DateTimeField(default=timezone.now)
+    device_timestamp = models.DateTimeField(null=True, blank=True)  # Cihazın bildirdiği ölçüm zamanı
+    sequence = models.BigIntegerField(null=True, blank=True)  # Cihazın mesaj sıra numarası
+    received_at = models.DateTimeField(default=timezone.now)  # MQTT mesajının alındığı an
     
     class Meta:
         ordering = ['-timestamp']
+        constraints = [
+            # Aynı ölçümün tekrar gönderimi (QoS1, yeniden oynatma) ikinci satır oluşturmaz
+            models.UniqueConstraint(fields=['room', 'device_timestamp'], name='unique_room_device_timestamp'),
+        ]
+        indexes = [
+            # Oda başına son okuma sorgusu (karar motoru)
+            models.Index(fields=['room', '-timestamp'], name='sensorreading_room_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.room.name}: {self.temperature}°C, {self.humidity}% at {self.timestamp}"
@@ -2,15 +2,31 @@
 import paho.mqtt.client as mqtt
 import logging
 import json
-import threading
 import time
 from django.conf import settings
-from django.utils import timezone
-from django.db import transaction
-from .models import Room, SensorReading, DeviceStatus
+from .command_queue import CommandQueue
+from .deadband import deadband_filter
+from .message_log import message_log
+from .metrics import ingest_metrics
+from .payloads import parse_sensor_value, parse_telemetry
+from .persistence import build_sensor_reading, save_status_delta
+from .reassembly import ReassemblyCache
+from .status_parser import parse_status
+from .room_registry import room_registry
+from .signals import device_status_changed
+from .worker_pool import ShardedWorkerPool
+from .write_buffer import reading_buffer
 
 logger = logging.getLogger(__name__)
 
+# Tüm odaları kapsayan wildcard abonelikleri
+SENSOR_TOPIC = 'room/+/+'
+STATUS_TOPIC = 'esp32/status/+'
+
+# room/{room_id}/{sensor_type} topic'lerinde kabul edilen sensör tipleri
+# 'telemetry' tüm sensör verilerini tek JSON mesajında taşır, diğerleri eski tekil formattır
+SENSOR_TYPES = ('telemetry', 'temperature', 'humidity', 'pir')
+
 class MQTTClient:
     _instance = None
     
@@ -19,12 +35,26 @@ class MQTTClient:
             cls._instance = super(MQTTClient, cls).__new__(cls)
             cls._instance.client = None
             cls._instance.is_connected = False
-            cls._instance.temp_cache = {}  # Geçici veri önbelleği (sensör verileri için)
-            cls._instance.subscribed_rooms = set()  # Abone olunan odaların ID'leri
-            cls._instance.check_rooms_thread = None  # Oda kontrolü için thread
-            cls._instance.running = False  # Thread kontrol bayrağı
+            # Paylaşımlı abonelik grubu ($share/{grup}/...), birden fazla ingest sürecinin yükü bölüşmesi için
+            cls._instance.shared_group = getattr(settings, 'MQTT_INGEST', {}).get('SHARED_GROUP')
+            # Cihazlara komut gönderen süreç (web sunucusu, karar motoru) onayları kaçırmamak için
+            # durum mesajlarının tamamını alır; yalnızca veri alan ingest süreçlerinde False
+            cls._instance.sends_commands = True
+            cls._instance.reassembly_cache = ReassemblyCache()  # Eksik sensör verileri için önbellek
+            cls._instance.worker_pool = ShardedWorkerPool(cls._instance._handle_message)  # Mesaj işleme worker'ları
+            cls._instance.command_queue = CommandQueue(cls._instance._publish_command)  # Onay takipli komut kuyruğu
+            cls._instance._register_metrics()
         return cls._instance
     
+    def _register_metrics(self):
+        """Kuyruk derinliği ve atılan mesaj sayıları gibi anlık değerleri metriklere bağla"""
+        ingest_metrics.register_gauge('worker_queue_depth', self.worker_pool.queue_depth)
+        ingest_metrics.register_gauge('buffer_pending', reading_buffer.pending_count)
+        ingest_metrics.register_gauge('dropped.queue_full', lambda: self.worker_pool.dropped_count)
+        ingest_metrics.register_gauge('dropped.buffer_full', lambda: reading_buffer.dropped_count)
+        ingest_metrics.register_gauge('reassembly', self.reassembly_cache.stats)
+        ingest_metrics.register_gauge('command_queue', self.command_queue.stats)
+    
     def connect(self):
         """MQTT broker'a bağlan ve topic'lere abone ol"""
         if self.is_connected:
@@ -49,69 +79,43 @@ class MQTTClient:
             # MQTT broker'a bağlan
             self.client.connect(mqtt_broker, mqtt_port, mqtt_keepalive)
             
+            # Mesaj işleme hattını ve komut kuyruğunu başlat
+            self.start_pipeline()
+            self.command_queue.start()
+            
             # İstemciyi başlat (non-blocking mode)
             self.client.loop_start()
             
-            # Oda kontrolü için periyodik thread başlat
-            self.running = True
-            self.check_rooms_thread = threading.Thread(target=self._check_new_rooms_periodically)
-            self.check_rooms_thread.daemon = True
-            self.check_rooms_thread.start()
-            
         except Exception as e:
             logger.error(f"MQTT bağlantı hatası: {str(e)}")
     
     def disconnect(self):
         """MQTT bağlantısını kapat"""
-        # Thread'i durdur
-        self.running = False
-        if self.check_rooms_thread and self.check_rooms_thread.is_alive():
-            self.check_rooms_thread.join(2.0)  # Maksimum 2 saniye bekle
-        
         # MQTT client'ı durdur
         if self.client and self.is_connected:
             self.client.loop_stop()
             self.client.disconnect()
             self.is_connected = False
             logger.info("MQTT broker bağlantısı kapatıldı")
-    
-    def _subscribe_to_room_topics(self, room_id):
-        """Belirli bir oda için tüm topic'lere abone ol"""
-        if room_id in self.subscribed_rooms:
-            return False  # Zaten abone
         
-        # Oda topic'lerine abone ol
-        self.client.subscribe(f"room/{room_id}/temperature")
-        self.client.subscribe(f"room/{room_id}/humidity")
-        self.client.subscribe(f"room/{room_id}/pir")
-        self.client.subscribe(f"esp32/status/{room_id}")
-        
-        # Abone olunan odalar listesine ekle
-        self.subscribed_rooms.add(room_id)
-        logger.info(f"Oda {room_id} için topic'lere abone olundu")
-        return True
+        self.command_queue.stop()
+        self.stop_pipeline()
     
-    def _check_new_rooms_periodically(self):
-        """Periyodik olarak veritabanındaki yeni odaları kontrol et ve abone ol"""
-        while self.running:
-            try:
-                if self.is_connected:
-                    # Veritabanındaki tüm odaları kontrol et
-                    db_rooms = Room.objects.all()
-                    for room in db_rooms:
-                        if room.id not in self.subscribed_rooms:
-                            self._subscribe_to_room_topics(room.id)
-                    
-                    # Abone olunmayıp veritabanında olmayan oda ID'lerini log'a yaz
-                    db_room_ids = set(room.id for room in db_rooms)
-                    non_db_subscriptions = self.subscribed_rooms - db_room_ids
-                    if non_db_subscriptions:
-                        logger.debug(f"Veritabanında olmayan odalar için abonelikler: {non_db_subscriptions}")
-            except Exception as e:
-                logger.error(f"Oda kontrolü sırasında hata: {str(e)}")
-            
-            # 60 saniye bekle
-            time.sleep(60)
+    def start_pipeline(self):
+        """Mesaj logu, sensör okuma tamponu, mesaj işleme worker'ları ve metrikleri başlat"""
+        message_log.start()
+        reading_buffer.start()
+        self.worker_pool.start()
+        self.reassembly_cache.start()
+        ingest_metrics.start()
+    
+    def stop_pipeline(self):
+        """Kuyruktaki mesajları işle, ardından tampondaki okumaları veritabanına yaz"""
+        self.worker_pool.stop()
+        self.reassembly_cache.stop()
+        reading_buffer.stop()
+        message_log.stop()
+        ingest_metrics.stop()
     
     def on_connect(self, client, userdata, flags, rc):
         """Broker'a bağlandığında çağrılır"""
@@ -119,31 +123,15 @@ class MQTTClient:
             self.is_connected = True
             logger.info("MQTT broker'a başarıyla bağlandı")
             
-            # Tüm odalar için sensör topic'lerine abone ol
-            try:
-                rooms = Room.objects.all()
-                
-                # Eğer veritabanında oda yoksa, varsayılan odaları dinle
-                if not rooms.exists():
-                    logger.info("Veritabanında oda bulunamadı, varsayılan odalar için abone olunuyor")
-                    default_rooms = range(1, 21)  # 1-20 arası odalar için abone ol
-                    for room_id in default_rooms:
-                        self._subscribe_to_room_topics(room_id)
-                else:
-                    # Veritabanındaki tüm odalar için abone ol
-                    for room in rooms:
-                        self._subscribe_to_room_topics(room.id)
-                
-                # Ayrıca 1-20 arasındaki tüm odalar için otomatik abone ol
-                # Bu, simülatör çalıştırılırken henüz veritabanında kayıtlı olmayan odaları da dinlemeyi sağlar
-                for room_id in range(1, 21):
-                    if room_id not in self.subscribed_rooms:
-                        self._subscribe_to_room_topics(room_id)
-                
-                logger.info(f"Toplam {len(self.subscribed_rooms)} oda için topic'lere abone olundu")
-                
-            except Exception as e:
-                logger.error(f"Oda aboneliği sırasında hata: {str(e)}")
+            # Tüm odalar için wildcard aboneliği (tek SUBSCRIBE paketi, oda sayısından bağımsız)
+            # Oda filtrelemesi mesaj işleyicisinde yapılır
+            subscribe_qos = getattr(settings, 'MQTT_INGEST', {}).get('SUBSCRIBE_QOS', 0)
+            topics = self._subscription_topics()
+            result, mid = client.subscribe([(topic, subscribe_qos) for topic in topics])
+            if result == mqtt.MQTT_ERR_SUCCESS:
+                logger.info(f"Topic'lere abone olundu: {', '.join(topics)}")
+            else:
+                logger.error(f"Topic aboneliği başarısız, hata kodu: {result}")
         else:
             self.is_connected = False
             connection_errors = {
@@ -156,6 +144,15 @@ class MQTTClient:
             error_msg = connection_errors.get(rc, f"Bilinmeyen hata kodu: {rc}")
             logger.error(f"MQTT broker'a bağlanılamadı: {error_msg}")
     
+    def _subscription_topics(self):
+        """Abone olunacak topic'ler"""
+        if self.shared_group:
+            # Sensör ve durum mesajları grup üyeleri arasında dağıtılır, her mesajı tek bir ingest
+            # süreci işler. Komut gönderen süreç, onayları görebilmek için durum mesajlarının tamamını alır
+            status_topic = STATUS_TOPIC if self.sends_commands else f"$share/{self.shared_group}/{STATUS_TOPIC}"
+            return (f"$share/{self.shared_group}/{SENSOR_TOPIC}", status_topic)
+        return (SENSOR_TOPIC, STATUS_TOPIC)
+    
     def on_disconnect(self, client, userdata, rc):
         """Broker bağlantısı kesildiğinde çağrılır"""
         self.is_connected = False
@@ -165,255 +162,193 @@ class MQTTClient:
             logger.info("MQTT bağlantısı kapatıldı")
     
     def on_message(self, client, userdata, msg):
-        """Mesaj alındığında çağrılır"""
+        """Mesaj alındığında çağrılır (paho ağ thread'i)"""
+        self.ingest(msg.topic, msg.payload, time.time(), log=True)
+    
+    def ingest(self, topic, raw_payload, received_at, log=False):
+        """
+        Ham mesajı doğrula ve worker kuyruğuna ekle.
+        log=True ise mesaj önce mesaj loguna yazılır (replay sırasında False).
+        """
         try:
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8').strip()
+            if log:
+                message_log.append(topic, raw_payload, received_at)
+            
+            payload = raw_payload.decode('utf-8').strip()
             
             logger.debug(f"MQTT mesajı alındı: {topic} => {payload}")
             
             # Topic'i parçalara ayır
             parts = topic.split('/')
             
-            # Sensör verileri: room/{room_id}/temperature|humidity|pir
+            # Wildcard aboneliği tüm odaları kapsar; geçersiz oda ID'li veya bilinmeyen topic'leri at
+            # Geçerli mesajı oda ID'sine göre worker kuyruğuna ekle, işleme worker thread'inde yapılır
             if parts[0] == 'room' and len(parts) == 3:
-                room_id = parts[1]
-                sensor_type = parts[2]
-                
-                # Otomatik olarak bu oda için topic'lere abone ol (henüz abone değilse)
-                if int(room_id) not in self.subscribed_rooms:
-                    self._subscribe_to_room_topics(int(room_id))
-                
-                # Sensör verisini önbelleğe al
-                self._cache_sensor_data(room_id, sensor_type, payload)
-                
-                # Eğer önbellekte tüm sensör verileri varsa, veritabanına kaydet
-                self._process_cached_data(room_id)
+                if parts[1].isdigit() and parts[2] in SENSOR_TYPES:
+                    ingest_metrics.incr(f"received.{parts[2]}")
+                    self.worker_pool.submit(parts[1], 'telemetry', topic, payload, received_at)
+                    return
+            elif parts[0] == 'esp32' and len(parts) == 3 and parts[1] == 'status':
+                if parts[2].isdigit():
+                    ingest_metrics.incr('received.status')
+                    self.worker_pool.submit(parts[2], 'status', topic, payload, received_at)
+                    return
             
-            # Cihaz durum mesajları: esp32/status/{room_id}
-            elif parts[0] == 'esp32' and parts[1] == 'status' and len(parts) == 3:
-                room_id = parts[2]
-                
-                # Otomatik olarak bu oda için topic'lere abone ol (henüz abone değilse)
-                if int(room_id) not in self.subscribed_rooms:
-                    self._subscribe_to_room_topics(int(room_id))
-                
-                self._process_device_status(room_id, payload)
+            ingest_metrics.incr('received.ignored')
+            logger.debug(f"İşlenmeyen MQTT mesajı atlandı: {topic}")
             
         except Exception as e:
             logger.error(f"MQTT mesaj işleme hatası: {str(e)}", exc_info=True)
     
-    def _cache_sensor_data(self, room_id, sensor_type, payload):
-        """Sensör verilerini önbelleğe al"""
-        # Oda için önbellek oluştur
-        if room_id not in self.temp_cache:
-            self.temp_cache[room_id] = {
-                'timestamp': timezone.now(),
-                'data': {}
-            }
+    def _handle_message(self, topic, payload, received_at):
+        """Kuyruktan alınan mesajı işle (worker thread'i)"""
+        # Topic'i parçalara ayır
+        parts = topic.split('/')
         
-        # Sensör tipine göre veriyi önbelleğe ekle
-        try:
-            if sensor_type == 'temperature':
-                self.temp_cache[room_id]['data']['temperature'] = float(payload)
-            elif sensor_type == 'humidity':
-                self.temp_cache[room_id]['data']['humidity'] = float(payload)
-            elif sensor_type == 'pir':
-                self.temp_cache[room_id]['data']['presence'] = (payload == '1')
+        # Birleşik telemetri: room/{room_id}/telemetry (tek mesajda tüm sensör verileri)
+        if parts[0] == 'room' and len(parts) == 3 and parts[2] == 'telemetry':
+            room_id = parts[1]
             
-            logger.debug(f"Sensör verisi önbelleğe alındı: Oda {room_id}, {sensor_type}={payload}")
-        except ValueError:
-            logger.warning(f"Geçersiz sensör değeri: {sensor_type}={payload}")
-    
-    def _process_cached_data(self, room_id):
-        """Önbellekteki verileri işle ve gerekirse veritabanına kaydet"""
-        if room_id not in self.temp_cache:
-            return
+            try:
+                data = parse_telemetry(payload)
+            except ValueError as e:
+                ingest_metrics.incr('parse_errors.telemetry')
+                logger.warning(f"Geçersiz telemetri mesajı: Oda {room_id}, {e}")
+                return
+            
+            # Mesaj tam bir okuma içerdiği için önbelleğe gerek yok, doğrudan kaydet
+            self._save_sensor_data_to_db(room_id, data, received_at)
         
-        cache_data = self.temp_cache[room_id]
-        data = cache_data['data']
+        # Sensör verileri (eski format): room/{room_id}/temperature|humidity|pir
+        elif parts[0] == 'room' and len(parts) == 3:
+            room_id = parts[1]
+            sensor_type = parts[2]
+            
+            try:
+                field, value = parse_sensor_value(sensor_type, payload)
+            except ValueError:
+                ingest_metrics.incr(f"parse_errors.{sensor_type}")
+                logger.warning(f"Geçersiz sensör değeri: {sensor_type}={payload}")
+                return
+            
+            # Sensör verisini önbelleğe al, sıcaklık ve nem tamamlandıysa veritabanına kaydet
+            # Gecikme, okumayı tamamlayan son mesajın alındığı andan itibaren ölçülür
+            data = self.reassembly_cache.update(room_id, field, value)
+            if data is not None:
+                self._save_sensor_data_to_db(room_id, data, received_at)
         
-        # Minimum gerekli alanları kontrol et (sıcaklık ve nem)
-        if 'temperature' in data and 'humidity' in data:
-            # Veritabanına kaydet
-            self._save_sensor_data_to_db(room_id, data)
+        # Cihaz durum mesajları: esp32/status/{room_id}
+        elif parts[0] == 'esp32' and parts[1] == 'status' and len(parts) == 3:
+            room_id = parts[2]
             
-            # Önbelleği temizle
-            del self.temp_cache[room_id]
-        else:
-            # 60 saniyeden eski verileri sil (eksik veri için)
-            time_diff = (timezone.now() - cache_data['timestamp']).total_seconds()
-            if time_diff > 60:
-                logger.warning(f"Oda {room_id} için eksik sensör verileri, önbellek temizleniyor")
-                del self.temp_cache[room_id]
+            self._process_device_status(room_id, payload)
     
-    @transaction.atomic
-    def _save_sensor_data_to_db(self, room_id, data):
-        """Sensör verilerini veritabanına kaydet"""
+    def _save_sensor_data_to_db(self, room_id, data, received_at=None):
+        """Sensör verilerini yazma tamponuna ekle (veritabanına toplu olarak yazılır)"""
         try:
-            # Odayı bul veya oluştur
-            try:
-                room = Room.objects.get(id=room_id)
-            except Room.DoesNotExist:
-                # İlk kullanıcıyı bul (varsayılan admin)
-                from django.contrib.auth.models import User
-                admin_user = User.objects.filter(is_superuser=True).first()
-                
-                if not admin_user:
-                    logger.error(f"Oda {room_id} için kullanıcı bulunamadı, veri kaydedilemedi")
-                    return
-                
-                # Yeni oda oluştur
-                room = Room.objects.create(
-                    id=room_id,
-                    name=f"Oda {room_id}",
-                    user=admin_user
-                )
-                logger.info(f"Yeni oda oluşturuldu: {room}")
+            # Odayı doğrula (bellekteki oda kaydından, veritabanı sorgusu yapılmaz)
+            room_id = room_registry.resolve(room_id)
+            if room_id is None:
+                ingest_metrics.incr('dropped.unknown_room')
+                return
+            
+            # Sensör verilerini tampona ekle
+            sensor_reading = build_sensor_reading(room_id, data, received_at)
             
-            # Sensör verilerini kaydet
-            temperature = data.get('temperature')
-            humidity = data.get('humidity')
-            presence = data.get('presence', False)
+            # Anlamlı değişiklik yoksa yalnızca bellekteki son değeri güncelle
+            if not deadband_filter.should_store(sensor_reading):
+                ingest_metrics.incr('readings.suppressed')
+                return sensor_reading
             
-            sensor_reading = SensorReading.objects.create(
-                room=room,
-                temperature=temperature,
-                humidity=humidity,
-                presence=presence
-            )
+            reading_buffer.add(sensor_reading)
             
-            logger.info(f"Sensör verisi kaydedildi: Oda={room.name}, Sıcaklık={temperature}°C, Nem={humidity}%, Hareket={'Var' if presence else 'Yok'}")
+            logger.debug(f"Sensör verisi kayıt için tampona alındı: Oda={room_id}, Sıcaklık={sensor_reading.temperature}°C, Nem={sensor_reading.humidity}%, Hareket={'Var' if sensor_reading.presence else 'Yok'}")
             
             return sensor_reading
         except Exception as e:
-            logger.error(f"Veritabanına kayıt hatası: {str(e)}")
+            logger.error(f"Sensör verisi tampona alınamadı: {str(e)}")
             raise
     
-    @transaction.atomic
     def _process_device_status(self, room_id, payload):
-        """Cihaz durum mesajlarını işle ve veritabanına kaydet"""
+        """Cihaz durum mesajlarını işle ve yalnızca değişen alanları veritabanına kaydet"""
         try:
-            # Odayı bul veya oluştur
+            # Mesajı ayrıştır (serbest metin, JSON veya key=value)
             try:
-                room = Room.objects.get(id=room_id)
-            except Room.DoesNotExist:
-                # İlk kullanıcıyı bul (varsayılan admin)
-                from django.contrib.auth.models import User
-                admin_user = User.objects.filter(is_superuser=True).first()
-                
-                if not admin_user:
-                    logger.error(f"Oda {room_id} için kullanıcı bulunamadı, veri kaydedilemedi")
-                    return
-                
-                # Yeni oda oluştur
-                room = Room.objects.create(
-                    id=room_id,
-                    name=f"Oda {room_id}",
-                    user=admin_user
-                )
-                logger.info(f"Yeni oda oluşturuldu: {room}")
-            
-            # Cihaz durumunu al veya oluştur
-            device_status, created = DeviceStatus.objects.get_or_create(room=room)
+                delta = parse_status(payload)
+            except ValueError as e:
+                ingest_metrics.incr('parse_errors.status')
+                logger.warning(f"Cihaz durum mesajı ayrıştırılamadı: Oda={room_id}, {payload}, Hata: {e}")
+                return
             
-            # Gelen mesaja göre durum bilgilerini güncelle
-            status_updated = False
+            # Cihazın bildirdiği durumla bekleyen komutları eşleştir
+            if delta.valve_status is not None:
+                self.command_queue.acknowledge(room_id, 'valve', delta.valve_status)
+            if delta.fan_status is not None:
+                self.command_queue.acknowledge(room_id, 'fan', delta.fan_status)
             
-            # Fan durumu kontrolü
-            if "Fans: ON" in payload:
-                device_status.fan_status = True
-                status_updated = True
-                logger.info(f"Fan durumu güncellendi: Oda={room.name}, Durum=AÇIK")
-            elif "Fans: OFF" in payload:
-                device_status.fan_status = False
-                status_updated = True
-                logger.info(f"Fan durumu güncellendi: Oda={room.name}, Durum=KAPALI")
+            # Durum bilgisi içermeyen mesajlar (ör. "System online") için veritabanına dokunma
+            if delta.is_empty():
+                logger.debug(f"Durum güncellemesi içermeyen mesaj: Oda={room_id}, {payload}")
+                return
             
-            # Valf durumu kontrolü
-            if "Stepper completed CW" in payload:  # Clockwise = Kapalı
-                device_status.valve_status = False
-                status_updated = True
-                logger.info(f"Valf durumu güncellendi: Oda={room.name}, Durum=KAPALI")
-            elif "Stepper completed CCW" in payload:  # Counter-Clockwise = Açık
-                device_status.valve_status = True
-                status_updated = True
-                logger.info(f"Valf durumu güncellendi: Oda={room.name}, Durum=AÇIK")
+            # Odayı doğrula (bellekteki oda kaydından, veritabanı sorgusu yapılmaz)
+            room_id = room_registry.resolve(room_id)
+            if room_id is None:
+                ingest_metrics.incr('dropped.unknown_room')
+                return
             
-            # Batarya seviyesi kontrolü
-            if "Battery:" in payload:
-                try:
-                    battery_text = payload.split("Battery:")[1].strip()
-                    if "%" in battery_text:
-                        battery_level = int(battery_text.split("%")[0].strip())
-                        device_status.battery_level = battery_level
-                        status_updated = True
-                        logger.info(f"Batarya seviyesi güncellendi: Oda={room.name}, Seviye=%{battery_level}")
-                except (IndexError, ValueError) as e:
-                    logger.warning(f"Batarya seviyesi ayrıştırılamadı: {payload}, Hata: {e}")
-            
-            # Bağlantı durumu kontrolü
-            if "Network signal:" in payload:
-                if "Strong" in payload:
-                    device_status.connection_status = "stable"
-                    status_updated = True
-                elif "Weak" in payload:
-                    device_status.connection_status = "weak"
-                    status_updated = True
-                else:
-                    device_status.connection_status = "unstable"
-                    status_updated = True
-                logger.info(f"Bağlantı durumu güncellendi: Oda={room.name}, Durum={device_status.connection_status}")
-            
-            # Eğer herhangi bir değişiklik olduysa, kaydı güncelle
-            if status_updated:
-                device_status.save()
-                logger.debug(f"Cihaz durumu veritabanına kaydedildi: {device_status}")
+            # Gelen mesaja göre durum bilgilerini güncelle, sadece değişen alanları yaz
+            started = time.monotonic()
+            changed_fields = save_status_delta(room_id, delta)
+            ingest_metrics.observe('status_write_seconds', time.monotonic() - started)
+            if changed_fields:
+                logger.info(
+                    f"Cihaz durumu güncellendi: Oda={room_id}, "
+                    + ", ".join(f"{field}={getattr(delta, field)}" for field in changed_fields)
+                )
+                device_status_changed.send(sender=self.__class__, room_id=room_id, changed_fields=changed_fields)
         
         except Exception as e:
             logger.error(f"Cihaz durumu işleme hatası: {str(e)}")
     
     # Komut gönderme fonksiyonları
     
-    def publish_valve_command(self, room_id, open_valve):
-        """Valf kontrol komutu gönder"""
-        if not self.is_connected:
-            logger.warning("MQTT broker'a bağlı değil, valf komutu gönderilemedi")
+    def _publish_command(self, topic, command):
+        """Komutu broker'a gönder (komut kuyruğu tarafından çağrılır)"""
+        if not self.is_connected or self.client is None:
             return False
         
-        # Valf açma/kapama komutu (CW=Kapat, CCW=Aç)
-        command = "CCW" if open_valve else "CW"
-        topic = f"esp32/stepper/control/{room_id}"
-        
-        # Komutu gönder
-        result = self.client.publish(topic, command)
+        command_qos = getattr(settings, 'MQTT_COMMANDS', {}).get('QOS', 1)
+        result = self.client.publish(topic, command, qos=command_qos)
         
         if result.rc == 0:  # MQTT_ERR_SUCCESS
-            logger.info(f"Valf komutu gönderildi: Oda={room_id}, Komut={command} ({'Aç' if open_valve else 'Kapat'})")
+            logger.debug(f"Komut gönderildi: {topic} => {command}")
             return True
         else:
-            logger.error(f"Valf komutu gönderilemedi: {topic}, Hata kodu: {result.rc}")
+            logger.error(f"Komut gönderilemedi: {topic}, Hata kodu: {result.rc}")
             return False
     
+    def publish_valve_command(self, room_id, open_valve):
+        """Valf kontrol komutunu onay takipli komut kuyruğuna al"""
+        if not self.is_connected:
+            logger.warning("MQTT broker'a bağlı değil, valf komutu gönderilemedi")
+            return False
+        
+        # Valf açma/kapama komutu (CW=Kapat, CCW=Aç), cihaz onaylayana kadar yeniden gönderilir
+        self.command_queue.submit(room_id, 'valve', open_valve)
+        logger.info(f"Valf komutu kuyruğa alındı: Oda={room_id}, Komut={'CCW' if open_valve else 'CW'} ({'Aç' if open_valve else 'Kapat'})")
+        return True
+    
     def publish_fan_command(self, room_id, turn_on):
-        """Fan kontrol komutu gönder"""
+        """Fan kontrol komutunu onay takipli komut kuyruğuna al"""
         if not self.is_connected:
             logger.warning("MQTT broker'a bağlı değil, fan komutu gönderilemedi")
             return False
         
-        # Fan açma/kapama komutu
-        command = "ON" if turn_on else "OFF"
-        topic = f"esp32/fan/control/{room_id}"
-        
-        # Komutu gönder
-        result = self.client.publish(topic, command)
-        
-        if result.rc == 0:  # MQTT_ERR_SUCCESS
-            logger.info(f"Fan komutu gönderildi: Oda={room_id}, Komut={command}")
-            return True
-        else:
-            logger.error(f"Fan komutu gönderilemedi: {topic}, Hata kodu: {result.rc}")
-            return False
+        # Fan açma/kapama komutu, cihaz onaylayana kadar yeniden gönderilir
+        self.command_queue.submit(room_id, 'fan', turn_on)
+        logger.info(f"Fan komutu kuyruğa alındı: Oda={room_id}, Komut={'ON' if turn_on else 'OFF'}")
+        return True
 
 # Singleton instance oluştur
 mqtt_client = MQTTClient()
\ No newline at end of file
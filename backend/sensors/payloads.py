@@ -0,0 +1,92 @@
+# sensors/payloads.py
+import json
+from datetime import datetime, timezone as dt_timezone
+from django.utils.dateparse import parse_datetime
+
+
+def parse_sensor_value(sensor_type, payload):
+    """
+    Tekil sensör topic'indeki değeri ayrıştır (room/{id}/temperature|humidity|pir).
+    (alan adı, değer) döndürür, geçersiz değerde ValueError fırlatır.
+    """
+    if sensor_type == 'temperature':
+        return 'temperature', float(payload)
+    if sensor_type == 'humidity':
+        return 'humidity', float(payload)
+    if sensor_type == 'pir':
+        return 'presence', payload == '1'
+    raise ValueError(f"Bilinmeyen sensör tipi: {sensor_type}")
+
+
+def parse_device_timestamp(value):
+    """
+    Cihaz zaman damgasını timezone-aware datetime'a çevir.
+    Unix epoch (saniye) veya ISO 8601 metin kabul edilir.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Geçersiz zaman damgası: {value}")
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"Geçersiz zaman damgası: {value}")
+
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError(f"Geçersiz zaman damgası: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+def parse_sequence(value):
+    """Cihaz sıra numarasını negatif olmayan tamsayıya çevir"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Geçersiz sıra numarası: {value}")
+    try:
+        sequence = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Geçersiz sıra numarası: {value}")
+    if sequence < 0 or sequence >= 2 ** 63:
+        raise ValueError(f"Geçersiz sıra numarası: {value}")
+    return sequence
+
+
+def parse_telemetry(payload):
+    """
+    Birleşik telemetri mesajını ayrıştır (room/{id}/telemetry).
+
+    Beklenen format:
+    {"temperature": 22.5, "humidity": 45.0, "presence": true, "ts": 1718000000, "seq": 42}
+
+    temperature ve humidity zorunludur; presence varsayılan olarak False,
+    ts (cihaz zaman damgası) ve seq (sıra numarası) isteğe bağlıdır.
+    Geçersiz mesajda ValueError fırlatır.
+    """
+    try:
+        message = json.loads(payload)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Geçersiz telemetri JSON'u: {e}")
+
+    if not isinstance(message, dict):
+        raise ValueError("Telemetri mesajı bir JSON nesnesi olmalı")
+
+    try:
+        data = {
+            'temperature': float(message['temperature']),
+            'humidity': float(message['humidity']),
+        }
+    except KeyError as e:
+        raise ValueError(f"Telemetri mesajında eksik alan: {e}")
+    except (TypeError, ValueError):
+        raise ValueError("Telemetri mesajında geçersiz sıcaklık veya nem değeri")
+
+    presence = message.get('presence', False)
+    data['presence'] = presence in (True, 1, '1', 'true')
+    data['device_timestamp'] = parse_device_timestamp(message.get('ts'))
+    data['sequence'] = parse_sequence(message.get('seq'))
+    return data
@@ -0,0 +1,91 @@
+# sensors/persistence.py
+from datetime import datetime, timezone as dt_timezone
+from django.db import transaction
+from django.utils import timezone
+from .models import Room, SensorReading, DeviceStatus
+from .room_registry import room_registry
+
+
+def build_sensor_reading(room_id, data, received_at=None):
+    """
+    Ayrıştırılmış okuma verisinden kaydedilmemiş bir SensorReading nesnesi oluştur.
+    received_at: Mesajın alındığı an (time.time()); verilmezse şimdiki zaman.
+    Cihaz zaman damgası yoksa ölçüm zamanı olarak alım zamanı kullanılır.
+    """
+    if received_at is None:
+        received = timezone.now()
+    else:
+        received = datetime.fromtimestamp(received_at, tz=dt_timezone.utc)
+    device_timestamp = data.get('device_timestamp')
+
+    return SensorReading(
+        room_id=room_id,
+        temperature=data['temperature'],
+        humidity=data['humidity'],
+        presence=data.get('presence', False),
+        timestamp=device_timestamp or received,
+        device_timestamp=device_timestamp,
+        sequence=data.get('sequence'),
+        received_at=received
+    )
+
+
+def write_sensor_readings(readings, skip_replayed=False):
+    """
+    Sensör okumalarını tek bir bulk_create ile veritabanına yaz.
+    Aynı oda ve cihaz zaman damgasına sahip (tekrar gönderilmiş) okumalar sessizce atlanır,
+    böylece parti yeniden denemeleri ve yeniden oynatmalar idempotent olur.
+    skip_replayed: Cihaz zaman damgası olmayan (eski firmware) okumalar benzersizlik kısıtına
+    takılmaz (NULL); yeniden oynatmada aynı oda ve alım zamanıyla zaten yazılmış olanlar atlanır.
+    """
+    if skip_replayed:
+        readings = _without_replayed_legacy_readings(readings)
+    with transaction.atomic():
+        SensorReading.objects.bulk_create(readings, ignore_conflicts=True)
+    return len(readings)
+
+
+def _without_replayed_legacy_readings(readings):
+    """Cihaz zaman damgası olmayan ve aynı oda/alım zamanıyla zaten kayıtlı okumaları çıkar"""
+    legacy = [reading for reading in readings if reading.device_timestamp is None]
+    if not legacy:
+        return readings
+    existing = set(SensorReading.objects.filter(
+        device_timestamp__isnull=True,
+        room_id__in={reading.room_id for reading in legacy},
+        received_at__range=(min(reading.received_at for reading in legacy),
+                            max(reading.received_at for reading in legacy)),
+    ).order_by().values_list('room_id', 'received_at'))
+    if not existing:
+        return readings
+    return [
+        reading for reading in readings
+        if reading.device_timestamp is not None or (reading.room_id, reading.received_at) not in existing
+    ]
+
+
+def readings_with_existing_rooms(readings):
+    """
+    Odası hâlâ veritabanında olan okumalar. Oda başka bir süreçte silindiyse partinin
+    tamamı IntegrityError ile reddedilir; yalnızca o odanın okumaları atılıp kalanlar yazılabilir.
+    Silinmiş odalar süreç içi oda kaydından da çıkarılır (kaydın geri kalanı geçerli kalır).
+    """
+    room_ids = {reading.room_id for reading in readings}
+    existing = set(Room.objects.filter(id__in=room_ids).values_list('id', flat=True))
+    for room_id in room_ids - existing:
+        room_registry.room_deleted(room_id)
+    return [reading for reading in readings if reading.room_id in existing]
+
+
+@transaction.atomic
+def save_status_delta(room_id, delta):
+    """
+    StatusDelta'yı odanın DeviceStatus kaydına uygula.
+    Yalnızca değeri değişen alanlar yazılır; değişen alanların listesini döndürür.
+    """
+    device_status, created = DeviceStatus.objects.get_or_create(room_id=room_id)
+
+    changed_fields = delta.apply_to(device_status)
+    if changed_fields:
+        device_status.save(update_fields=changed_fields + ['last_updated'])
+    return changed_fields
@@ -0,0 +1,125 @@
+# sensors/reassembly.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PartialReading:
+    """Bir oda için henüz tamamlanmamış sensör okuması (eski tekil topic formatı)"""
+
+    __slots__ = ('temperature', 'humidity', 'presence', 'first_seen')
+
+    def __init__(self, first_seen):
+        self.temperature = None
+        self.humidity = None
+        self.presence = None
+        self.first_seen = first_seen
+
+
+class ReassemblyCache:
+    """
+    room/{id}/temperature|humidity|pir mesajlarını tam okumaya birleştiren önbellek.
+
+    Her oda için tek bir PartialReading tutulur. Kayıtlar ilk mesaj sırasıyla
+    saklandığından süpürücü yalnızca listenin başındaki eski kayıtlara bakar.
+    Önbellek MAX_ROOMS ile sınırlıdır; dolduğunda en eski kısmi okuma atılır.
+    """
+
+    def __init__(self):
+        ingest_settings = getattr(settings, 'MQTT_INGEST', {})
+        self.max_rooms = ingest_settings.get('REASSEMBLY_MAX_ROOMS', 10000)
+        self.ttl = ingest_settings.get('REASSEMBLY_TTL', 60)  # saniye
+        self.sweep_interval = ingest_settings.get('REASSEMBLY_SWEEP_INTERVAL', 10)  # saniye
+
+        self._slots = OrderedDict()  # room_id -> PartialReading (ilk mesaj sırasıyla)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._sweeper_thread = None
+
+        self.completed_count = 0  # Tamamlanan okuma sayısı
+        self.expired_count = 0  # Süresi dolduğu için atılan kısmi okuma sayısı
+        self.overflow_count = 0  # Önbellek dolduğu için atılan kısmi okuma sayısı
+
+    def start(self):
+        """Periyodik süpürücü thread'ini başlat"""
+        if self._sweeper_thread and self._sweeper_thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._sweeper_thread = threading.Thread(target=self._run_sweeper)
+        self._sweeper_thread.daemon = True
+        self._sweeper_thread.start()
+
+    def stop(self):
+        """Süpürücü thread'ini durdur"""
+        self._stop_event.set()
+        if self._sweeper_thread and self._sweeper_thread.is_alive():
+            self._sweeper_thread.join(2.0)  # Maksimum 2 saniye bekle
+        self._sweeper_thread = None
+
+    def update(self, room_id, field, value):
+        """
+        Oda için bir sensör değerini kaydet.
+        Sıcaklık ve nem tamamlandığında okuma verisini (dict) döndürür, aksi halde None.
+        """
+        with self._lock:
+            slot = self._slots.get(room_id)
+            if slot is None:
+                if len(self._slots) >= self.max_rooms:
+                    # Önbellek dolu, en eski kısmi okumayı at
+                    self._slots.popitem(last=False)
+                    self.overflow_count += 1
+                slot = PartialReading(time.monotonic())
+                self._slots[room_id] = slot
+
+            setattr(slot, field, value)
+
+            # Minimum gerekli alanlar (sıcaklık ve nem) tamamlandı mı
+            if slot.temperature is None or slot.humidity is None:
+                return None
+
+            del self._slots[room_id]
+            self.completed_count += 1
+
+        return {
+            'temperature': slot.temperature,
+            'humidity': slot.humidity,
+            'presence': bool(slot.presence),
+        }
+
+    def sweep(self):
+        """TTL süresini aşan kısmi okumaları at, atılan kayıt sayısını döndür"""
+        deadline = time.monotonic() - self.ttl
+        expired = 0
+        with self._lock:
+            while self._slots:
+                room_id, slot = next(iter(self._slots.items()))
+                if slot.first_seen > deadline:
+                    break
+                del self._slots[room_id]
+                expired += 1
+            self.expired_count += expired
+
+        if expired:
+            logger.warning(f"{expired} oda için eksik sensör verileri, önbellek temizlendi")
+        return expired
+
+    def stats(self):
+        """Önbellek durumu ve sayaçlar"""
+        return {
+            'partial_rooms': len(self._slots),
+            'completed': self.completed_count,
+            'expired': self.expired_count,
+            'overflow': self.overflow_count,
+        }
+
+    def _run_sweeper(self):
+        while not self._stop_event.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Önbellek süpürücüsünde hata: {str(e)}", exc_info=True)
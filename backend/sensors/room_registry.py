@@ -0,0 +1,132 @@
+# sensors/room_registry.py
+import logging
+import threading
+import time
+from django.conf import settings
+from .models import Room
+
+logger = logging.getLogger(__name__)
+
+
+class RoomRegistry:
+    """
+    Veri alım yolu için süreç içi oda kaydı.
+
+    Oda ID -> sahip kullanıcı ID eşlemesini bellekte tutar; bilinen odalar için
+    mesaj başına veritabanı sorgusu yapılmaz. Oluşturulamayan (admin kullanıcısı
+    olmayan) oda ID'leri belirli bir süre negatif önbellekte tutulur.
+    Room post_save/post_delete sinyalleri ile güncel tutulur (bkz. signals.py).
+    """
+
+    def __init__(self):
+        ingest_settings = getattr(settings, 'MQTT_INGEST', {})
+        self.unknown_room_ttl = ingest_settings.get('UNKNOWN_ROOM_RETRY_INTERVAL', 60)  # saniye
+
+        self._owners = {}  # room_id -> user_id
+        self._unknown = {}  # room_id -> negatif önbellek bitiş zamanı (monotonic)
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def preload(self):
+        """Oda listesini önceden yükle (asenkron kodda sync_to_async ile çağrılır)"""
+        self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        """Oda listesini ilk kullanımda tek sorguyla yükle"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._owners = dict(Room.objects.values_list('id', 'user_id'))
+            self._loaded = True
+            logger.info(f"Oda kaydı yüklendi: {len(self._owners)} oda")
+
+    @staticmethod
+    def _normalize(room_id):
+        try:
+            return int(room_id)
+        except (TypeError, ValueError):
+            return None
+
+    def exists(self, room_id):
+        """Oda veritabanında var mı (bellekten)"""
+        self._ensure_loaded()
+        return self._normalize(room_id) in self._owners
+
+    def owner_id(self, room_id):
+        """Odanın sahibi olan kullanıcının ID'si, oda yoksa None"""
+        self._ensure_loaded()
+        return self._owners.get(self._normalize(room_id))
+
+    def resolve(self, room_id):
+        """
+        Mesajdaki oda ID'sini doğrula ve int olarak döndür.
+        Oda yoksa varsayılan admin kullanıcısı adına oluşturulur; oluşturulamazsa None.
+        """
+        room_id = self._normalize(room_id)
+        if room_id is None:
+            return None
+
+        self._ensure_loaded()
+        if room_id in self._owners:
+            return room_id
+
+        # Negatif önbellek: yakın zamanda oluşturulamayan odalar için tekrar sorgu yapma
+        retry_at = self._unknown.get(room_id)
+        if retry_at is not None and time.monotonic() < retry_at:
+            return None
+
+        with self._lock:
+            if room_id in self._owners:
+                return room_id
+            return self._create_room(room_id)
+
+    def _create_room(self, room_id):
+        """Bilinmeyen oda için yeni kayıt oluştur (self._lock tutulurken çağrılır)"""
+        # Oda başka bir süreçte oluşturulmuş olabilir
+        user_id = Room.objects.filter(id=room_id).values_list('user_id', flat=True).first()
+        if user_id is not None:
+            self._owners[room_id] = user_id
+            return room_id
+
+        # İlk kullanıcıyı bul (varsayılan admin)
+        from django.contrib.auth.models import User
+        admin_user = User.objects.filter(is_superuser=True).first()
+
+        if not admin_user:
+            logger.error(f"Oda {room_id} için kullanıcı bulunamadı, veri kaydedilemedi")
+            self._unknown[room_id] = time.monotonic() + self.unknown_room_ttl
+            return None
+
+        # Yeni oda oluştur (post_save sinyali kaydı günceller)
+        room = Room.objects.create(
+            id=room_id,
+            name=f"Oda {room_id}",
+            user=admin_user
+        )
+        logger.info(f"Yeni oda oluşturuldu: {room}")
+        return room.id
+
+    def room_saved(self, room_id, user_id):
+        """Oda oluşturuldu veya güncellendi"""
+        with self._lock:
+            if self._loaded:
+                self._owners[room_id] = user_id
+            self._unknown.pop(room_id, None)
+
+    def room_deleted(self, room_id):
+        """Oda silindi"""
+        with self._lock:
+            self._owners.pop(room_id, None)
+
+    def clear(self):
+        """Kaydı temizle, bir sonraki kullanımda veritabanından yeniden yüklenir"""
+        with self._lock:
+            self._owners = {}
+            self._unknown = {}
+            self._loaded = False
+
+
+# Singleton instance oluştur
+room_registry = RoomRegistry()
@@ -14,8 +14,9 @@ class SensorReadingSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = SensorReading
-        fields = ['id', 'room', 'room_name', 'temperature', 'humidity', 'presence', 'timestamp']
-        read_only_fields = ['timestamp', 'room_name']
+        fields = ['id', 'room', 'room_name', 'temperature', 'humidity', 'presence', 'timestamp',
+                  'device_timestamp', 'sequence', 'received_at']
+        read_only_fields = ['timestamp', 'room_name', 'device_timestamp', 'sequence', 'received_at']
         
     def validate_room(self, room):
         # Kullanıcının, veri eklemek istediği odaya erişimi var mı kontrol et
@@ -0,0 +1,25 @@
+# sensors/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .deadband import deadband_filter
+from .models import Room
+from .room_registry import room_registry
+
+# Veri alım yolunun gönderdiği sinyaller (karar motorunun olay tabanlı modu için)
+# readings_committed: room_ids -> okumaları veritabanına yazılan odalar
+readings_committed = Signal()
+# device_status_changed: room_id, changed_fields -> cihaz durumu değişen oda ve alanlar
+device_status_changed = Signal()
+
+
+@receiver(post_save, sender=Room)
+def room_saved(sender, instance, **kwargs):
+    """Oda kaydedildiğinde süreç içi oda kaydını güncelle"""
+    room_registry.room_saved(instance.id, instance.user_id)
+
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    """Oda silindiğinde süreç içi oda kaydından çıkar"""
+    room_registry.room_deleted(instance.id)
+    deadband_filter.forget(instance.id)
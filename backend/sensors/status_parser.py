@@ -0,0 +1,176 @@
+# sensors/status_parser.py
+import json
+import re
+
+# Sinyal seviyesi -> DeviceStatus.connection_status
+SIGNAL_LEVELS = {
+    'strong': 'stable',
+    'stable': 'stable',
+    'weak': 'weak',
+    'unstable': 'unstable',
+}
+
+_TRUE_VALUES = ('1', 'true', 'on', 'open', 'ccw')
+_FALSE_VALUES = ('0', 'false', 'off', 'closed', 'close', 'cw')
+
+
+class StatusDelta:
+    """
+    Bir durum mesajından çıkarılan DeviceStatus değişiklikleri.
+    Mesajda bulunmayan alanlar None olarak kalır.
+    """
+
+    FIELDS = ('fan_status', 'valve_status', 'battery_level', 'connection_status')
+    __slots__ = FIELDS
+
+    def __init__(self, fan_status=None, valve_status=None, battery_level=None, connection_status=None):
+        self.fan_status = fan_status
+        self.valve_status = valve_status
+        self.battery_level = battery_level
+        self.connection_status = connection_status
+
+    def is_empty(self):
+        return all(getattr(self, field) is None for field in self.FIELDS)
+
+    def as_dict(self):
+        """Yalnızca mesajda bulunan alanlar"""
+        return {
+            field: getattr(self, field)
+            for field in self.FIELDS
+            if getattr(self, field) is not None
+        }
+
+    def apply_to(self, device_status):
+        """
+        Değişiklikleri DeviceStatus nesnesine uygula.
+        Değeri gerçekten değişen alanların listesini döndürür (save(update_fields=...) için).
+        """
+        changed_fields = []
+        for field, value in self.as_dict().items():
+            if getattr(device_status, field) != value:
+                setattr(device_status, field, value)
+                changed_fields.append(field)
+        return changed_fields
+
+    def __repr__(self):
+        return f"StatusDelta({self.as_dict()})"
+
+
+# Serbest metin durum mesajları için kural tablosu:
+# (kural adı, regex, DeviceStatus alanı, eşleşmeden değer üreten fonksiyon)
+_TEXT_RULES = (
+    ('fan_on', r'Fans:\s*ON\b', 'fan_status', lambda m: True),
+    ('fan_off', r'Fans:\s*OFF\b', 'fan_status', lambda m: False),
+    ('valve_open', r'Stepper completed CCW\b', 'valve_status', lambda m: True),  # Counter-Clockwise = Açık
+    ('valve_closed', r'Stepper completed CW\b', 'valve_status', lambda m: False),  # Clockwise = Kapalı
+    ('battery', r'Battery:\s*(?P<battery_value>\d+)\s*%', 'battery_level',
+     lambda m: _to_battery_level(m.group('battery_value'))),
+    ('network', r'Network signal:\s*(?P<network_value>\w*)', 'connection_status',
+     lambda m: SIGNAL_LEVELS.get(m.group('network_value').lower(), 'unstable')),
+)
+
+# Tüm kuralları tek geçişte arayan birleşik regex
+_TEXT_PATTERN = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern, _, _ in _TEXT_RULES))
+_TEXT_HANDLERS = {name: (field, convert) for name, _, field, convert in _TEXT_RULES}
+
+# key=value formatı: "fan=on;valve=open;battery=85;signal=strong"
+_KEY_VALUE_PATTERN = re.compile(r'^\s*\w+\s*=')
+_KEY_VALUE_SEPARATOR = re.compile(r'[;,\s]+')
+
+# Yapılandırılmış formatlarda kabul edilen anahtarlar -> DeviceStatus alanı
+_STRUCTURED_KEYS = {
+    'fan': 'fan_status',
+    'fan_status': 'fan_status',
+    'fans': 'fan_status',
+    'valve': 'valve_status',
+    'valve_status': 'valve_status',
+    'stepper': 'valve_status',
+    'battery': 'battery_level',
+    'battery_level': 'battery_level',
+    'signal': 'connection_status',
+    'network': 'connection_status',
+    'connection_status': 'connection_status',
+}
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE_VALUES:
+        return True
+    if text in _FALSE_VALUES:
+        return False
+    raise ValueError(f"Geçersiz açık/kapalı değeri: {value}")
+
+
+def _to_battery_level(value):
+    level = int(str(value).strip().rstrip('%'))
+    if not 0 <= level <= 100:
+        raise ValueError(f"Geçersiz batarya seviyesi: {value}")
+    return level
+
+
+def _to_connection_status(value):
+    return SIGNAL_LEVELS.get(str(value).strip().lower(), 'unstable')
+
+
+_STRUCTURED_CONVERTERS = {
+    'fan_status': _to_bool,
+    'valve_status': _to_bool,
+    'battery_level': _to_battery_level,
+    'connection_status': _to_connection_status,
+}
+
+
+def _parse_structured(items):
+    """(anahtar, değer) çiftlerinden StatusDelta oluştur, bilinmeyen anahtarları yok say"""
+    delta = StatusDelta()
+    for key, value in items:
+        field = _STRUCTURED_KEYS.get(str(key).strip().lower())
+        if field is not None:
+            setattr(delta, field, _STRUCTURED_CONVERTERS[field](value))
+    return delta
+
+
+def _parse_text(payload):
+    """Serbest metin mesajını kural tablosuyla tek geçişte ayrıştır"""
+    delta = StatusDelta()
+    for match in _TEXT_PATTERN.finditer(payload):
+        field, convert = _TEXT_HANDLERS[match.lastgroup]
+        setattr(delta, field, convert(match))
+    return delta
+
+
+def parse_status(payload):
+    """
+    esp32/status/{room_id} mesajını ayrıştır ve StatusDelta döndür.
+
+    Desteklenen formatlar:
+    - JSON: {"fan": "on", "valve": "open", "battery": 85, "signal": "strong"}
+    - key=value: fan=on;valve=open;battery=85;signal=strong
+    - Serbest metin: "Fans: ON", "Stepper completed CW", "Battery: 85%", "Network signal: Strong"
+
+    Hatalı JSON veya key=value mesajında ve geçersiz değerde (ör. 0-100 dışı batarya
+    seviyesi) tüm formatlarda ValueError fırlatır.
+    """
+    if payload.startswith('{'):
+        try:
+            message = json.loads(payload)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Geçersiz durum JSON'u: {e}")
+        if not isinstance(message, dict):
+            raise ValueError("Durum mesajı bir JSON nesnesi olmalı")
+        return _parse_structured(message.items())
+
+    if _KEY_VALUE_PATTERN.match(payload):
+        items = []
+        for pair in _KEY_VALUE_SEPARATOR.split(payload.strip()):
+            if pair:
+                key, separator, value = pair.partition('=')
+                if not separator:
+                    raise ValueError(f"Geçersiz key=value çifti: {pair}")
+                items.append((key, value))
+        return _parse_structured(items)
+
+    return _parse_text(payload)
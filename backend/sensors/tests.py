@@ -1,3 +1,766 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import write_buffer
+from .async_ingest import AsyncIngestService
+from .command_queue import CommandQueue
+from .deadband import DeadbandFilter, deadband_filter
+from .message_log import MessageLog, list_segments, message_log, read_segment
+from .models import DeviceStatus, Room, SensorReading
+from .payloads import parse_telemetry
+from .mqtt_client import SENSOR_TOPIC, STATUS_TOPIC, mqtt_client
+from .metrics import Histogram, IngestMetrics, ingest_metrics, read_snapshots
+from .persistence import build_sensor_reading, write_sensor_readings
+from .reassembly import ReassemblyCache
+from .room_registry import room_registry
+from .status_parser import StatusDelta, parse_status
+from .worker_pool import ShardedWorkerPool, _Shard
+from .write_buffer import SensorReadingBuffer, reading_buffer
+
+# Var olmayan (ör. başka bir süreçte silinmiş) oda
+MISSING_ROOM_ID = 999999
+
+
+def make_reading(room_id, temperature=21.0, offset=0, **data):
+    """Kaydedilmemiş SensorReading, alım zamanı sabit bir andan offset saniye sonra"""
+    return build_sensor_reading(
+        room_id, {'temperature': temperature, 'humidity': 40.0, **data}, received_at=1_700_000_000 + offset
+    )
+
+
+# SQLite yabancı anahtarları commit anında denetler, bu yüzden gerçek transaction gerekir
+class SensorReadingBufferTests(TransactionTestCase):
+    def setUp(self):
+        user = User.objects.create(username='buffer')
+        self.room = Room.objects.create(name='Salon', user=user)
+        self.buffer = SensorReadingBuffer()
+
+    def test_flush_writes_batch(self):
+        for offset in range(3):
+            self.buffer.add(make_reading(self.room.id, offset=offset))
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(self.buffer.pending_count(), 0)
+        self.assertEqual(SensorReading.objects.filter(room=self.room).count(), 3)
+
+    def test_integrity_error_drops_only_deleted_room_readings(self):
+        for offset in range(3):
+            self.buffer.add(make_reading(self.room.id, offset=offset))
+            self.buffer.add(make_reading(MISSING_ROOM_ID, offset=offset))
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(self.buffer.pending_count(), 0)
+        self.assertEqual(SensorReading.objects.filter(room=self.room).count(), 3)
+        self.assertFalse(SensorReading.objects.filter(room_id=MISSING_ROOM_ID).exists())
+
+    def test_integrity_error_with_only_deleted_rooms(self):
+        self.buffer.add(make_reading(MISSING_ROOM_ID))
+
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.pending_count(), 0)
+        self.assertEqual(SensorReading.objects.count(), 0)
+
+    def test_operational_error_requeues_batch_in_order(self):
+        for offset in range(3):
+            self.buffer.add(make_reading(self.room.id, temperature=20.0 + offset, offset=offset))
+
+        with mock.patch.object(write_buffer, 'write_sensor_readings', side_effect=OperationalError('database is locked')):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.buffer.add(make_reading(self.room.id, temperature=23.0, offset=3))
+
+        self.assertEqual([reading.temperature for reading in self.buffer._pending], [20.0, 21.0, 22.0, 23.0])
+        self.assertEqual(self.buffer.flush(), 4)
+        self.assertEqual(SensorReading.objects.filter(room=self.room).count(), 4)
+
+    def test_requeue_keeps_newest_readings_within_capacity(self):
+        self.buffer.max_pending = 4
+        for offset in range(3):
+            self.buffer.add(make_reading(self.room.id, temperature=20.0 + offset, offset=offset))
+
+        def fail_while_receiving(batch, skip_replayed=False):
+            # Yazma sürerken gelen okumalar tamponu doldurur
+            for offset in range(3, 5):
+                self.buffer.add(make_reading(self.room.id, temperature=20.0 + offset, offset=offset))
+            raise OperationalError('database is locked')
+
+        with mock.patch.object(write_buffer, 'write_sensor_readings', side_effect=fail_while_receiving):
+            self.assertEqual(self.buffer.flush(), 0)
+
+        self.assertEqual([reading.temperature for reading in self.buffer._pending], [21.0, 22.0, 23.0, 24.0])
+        self.assertEqual(self.buffer.dropped_count, 1)
+
+    def test_dropped_readings_are_discarded_from_deadband(self):
+        deadband = DeadbandFilter()
+        kept, dropped = make_reading(self.room.id), make_reading(MISSING_ROOM_ID)
+        for reading in (kept, dropped):
+            self.assertTrue(deadband.should_store(reading))
+            self.buffer.add(reading)
+
+        with mock.patch.object(write_buffer, 'deadband_filter', deadband):
+            self.assertEqual(self.buffer.flush(), 1)
+
+        # Yazılan okuma karşılaştırma tabanı olarak kalır, atılanın yerine bir sonraki okuma kaydedilir
+        self.assertFalse(deadband.should_store(make_reading(self.room.id, offset=1)))
+        self.assertTrue(deadband.should_store(make_reading(MISSING_ROOM_ID, offset=1)))
+
+
+class AsyncIngestFlushTests(TransactionTestCase):
+    def setUp(self):
+        user = User.objects.create(username='async')
+        self.room = Room.objects.create(name='Salon', user=user)
+        room_registry.clear()
+        self.addCleanup(room_registry.clear)
+        room_registry.preload()
+        room_registry.room_saved(MISSING_ROOM_ID, user.id)  # Başka bir süreçte silinmiş oda
+        self.service = AsyncIngestService()
+
+    async def flush_and_resolve(self, readings):
+        self.service._db_slots = asyncio.Semaphore(1)
+        self.service._batch = list(readings)
+        await self.service._flush()
+        # Olay döngüsünde: oda kaydı senkron sorgu gerektirmeden kullanılabilmeli
+        return await self.service._resolve_room(str(self.room.id))
+
+    def test_integrity_error_drops_deleted_room_without_reloading_registry(self):
+        readings = [make_reading(self.room.id), make_reading(MISSING_ROOM_ID), make_reading(self.room.id, offset=1)]
+
+        self.assertEqual(asyncio.run(self.flush_and_resolve(readings)), self.room.id)
+        self.assertEqual(SensorReading.objects.filter(room=self.room).count(), 2)
+        self.assertEqual(self.service._batch, [])
+        self.assertFalse(room_registry.exists(MISSING_ROOM_ID))
+        self.assertTrue(room_registry.exists(self.room.id))
+
+
+class IdempotentReadingWriteTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='idempotent')
+        self.room = Room.objects.create(name='Salon', user=user)
+
+    def reading(self, payload, offset=0):
+        return build_sensor_reading(self.room.id, parse_telemetry(json.dumps(payload)), received_at=1_700_000_100 + offset)
+
+    def test_device_timestamp_and_sequence_are_stored(self):
+        reading = self.reading({'temperature': 21.5, 'humidity': 40, 'ts': 1_700_000_000, 'seq': 7})
+        write_sensor_readings([reading])
+
+        stored = SensorReading.objects.get(room=self.room)
+        self.assertEqual(stored.device_timestamp.timestamp(), 1_700_000_000)
+        self.assertEqual(stored.timestamp, stored.device_timestamp)  # Ölçüm zamanı cihazın zamanı
+        self.assertEqual(stored.received_at.timestamp(), 1_700_000_100)
+        self.assertEqual(stored.sequence, 7)
+
+    def test_redelivered_readings_are_skipped(self):
+        payload = {'temperature': 21.5, 'humidity': 40, 'ts': '2023-11-14T22:13:20Z', 'seq': 1}
+        write_sensor_readings([self.reading(payload)])
+
+        # QoS1 yeniden teslimi veya parti yeniden denemesi: aynı oda ve cihaz zaman damgası
+        duplicate = self.reading({**payload, 'temperature': 30.0}, offset=5)
+        later = self.reading({**payload, 'ts': 1_700_000_010, 'seq': 2}, offset=5)
+        write_sensor_readings([duplicate, later])
+
+        self.assertEqual(
+            list(SensorReading.objects.filter(room=self.room).order_by('sequence').values_list('sequence', 'temperature')),
+            [(1, 21.5), (2, 21.5)]
+        )
+
+    def test_readings_without_device_timestamp_are_not_deduplicated(self):
+        write_sensor_readings([self.reading({'temperature': 21.5, 'humidity': 40})])
+        write_sensor_readings([self.reading({'temperature': 21.5, 'humidity': 40})])
+        self.assertEqual(SensorReading.objects.filter(room=self.room).count(), 2)
+
+    def test_invalid_device_timestamp_or_sequence_is_rejected(self):
+        for payload in ({'ts': 'dün'}, {'ts': True}, {'seq': -1}, {'seq': 'a'}):
+            with self.subTest(payload=payload), self.assertRaises(ValueError):
+                parse_telemetry(json.dumps({'temperature': 21.5, 'humidity': 40, **payload}))
+
+
+@override_settings(MQTT_INGEST={'WORKER_COUNT': 4, 'QUEUE_SIZE': 1000})
+class ShardedWorkerPoolTests(SimpleTestCase):
+    def make_pool(self, policy, capacity=2):
+        """Worker thread'i olmadan tek kuyruklu havuz (taşma davranışı için)"""
+        pool = ShardedWorkerPool(handler=mock.Mock())
+        pool.overflow_policy = policy
+        pool.running = True
+        pool._shards = [_Shard(capacity)]
+        return pool
+
+    def queued(self, pool):
+        return [args[0] for _, args in pool._shards[0].items]
+
+    def test_messages_of_a_room_are_handled_in_order(self):
+        handled = []
+        pool = ShardedWorkerPool(handler=lambda room_id, index: handled.append((room_id, index)))
+        pool.start()
+        for index in range(50):
+            for room_id in range(1, 9):
+                pool.submit(room_id, 'telemetry', room_id, index)
+        pool.stop()  # Kuyruktaki mesajlar işlendikten sonra durur
+
+        self.assertEqual(len(handled), 400)
+        for room_id in range(1, 9):
+            self.assertEqual([index for handled_room, index in handled if handled_room == room_id], list(range(50)))
+
+    def test_drop_telemetry_policy_keeps_status_messages(self):
+        pool = self.make_pool('drop_telemetry')
+        pool.submit(1, 'telemetry', 't1')
+        pool.submit(1, 'status', 's1')
+
+        with self.assertLogs('sensors.worker_pool', 'WARNING'):
+            self.assertFalse(pool.submit(1, 'telemetry', 't2'))
+        self.assertTrue(pool.submit(1, 'status', 's2'))  # En eski sensör mesajı atılır
+        self.assertEqual(self.queued(pool), ['s1', 's2'])
+        self.assertTrue(pool.submit(1, 'status', 's3'))  # Yalnızca durum mesajları: en eskisi atılır
+        self.assertEqual(self.queued(pool), ['s2', 's3'])
+        self.assertEqual(pool.dropped_count, 3)
+
+    def test_drop_oldest_policy(self):
+        pool = self.make_pool('drop_oldest')
+        with self.assertLogs('sensors.worker_pool', 'WARNING'):
+            for name in ('s1', 't1', 't2'):
+                self.assertTrue(pool.submit(1, 'status' if name[0] == 's' else 'telemetry', name))
+
+        self.assertEqual(self.queued(pool), ['t1', 't2'])
+        self.assertEqual(pool.dropped_count, 1)
+
+    def test_submit_after_stop_is_rejected(self):
+        pool = ShardedWorkerPool(handler=mock.Mock())
+        self.assertFalse(pool.submit(1, 'telemetry', 'payload'))
+
+
+@override_settings(MQTT_INGEST={'REASSEMBLY_MAX_ROOMS': 2, 'REASSEMBLY_TTL': 60})
+class ReassemblyCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        clock = mock.patch('sensors.reassembly.time.monotonic', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.cache = ReassemblyCache()
+
+    def test_reading_completes_when_temperature_and_humidity_arrive(self):
+        self.assertIsNone(self.cache.update('1', 'presence', True))
+        self.assertIsNone(self.cache.update('1', 'humidity', 40.0))
+        self.assertEqual(
+            self.cache.update('1', 'temperature', 21.5),
+            {'temperature': 21.5, 'humidity': 40.0, 'presence': True}
+        )
+        self.assertEqual(self.cache.stats()['partial_rooms'], 0)
+        self.assertEqual(self.cache.stats()['completed'], 1)
+
+    def test_oldest_partial_reading_is_evicted_when_full(self):
+        for room_id in ('1', '2', '3'):
+            self.cache.update(room_id, 'temperature', 21.0)
+
+        self.assertEqual(self.cache.stats()['overflow'], 1)
+        self.assertIsNone(self.cache.update('1', 'humidity', 40.0))  # Oda 1 atılmıştı
+        self.assertIsNotNone(self.cache.update('3', 'humidity', 40.0))
+
+    def test_sweep_discards_expired_partial_readings(self):
+        self.cache.update('1', 'temperature', 21.0)
+        self.now += 30
+        self.cache.update('2', 'temperature', 21.0)
+
+        self.now += 30
+        with self.assertLogs('sensors.reassembly', 'WARNING'):
+            self.assertEqual(self.cache.sweep(), 1)
+        self.assertIsNone(self.cache.update('1', 'humidity', 40.0))
+        self.assertIsNotNone(self.cache.update('2', 'humidity', 40.0))
+        self.assertEqual(self.cache.stats()['expired'], 1)
+
+
+class MQTTRoutingTests(SimpleTestCase):
+    def setUp(self):
+        submit = mock.patch.object(mqtt_client.worker_pool, 'submit')
+        self.submit = submit.start()
+        self.addCleanup(submit.stop)
+
+    def test_wildcard_messages_are_routed_by_room(self):
+        mqtt_client.ingest('room/12/temperature', b' 21.5 ', 1.0)
+        mqtt_client.ingest('esp32/status/12', b'Fans: ON', 2.0)
+
+        self.assertEqual(self.submit.call_args_list, [
+            mock.call('12', 'telemetry', 'room/12/temperature', '21.5', 1.0),
+            mock.call('12', 'status', 'esp32/status/12', 'Fans: ON', 2.0),
+        ])
+
+    def test_invalid_topics_are_ignored(self):
+        for topic in ('room/abc/temperature', 'room/1/pressure', 'esp32/status/x', 'room/1', 'other/1/temperature'):
+            mqtt_client.ingest(topic, b'1', 1.0)
+        self.submit.assert_not_called()
+
+    def test_shared_subscription_topics(self):
+        with mock.patch.object(mqtt_client, 'shared_group', None):
+            self.assertEqual(mqtt_client._subscription_topics(), (SENSOR_TOPIC, STATUS_TOPIC))
+
+        with mock.patch.object(mqtt_client, 'shared_group', 'ecoheat'):
+            # Komut gönderen süreç onayları kaçırmamak için tüm durum mesajlarını alır
+            self.assertEqual(
+                mqtt_client._subscription_topics(), ('$share/ecoheat/room/+/+', 'esp32/status/+')
+            )
+            with mock.patch.object(mqtt_client, 'sends_commands', False):
+                self.assertEqual(
+                    mqtt_client._subscription_topics(), ('$share/ecoheat/room/+/+', '$share/ecoheat/esp32/status/+')
+                )
+
+    def test_telemetry_message_is_saved_as_one_reading(self):
+        with mock.patch.object(mqtt_client, '_save_sensor_data_to_db') as save:
+            mqtt_client._handle_message(
+                'room/3/telemetry', '{"temperature": 21.5, "humidity": 40, "presence": 1}', 5.0
+            )
+        save.assert_called_once_with('3', {
+            'temperature': 21.5, 'humidity': 40.0, 'presence': True, 'device_timestamp': None, 'sequence': None,
+        }, 5.0)
+
+    def test_invalid_telemetry_is_counted_and_skipped(self):
+        with mock.patch.object(mqtt_client, '_save_sensor_data_to_db') as save, \
+                mock.patch.object(ingest_metrics, 'incr') as incr, \
+                self.assertLogs('sensors.mqtt_client', 'WARNING'):
+            for payload in ('{"temperature": 21.5}', 'not json', '[1, 2]'):
+                mqtt_client._handle_message('room/3/telemetry', payload, 5.0)
+        save.assert_not_called()
+        self.assertEqual(incr.call_args_list, [mock.call('parse_errors.telemetry')] * 3)
+
+
+class IngestMetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        self.metrics = IngestMetrics()
+        self.metrics.metrics_dir = self.metrics_dir
+
+    def test_histogram_quantiles_use_bucket_bounds(self):
+        histogram = Histogram(bounds=(0.01, 0.1, 1.0))
+        for value in [0.005] * 90 + [0.05] * 9 + [3.0]:
+            histogram.observe(value)
+
+        summary = histogram.as_dict()
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual((summary['p50'], summary['p95'], summary['max']), (0.01, 0.1, 3.0))
+        self.assertEqual(summary['p99'], 0.1)
+        self.assertEqual(histogram.quantile(1.0), 3.0)  # Son kova: gözlenen en büyük değer
+
+    def test_snapshot_counters_rates_and_gauges(self):
+        self.metrics.incr('received.telemetry', 5)
+        self.metrics.observe_many('write_seconds', [0.002, 0.004])
+        self.metrics.register_gauge('queue_depth', lambda: 7)
+        self.metrics.register_gauge('broken', lambda: 1 / 0)
+
+        with mock.patch('sensors.metrics.time.monotonic', return_value=self.metrics._last_snapshot_at + 2):
+            snapshot = self.metrics.snapshot(advance=True)
+        self.assertEqual(snapshot['counters'], {'received.telemetry': 5})
+        self.assertEqual(snapshot['rates'], {'received.telemetry': 2.5})
+        self.assertEqual(snapshot['histograms']['write_seconds']['count'], 2)
+        self.assertEqual(snapshot['gauges'], {'queue_depth': 7, 'broken': None})
+
+        # Oran penceresi yeniden başladı
+        with mock.patch('sensors.metrics.time.monotonic', return_value=self.metrics._last_snapshot_at + 1):
+            self.assertEqual(self.metrics.snapshot()['rates'], {'received.telemetry': 0.0})
+
+    def test_read_snapshots_skips_stale_and_broken_files(self):
+        self.metrics.incr('received.status')
+        self.metrics.write_snapshot()
+        with open(os.path.join(self.metrics_dir, '1.json'), 'w', encoding='utf-8') as f:
+            json.dump({'pid': 1, 'timestamp': time.time() - 600}, f)
+        with open(os.path.join(self.metrics_dir, '2.json'), 'w', encoding='utf-8') as f:
+            f.write('{bozuk')
+
+        self.assertEqual([snapshot['pid'] for snapshot in read_snapshots(self.metrics_dir, max_age=60)], [os.getpid()])
+        self.assertEqual(len(read_snapshots(self.metrics_dir)), 2)
+
+
+class StatusParserTests(SimpleTestCase):
+    def test_json(self):
+        delta = parse_status('{"fan": "on", "valve": "closed", "battery": 85, "signal": "strong"}')
+        self.assertEqual(delta.as_dict(), {
+            'fan_status': True, 'valve_status': False, 'battery_level': 85, 'connection_status': 'stable',
+        })
+
+    def test_key_value(self):
+        delta = parse_status('fan=off; valve=open, battery=40% signal=weak')
+        self.assertEqual(delta.as_dict(), {
+            'fan_status': False, 'valve_status': True, 'battery_level': 40, 'connection_status': 'weak',
+        })
+
+    def test_free_text(self):
+        delta = parse_status('Fans: ON | Stepper completed CCW | Battery: 12% | Network signal: Strong')
+        self.assertEqual(delta.as_dict(), {
+            'fan_status': True, 'valve_status': True, 'battery_level': 12, 'connection_status': 'stable',
+        })
+        self.assertFalse(parse_status('Stepper completed CW').valve_status)
+
+    def test_unknown_keys_and_text_are_ignored(self):
+        self.assertEqual(parse_status('{"uptime": 120, "fan": true}').as_dict(), {'fan_status': True})
+        self.assertEqual(parse_status('Network signal: ???').connection_status, 'unstable')
+        self.assertTrue(parse_status('Booting...').is_empty())
+
+    def test_battery_out_of_range_rejected_in_all_formats(self):
+        for payload in ('{"battery": 150}', 'battery=-5', 'Battery: 101%'):
+            with self.subTest(payload=payload):
+                with self.assertRaises(ValueError):
+                    parse_status(payload)
+
+    def test_invalid_messages_rejected(self):
+        for payload in ('{"fan": "on"', '{"fan": "maybe"}', 'fan=on;valve', 'battery=full'):
+            with self.subTest(payload=payload):
+                with self.assertRaises(ValueError):
+                    parse_status(payload)
+
+    def test_apply_to_returns_changed_fields(self):
+        device_status = mock.Mock(fan_status=True, valve_status=False, battery_level=80, connection_status='stable')
+        changed_fields = StatusDelta(fan_status=True, valve_status=True, battery_level=79).apply_to(device_status)
+
+        self.assertEqual(changed_fields, ['valve_status', 'battery_level'])
+        self.assertTrue(device_status.valve_status)
+        self.assertEqual(device_status.battery_level, 79)
+
+
+@override_settings(SENSOR_DEADBAND={
+    'TEMPERATURE_EPSILON': 0.2, 'HUMIDITY_EPSILON': 1.0, 'HEARTBEAT_INTERVAL': 300,
+    'ROOMS': {'2': {'TEMPERATURE_EPSILON': 1.0}},
+})
+class DeadbandFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.deadband = DeadbandFilter()
+
+    def test_stores_only_changes_beyond_thresholds(self):
+        self.assertTrue(self.deadband.should_store(make_reading(1, temperature=21.0)))
+        self.assertFalse(self.deadband.should_store(make_reading(1, temperature=21.1, offset=10)))
+        # Karşılaştırma son kaydedilen değerle yapılır, yavaş kayma da yakalanır
+        self.assertTrue(self.deadband.should_store(make_reading(1, temperature=21.3, offset=20)))
+        self.assertTrue(self.deadband.should_store(make_reading(1, temperature=21.3, offset=30, humidity=42.0)))
+        self.assertTrue(self.deadband.should_store(make_reading(1, temperature=21.3, offset=40, humidity=42.0,
+                                                                presence=True)))
+        self.assertEqual(self.deadband.latest(1).received_at.timestamp(), 1_700_000_040)
+
+    def test_room_overrides(self):
+        self.assertTrue(self.deadband.should_store(make_reading(2, temperature=21.0)))
+        self.assertFalse(self.deadband.should_store(make_reading(2, temperature=21.8, offset=10)))
+        self.assertEqual(self.deadband.thresholds(2)['HUMIDITY_EPSILON'], 1.0)
+
+    def test_heartbeat_and_clock_reset(self):
+        self.assertTrue(self.deadband.should_store(make_reading(1, offset=100)))
+        self.assertFalse(self.deadband.should_store(make_reading(1, offset=399)))
+        self.assertTrue(self.deadband.should_store(make_reading(1, offset=400)))
+        # Cihaz saati geri gitti
+        self.assertTrue(self.deadband.should_store(make_reading(1, offset=0)))
+
+    def test_discard_forgets_unwritten_stored_reading(self):
+        stored = make_reading(1)
+        self.assertTrue(self.deadband.should_store(stored))
+        self.deadband.discard([make_reading(1)])  # Kaydedilen okuma değil, etkisiz
+        self.assertFalse(self.deadband.should_store(make_reading(1, offset=10)))
+
+        self.deadband.discard([stored])
+        self.assertTrue(self.deadband.should_store(make_reading(1, offset=20)))
+
+
+class RoomRegistryTests(TestCase):
+    def setUp(self):
+        room_registry.clear()
+        self.addCleanup(room_registry.clear)
+
+    def test_resolve_creates_unknown_room_for_admin(self):
+        admin = User.objects.create(username='admin', is_superuser=True)
+
+        self.assertEqual(room_registry.resolve('42'), 42)
+        self.assertEqual(Room.objects.get(id=42).user, admin)
+        with self.assertNumQueries(0):
+            self.assertEqual(room_registry.resolve(42), 42)
+            self.assertEqual(room_registry.owner_id(42), admin.id)
+
+    def test_resolve_without_admin_is_negatively_cached(self):
+        self.assertIsNone(room_registry.resolve(7))
+        self.assertIsNone(room_registry.resolve('abc'))
+        User.objects.create(username='admin', is_superuser=True)
+        with self.assertNumQueries(0):
+            self.assertIsNone(room_registry.resolve(7))
+        self.assertFalse(Room.objects.filter(id=7).exists())
+
+    def test_signals_keep_registry_current(self):
+        user = User.objects.create(username='owner')
+        self.assertFalse(room_registry.exists(1))
+
+        room = Room.objects.create(id=1, name='Mutfak', user=user)
+        self.assertTrue(room_registry.exists(1))
+        room.delete()
+        self.assertFalse(room_registry.exists(1))
+
+
+@override_settings(MQTT_COMMANDS={'ACK_TIMEOUT': 5, 'MAX_ATTEMPTS': 3, 'BACKOFF_MAX': 8})
+class CommandQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        clock = mock.patch('sensors.command_queue.time.monotonic', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.queue = CommandQueue(publish=mock.Mock(return_value=True))
+
+    def pending(self):
+        return {(room_id, device): (value, attempts) for room_id, device, value, attempts in self.queue.export_pending()}
+
+    def test_acknowledge_matches_room_device_and_value(self):
+        self.queue.submit('1', 'valve', True)
+        self.queue.submit(1, 'fan', False)
+        self.queue.publish.assert_has_calls([
+            mock.call('esp32/stepper/control/1', 'CCW'), mock.call('esp32/fan/control/1', 'OFF'),
+        ])
+
+        self.assertFalse(self.queue.acknowledge(1, 'valve', False))  # Farklı durum
+        self.assertFalse(self.queue.acknowledge(2, 'valve', True))  # Farklı oda
+        self.assertTrue(self.queue.acknowledge('1', 'valve', True))
+        self.assertFalse(self.queue.acknowledge(1, 'valve', True))  # Zaten onaylandı
+
+        self.assertEqual(self.pending(), {(1, 'fan'): (False, 1)})
+        self.assertEqual(self.queue.stats()['acked'], 1)
+
+    def test_same_command_is_not_resent_and_newer_command_replaces_it(self):
+        self.queue.submit(1, 'valve', True)
+        self.queue.submit(1, 'valve', True)
+        self.assertEqual(self.queue.publish.call_count, 1)
+
+        self.queue.submit(1, 'valve', False)
+        self.queue.publish.assert_called_with('esp32/stepper/control/1', 'CW')
+        self.assertEqual(self.pending(), {(1, 'valve'): (False, 1)})
+        self.assertFalse(self.queue.acknowledge(1, 'valve', True))  # Eski komutun onayı
+
+    def test_unacknowledged_command_is_retried_with_backoff_then_times_out(self):
+        self.queue.submit(1, 'fan', True)
+
+        self.queue._retry_due(self.now + 4.9)
+        self.assertEqual(self.queue.publish.call_count, 1)
+        self.now += 5  # ACK_TIMEOUT
+        self.queue._retry_due(self.now)
+        self.assertEqual(self.queue.publish.call_count, 2)
+        self.now += 8  # 10 saniye yerine BACKOFF_MAX
+        self.queue._retry_due(self.now)
+        self.assertEqual(self.pending(), {(1, 'fan'): (True, 3)})
+
+        self.now += 8
+        with self.assertLogs('sensors.command_queue', 'WARNING'):
+            self.queue._retry_due(self.now)
+        self.assertEqual(self.pending(), {})
+        self.assertEqual(self.queue.publish.call_count, 3)
+        stats = self.queue.stats()
+        self.assertEqual((stats['retries'], stats['timed_out']), (2, 1))
+
+    def test_disconnected_publish_is_retried_without_counting_attempts(self):
+        self.queue.publish.return_value = False
+        self.queue.submit(1, 'valve', True)
+        self.assertEqual(self.pending(), {(1, 'valve'): (True, 0)})
+
+        self.now += 1
+        self.queue._retry_due(self.now)
+        self.assertEqual(self.queue.publish.call_count, 2)
+        self.assertEqual(self.queue.stats()['retries'], 0)
+
+        self.queue.publish.return_value = True
+        self.now += 1
+        self.queue._retry_due(self.now)
+        self.assertEqual(self.pending(), {(1, 'valve'): (True, 1)})
+
+    def test_delayed_submit_is_sent_by_retry_pass(self):
+        self.queue.submit(1, 'valve', True, delay=0.4)
+        self.queue.publish.assert_not_called()
+
+        self.queue._retry_due(self.now + 0.4)
+        self.queue.publish.assert_called_once_with('esp32/stepper/control/1', 'CCW')
+
+    def test_restore_pending_waits_for_ack_before_resending(self):
+        self.queue.submit(1, 'valve', False)
+        restored = self.queue.restore_pending([
+            [1, 'valve', True, 1],  # Bu süreçte daha yeni bir komut var
+            [2, 'fan', True, 7],
+            [3, 'heater', True, 0],  # Bilinmeyen cihaz
+        ])
+
+        self.assertEqual(restored, 1)
+        self.assertEqual(self.pending(), {(1, 'valve'): (False, 1), (2, 'fan'): (True, 2)})
+        self.assertEqual(self.queue.publish.call_count, 1)
+
+        # Cihaz ACK_TIMEOUT içinde durum bildirirse yeniden gönderilmez
+        self.assertTrue(self.queue.acknowledge(2, 'fan', True))
+        self.queue._retry_due(self.now + 5)
+        self.assertEqual(self.queue.publish.call_args_list, [mock.call('esp32/stepper/control/1', 'CW')] * 2)
+
+
+class MessageLogTests(SimpleTestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.log = MessageLog()
+        self.log.log_dir = self.log_dir
+        self.log.enabled = True
+
+    def write(self, messages):
+        self.log.start()
+        for topic, payload, received_at in messages:
+            self.log.append(topic, payload, received_at)
+        self.log.stop()
+
+    def make_segment(self, name, age=0):
+        """Başka bir sürecin bıraktığı boş segment"""
+        started_ms = int((time.time() - age) * 1000)
+        path = os.path.join(self.log_dir, name.format(ms=f'{started_ms:013d}'))
+        with open(path, 'wb'):
+            pass
+        return os.path.basename(path)
+
+    def test_records_round_trip(self):
+        records = [
+            (1_700_000_000.25, 'room/1/telemetry', b'{"temperature": 21.5, "humidity": 40}'),
+            (1_700_000_001.5, 'esp32/status/1', 'Fans: ON ü'.encode('utf-8')),
+        ]
+        self.write([(topic, payload, received_at) for received_at, topic, payload in records])
+
+        segments = list_segments(self.log_dir)
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(list(read_segment(segments[0])), records)
+
+    def test_reading_stops_at_truncated_or_corrupt_record(self):
+        self.write([('room/1/temperature', b'21.5', 1.0), ('room/1/humidity', b'40', 2.0)])
+        path = list_segments(self.log_dir)[0]
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        with open(path, 'wb') as f:
+            f.write(data[:-1])  # Son kayıt yarım kaldı
+        with self.assertLogs('sensors.message_log', 'WARNING'):
+            self.assertEqual(list(read_segment(path)), [(1.0, 'room/1/temperature', b'21.5')])
+
+        with open(path, 'wb') as f:
+            f.write(data[:-1] + b'1')  # Son kaydın payload'ı bozuldu
+        with self.assertLogs('sensors.message_log', 'WARNING'):
+            self.assertEqual(list(read_segment(path)), [(1.0, 'room/1/temperature', b'21.5')])
+
+        with open(path, 'wb') as f:
+            f.write(b'bozuk' + data)
+        with self.assertRaises(ValueError):
+            list(read_segment(path))
+
+    def test_rotation_within_same_millisecond_creates_new_segments(self):
+        self.log.segment_bytes = 1  # Her kayıttan sonra yeni segment
+        records = [(float(index), 'room/1/temperature', str(index).encode()) for index in range(3)]
+        with mock.patch('sensors.message_log.time.time', return_value=1_700_000_000.0):
+            self.write([(topic, payload, received_at) for received_at, topic, payload in records])
+
+        segments = list_segments(self.log_dir)
+        self.assertEqual(len(segments), 4)  # Son segment boş
+        self.assertEqual([record for path in segments for record in read_segment(path)], records)
+
+    def test_old_segments_of_all_processes_are_removed(self):
+        self.log.max_segments = 3
+        self.log.max_age = 3600
+        expired = self.make_segment('{ms}-111-000001.wal', age=7200)
+        oldest = self.make_segment('{ms}-222.wal', age=600)  # Eski ad biçimi
+        kept = self.make_segment('{ms}-222-000002.wal', age=500)
+        active = self.make_segment('{ms}-333-000001.wal', age=7200)  # Çalışan sürecin aktif segmenti
+
+        with mock.patch('sensors.message_log._writer_alive', side_effect=lambda pid: pid in (333, os.getpid())):
+            self.log.start()
+            self.log.stop()
+
+        names = os.listdir(self.log_dir)
+        self.assertNotIn(expired, names)
+        self.assertNotIn(oldest, names)
+        self.assertIn(kept, names)
+        self.assertIn(active, names)
+        self.assertEqual(len(names), 3)  # kept, active ve bu sürecin segmenti
+
+
+class ReplayMessageLogTests(TransactionTestCase):
+    def setUp(self):
+        user = User.objects.create(username='replay')
+        self.room = Room.objects.create(name='Salon', user=user)
+        room_registry.clear()
+        self.addCleanup(room_registry.clear)
+
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        log = MessageLog()
+        log.log_dir = self.log_dir
+        log.enabled = True
+        log.start()
+        for index in range(3):
+            payload = {'temperature': 20 + index, 'humidity': 40}
+            if index == 2:
+                payload['ts'] = 1_700_000_002
+            log.append(f'room/{self.room.id}/telemetry', json.dumps(payload).encode(), 1_700_000_000.5 + index)
+        log.stop()
+
+        self.addCleanup(setattr, message_log, 'enabled', message_log.enabled)
+        self.addCleanup(setattr, reading_buffer, 'skip_replayed', reading_buffer.skip_replayed)
+        for target, attribute in ((ingest_metrics, 'start'), (ingest_metrics, 'stop')):
+            patcher = mock.patch.object(target, attribute)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(deadband_filter, 'should_store', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def replay(self):
+        call_command('replay_mqtt_log', *list_segments(self.log_dir), stdout=open(os.devnull, 'w'))
+
+    def test_replay_is_idempotent_for_readings_without_device_timestamp(self):
+        self.replay()
+        self.assertEqual(SensorReading.objects.filter(room=self.room).count(), 3)
+
+        self.replay()
+        self.assertEqual(SensorReading.objects.filter(room=self.room).count(), 3)
+        self.assertEqual(SensorReading.objects.filter(room=self.room, device_timestamp__isnull=True).count(), 2)
+
+    def test_skip_replayed_applies_only_to_replay(self):
+        # Canlı veri alımında cihaz zaman damgası olmayan okumalar denetlenmez
+        write_sensor_readings([make_reading(self.room.id)])
+        write_sensor_readings([make_reading(self.room.id)])
+        self.assertEqual(SensorReading.objects.filter(room=self.room).count(), 2)
+
+        write_sensor_readings([make_reading(self.room.id), make_reading(self.room.id, offset=1)], skip_replayed=True)
+        self.assertEqual(SensorReading.objects.filter(room=self.room).count(), 3)
+
+
+class ManualControlViewTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='manual')
+        self.room = Room.objects.create(name='Salon', user=user)
+        DeviceStatus.objects.create(room=self.room, valve_status=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+        from schedules.command_coalescer import command_coalescer
+        request = mock.patch.object(command_coalescer, 'request')
+        self.request = request.start()
+        self.addCleanup(request.stop)
+        connected = mock.patch.object(mqtt_client, 'is_connected', True)
+        connected.start()
+        self.addCleanup(connected.stop)
+
+    def control_valve(self, mode):
+        return self.client.post(f'/api/sensors/rooms/{self.room.id}/control_valve/', {'mode': mode}, format='json')
+
+    def test_deferred_valve_command_keeps_device_status(self):
+        self.request.return_value = 'deferred'
+        response = self.control_valve('off')
+
+        self.request.assert_called_once_with(self.room.id, 'valve', False, manual=True)
+        self.assertEqual(response.data['command'], 'deferred')
+        self.assertEqual(response.data['heating_status'], 'on')
+        device_status = DeviceStatus.objects.get(room=self.room)
+        self.assertTrue(device_status.valve_status)
+        self.assertEqual(device_status.heating_control_mode, 'manual')
+
+    def test_sent_valve_command_updates_device_status(self):
+        self.request.return_value = 'sent'
+        response = self.control_valve('off')
+
+        self.assertEqual(response.data['command'], 'sent')
+        self.assertFalse(DeviceStatus.objects.get(room=self.room).valve_status)
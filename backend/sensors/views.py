@@ -103,26 +103,38 @@ class RoomViewSet(viewsets.ModelViewSet):
             if not mqtt_client.is_connected:
                 mqtt_client.connect()
             
+            # Manuel komutlar da komut birleştiriciden geçer (kısa manuel bekleme süresi uygulanır)
+            from schedules.command_coalescer import command_coalescer
+            command_result = None
+            
             # Modu işle
             if mode == 'on':
                 # Manuel açık modu
                 device_status.heating_control_mode = 'manual'
-                device_status.valve_status = True
                 
                 # MQTT komutu gönder
-                mqtt_client.publish_valve_command(room.id, True)
+                command_result = command_coalescer.request(room.id, 'valve', True, manual=True)
                 
-                message = "Isıtma sistemi manuel olarak açıldı"
+                if command_result == 'deferred':
+                    # Son yön değişiminden bu yana bekleme süresi dolmadı, komut sonra gönderilir
+                    message = "Isıtma sistemi bekleme süresi dolunca manuel olarak açılacak"
+                else:
+                    device_status.valve_status = True
+                    message = "Isıtma sistemi manuel olarak açıldı"
             
             elif mode == 'off':
                 # Manuel kapalı modu
                 device_status.heating_control_mode = 'manual'
-                device_status.valve_status = False
                 
                 # MQTT komutu gönder
-                mqtt_client.publish_valve_command(room.id, False)
+                command_result = command_coalescer.request(room.id, 'valve', False, manual=True)
                 
-                message = "Isıtma sistemi manuel olarak kapatıldı"
+                if command_result == 'deferred':
+                    # Son yön değişiminden bu yana bekleme süresi dolmadı, komut sonra gönderilir
+                    message = "Isıtma sistemi bekleme süresi dolunca manuel olarak kapatılacak"
+                else:
+                    device_status.valve_status = False
+                    message = "Isıtma sistemi manuel olarak kapatıldı"
             
             elif mode == 'schedule':
                 # Program kontrolü modu
@@ -153,7 +165,8 @@ class RoomViewSet(viewsets.ModelViewSet):
                 "room_id": room.id,
                 "mode": mode,
                 "heating_status": "on" if device_status.valve_status else "off",
-                "control_mode": device_status.heating_control_mode
+                "control_mode": device_status.heating_control_mode,
+                "command": command_result  # 'sent', 'queued', 'deferred', 'suppressed', 'failed' veya None
             })
             
         except Exception as e:
@@ -189,26 +202,38 @@ class RoomViewSet(viewsets.ModelViewSet):
             if not mqtt_client.is_connected:
                 mqtt_client.connect()
             
+            # Manuel komutlar da komut birleştiriciden geçer (kısa manuel bekleme süresi uygulanır)
+            from schedules.command_coalescer import command_coalescer
+            command_result = None
+            
             # Modu işle
             if mode == 'on':
                 # Manuel açık modu
                 device_status.fan_control_mode = 'manual'
-                device_status.fan_status = True
                 
                 # MQTT komutu gönder
-                mqtt_client.publish_fan_command(room.id, True)
+                command_result = command_coalescer.request(room.id, 'fan', True, manual=True)
                 
-                message = "Fan sistemi manuel olarak açıldı"
+                if command_result == 'deferred':
+                    # Son yön değişiminden bu yana bekleme süresi dolmadı, komut sonra gönderilir
+                    message = "Fan sistemi bekleme süresi dolunca manuel olarak açılacak"
+                else:
+                    device_status.fan_status = True
+                    message = "Fan sistemi manuel olarak açıldı"
             
             elif mode == 'off':
                 # Manuel kapalı modu
                 device_status.fan_control_mode = 'manual'
-                device_status.fan_status = False
                 
                 # MQTT komutu gönder
-                mqtt_client.publish_fan_command(room.id, False)
+                command_result = command_coalescer.request(room.id, 'fan', False, manual=True)
                 
-                message = "Fan sistemi manuel olarak kapatıldı"
+                if command_result == 'deferred':
+                    # Son yön değişiminden bu yana bekleme süresi dolmadı, komut sonra gönderilir
+                    message = "Fan sistemi bekleme süresi dolunca manuel olarak kapatılacak"
+                else:
+                    device_status.fan_status = False
+                    message = "Fan sistemi manuel olarak kapatıldı"
             
             elif mode == 'schedule':
                 # Program kontrolü modu
@@ -239,7 +264,8 @@ class RoomViewSet(viewsets.ModelViewSet):
                 "room_id": room.id,
                 "mode": mode,
                 "fan_status": "on" if device_status.fan_status else "off",
-                "control_mode": device_status.fan_control_mode
+                "control_mode": device_status.fan_control_mode,
+                "command": command_result  # 'sent', 'queued', 'deferred', 'suppressed', 'failed' veya None
             })
             
         except Exception as e:
@@ -0,0 +1,149 @@
+# sensors/worker_pool.py
+import logging
+import threading
+import zlib
+from collections import deque
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class _Shard:
+    """Tek bir worker thread'ine ait sınırlı mesaj kuyruğu"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+
+
+class ShardedWorkerPool:
+    """
+    MQTT mesajlarını paho ağ thread'i dışında işleyen worker havuzu.
+
+    Mesajlar oda ID'sine göre sabit bir worker'a yönlendirilir, böylece aynı
+    odanın mesajları sırasıyla işlenir. Kuyruk dolduğunda OVERFLOW_POLICY
+    ayarına göre davranılır:
+    - 'block': Kuyrukta yer açılana kadar bekle
+    - 'drop_oldest': Kuyruktaki en eski mesajı at
+    - 'drop_telemetry': Sensör mesajlarını at, durum mesajlarını koru
+    """
+
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_telemetry')
+
+    def __init__(self, handler):
+        ingest_settings = getattr(settings, 'MQTT_INGEST', {})
+        self.worker_count = max(1, ingest_settings.get('WORKER_COUNT', 4))
+        self.queue_size = ingest_settings.get('QUEUE_SIZE', 10000)
+        self.overflow_policy = ingest_settings.get('OVERFLOW_POLICY', 'drop_telemetry')
+        if self.overflow_policy not in self.OVERFLOW_POLICIES:
+            logger.warning(f"Geçersiz kuyruk taşma politikası: {self.overflow_policy}, 'block' kullanılıyor")
+            self.overflow_policy = 'block'
+
+        self.handler = handler
+        self.running = False
+        self.dropped_count = 0  # Kuyruk dolduğu için atılan mesaj sayısı
+        self._shards = []
+
+    def start(self):
+        """Worker thread'lerini başlat"""
+        if self.running:
+            return
+
+        self.running = True
+        capacity = max(1, self.queue_size // self.worker_count)
+        self._shards = [_Shard(capacity) for _ in range(self.worker_count)]
+        for index, shard in enumerate(self._shards):
+            shard.thread = threading.Thread(target=self._run_worker, args=(shard,), name=f"mqtt-worker-{index}")
+            shard.thread.daemon = True
+            shard.thread.start()
+        logger.info(
+            f"MQTT worker havuzu başlatıldı (worker={self.worker_count}, kuyruk={self.queue_size}, "
+            f"politika={self.overflow_policy})"
+        )
+
+    def stop(self):
+        """Worker'ları durdur, kuyruklarda kalan mesajların işlenmesini bekle"""
+        if not self.running:
+            return
+
+        self.running = False
+        for shard in self._shards:
+            with shard.condition:
+                shard.condition.notify_all()
+        for shard in self._shards:
+            if shard.thread and shard.thread.is_alive():
+                shard.thread.join(5.0)  # Maksimum 5 saniye bekle
+        logger.info("MQTT worker havuzu durduruldu")
+
+    def submit(self, room_id, kind, *args):
+        """
+        Mesajı oda ID'sine ait worker kuyruğuna ekle.
+        kind: 'telemetry' (sensör verisi) veya 'status' (cihaz durumu)
+        Mesaj kuyruğa alınamadıysa False döndürür.
+        """
+        if not self.running:
+            return False
+
+        shard = self._shards[zlib.crc32(str(room_id).encode()) % len(self._shards)]
+        with shard.condition:
+            if len(shard.items) >= shard.capacity:
+                if not self._make_room(shard, kind):
+                    self._record_drop()
+                    return False
+            shard.items.append((kind, args))
+            shard.condition.notify_all()
+        return True
+
+    def queue_depth(self):
+        """Tüm kuyruklarda bekleyen mesaj sayısı"""
+        return sum(len(shard.items) for shard in self._shards)
+
+    def _make_room(self, shard, kind):
+        """Taşma politikasına göre kuyrukta yer aç (shard.condition tutulurken çağrılır)"""
+        if self.overflow_policy == 'block':
+            while self.running and len(shard.items) >= shard.capacity:
+                shard.condition.wait(0.5)
+            return self.running
+
+        if self.overflow_policy == 'drop_telemetry':
+            if kind != 'status':
+                return False
+            # Durum mesajı için kuyruktaki en eski sensör mesajını at
+            for index, (queued_kind, _) in enumerate(shard.items):
+                if queued_kind != 'status':
+                    del shard.items[index]
+                    self._record_drop()
+                    return True
+
+        # drop_oldest veya yalnızca durum mesajlarıyla dolu kuyruk
+        shard.items.popleft()
+        self._record_drop()
+        return True
+
+    def _record_drop(self):
+        self.dropped_count += 1
+        if self.dropped_count % 1000 == 1:
+            logger.warning(f"MQTT mesaj kuyruğu dolu, toplam {self.dropped_count} mesaj atıldı")
+
+    def _run_worker(self, shard):
+        """Kuyruktaki mesajları sırayla işleyen worker döngüsü"""
+        try:
+            while True:
+                with shard.condition:
+                    while not shard.items and self.running:
+                        shard.condition.wait(0.5)
+                    if not shard.items:
+                        break  # Durduruldu ve kuyruk boşaldı
+                    kind, args = shard.items.popleft()
+                    shard.condition.notify_all()  # Bekleyen üreticileri uyandır
+
+                try:
+                    self.handler(*args)
+                except Exception as e:
+                    logger.error(f"MQTT worker mesaj işleme hatası: {str(e)}", exc_info=True)
+        finally:
+            # Bu thread'e ait veritabanı bağlantısını kapat
+            connection.close()
@@ -0,0 +1,181 @@
+# sensors/write_buffer.py
+import logging
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.db import connection, IntegrityError, OperationalError
+from .deadband import deadband_filter
+from .metrics import ingest_metrics
+from .persistence import write_sensor_readings, readings_with_existing_rooms
+from .signals import readings_committed
+
+logger = logging.getLogger(__name__)
+
+
+class SensorReadingBuffer:
+    """
+    Sensör okumaları için write-behind tamponu.
+
+    Okumalar bellekte biriktirilir ve boyut ya da zaman eşiğine ulaşıldığında
+    tek bir bulk_create ile veritabanına yazılır. Her flush en fazla
+    MAX_BATCH_SIZE satır yazar, tampon en fazla MAX_PENDING okuma tutar.
+    Silinmiş odaların okumaları atılır; geçici veritabanı hatalarında parti
+    tampona geri konur ve bir sonraki flush'ta yeniden denenir.
+    """
+
+    def __init__(self):
+        ingest_settings = getattr(settings, 'MQTT_INGEST', {})
+        self.max_batch_size = ingest_settings.get('BUFFER_MAX_BATCH_SIZE', 500)
+        self.flush_interval = ingest_settings.get('BUFFER_FLUSH_INTERVAL', 1.0)
+        self.max_pending = ingest_settings.get('BUFFER_MAX_PENDING', 20000)
+
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flush_thread = None
+        self.running = False
+        self.dropped_count = 0  # Tampon dolduğu için atılan okuma sayısı
+        self.skip_replayed = False  # Yeniden oynatma (replay_mqtt_log): zaten yazılmış eski okumaları atla
+
+    def start(self):
+        """Arka plan flush thread'ini başlat"""
+        if self.running:
+            return
+
+        self.running = True
+        self._flush_thread = threading.Thread(target=self._run_flush_loop)
+        self._flush_thread.daemon = True
+        self._flush_thread.start()
+        logger.info(
+            f"Sensör okuma tamponu başlatıldı (parti={self.max_batch_size}, "
+            f"aralık={self.flush_interval}s, kapasite={self.max_pending})"
+        )
+
+    def stop(self):
+        """Flush thread'ini durdur ve tamponda kalan tüm okumaları yaz"""
+        self.running = False
+        self._flush_event.set()
+        if self._flush_thread and self._flush_thread.is_alive():
+            self._flush_thread.join(5.0)  # Maksimum 5 saniye bekle
+        self._flush_thread = None
+
+        # Kalan okumaları boşalt (geri konan partiler için deneme sayısı sınırlı)
+        for _ in range(-(-self.pending_count() // self.max_batch_size)):
+            self.flush()
+        logger.info("Sensör okuma tamponu durduruldu")
+
+    def add(self, reading):
+        """Kaydedilmemiş bir SensorReading nesnesini tampona ekle"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                # Tampon dolu, en eski okumayı at
+                deadband_filter.discard((self._pending.popleft(),))
+                self.dropped_count += 1
+                if self.dropped_count % 1000 == 1:
+                    logger.warning(f"Sensör okuma tamponu dolu, toplam {self.dropped_count} okuma atıldı")
+            self._pending.append(reading)
+            pending_count = len(self._pending)
+
+        # Boyut eşiğine ulaşıldıysa flush thread'ini uyandır
+        if pending_count >= self.max_batch_size:
+            self._flush_event.set()
+
+    def pending_count(self):
+        """Tamponda bekleyen okuma sayısı"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """
+        Tampondan en fazla max_batch_size okumayı veritabanına yaz.
+        Yazılan okuma sayısını döndürür.
+        """
+        with self._lock:
+            batch_size = min(len(self._pending), self.max_batch_size)
+            batch = [self._pending.popleft() for _ in range(batch_size)]
+
+        if not batch:
+            return 0
+
+        started = time.monotonic()
+        try:
+            try:
+                write_sensor_readings(batch, skip_replayed=self.skip_replayed)
+            except IntegrityError as e:
+                # Büyük ihtimalle başka bir süreçte silinmiş bir oda: yalnızca silinen odaların
+                # okumalarını at (odalar oda kaydından da çıkarılır) ve kalanları yeniden yaz
+                kept = readings_with_existing_rooms(batch)
+                kept_ids = {id(reading) for reading in kept}
+                deadband_filter.discard(reading for reading in batch if id(reading) not in kept_ids)
+                dropped = len(batch) - len(kept)
+                ingest_metrics.incr('readings.write_failed', dropped)
+                logger.warning(f"Silinmiş odalara ait {dropped} sensör okuması atıldı: {str(e)}")
+                batch = kept
+                if not batch:
+                    return 0
+                write_sensor_readings(batch, skip_replayed=self.skip_replayed)
+        except OperationalError as e:
+            # Geçici veritabanı hatası (ör. kilitli veritabanı, kopan bağlantı): partiyi geri koy
+            connection.close_if_unusable_or_obsolete()
+            requeued = self._requeue(batch)
+            ingest_metrics.incr('readings.requeued', requeued)
+            ingest_metrics.incr('readings.write_failed', len(batch) - requeued)
+            logger.error(
+                f"Toplu sensör verisi kayıt hatası ({requeued} okuma yeniden denenecek, "
+                f"{len(batch) - requeued} okuma kaybedildi): {str(e)}"
+            )
+            return 0
+        except Exception as e:
+            deadband_filter.discard(batch)
+            ingest_metrics.incr('readings.write_failed', len(batch))
+            logger.error(f"Toplu sensör verisi kayıt hatası ({len(batch)} okuma kaybedildi): {str(e)}")
+            return 0
+
+        committed_at = time.time()
+        ingest_metrics.observe('db_write_seconds', time.monotonic() - started)
+        ingest_metrics.observe_many(
+            'ingest_lag_seconds', [committed_at - reading.received_at.timestamp() for reading in batch]
+        )
+        ingest_metrics.incr('readings.written', len(batch))
+        logger.debug(f"{len(batch)} sensör okuması veritabanına yazıldı")
+        readings_committed.send(sender=self.__class__, room_ids={reading.room_id for reading in batch})
+        return len(batch)
+
+    def _requeue(self, batch):
+        """
+        Yazılamayan partiyi sırasını koruyarak tamponun başına geri koy. Tamponda yer
+        kalmadıysa add() gibi en eski okumalar atılır. Geri konan okuma sayısını döndürür.
+        """
+        with self._lock:
+            space = self.max_pending - len(self._pending)
+            kept = batch[max(0, len(batch) - space):] if space > 0 else []
+            self._pending.extendleft(reversed(kept))
+            self.dropped_count += len(batch) - len(kept)
+        deadband_filter.discard(batch[:len(batch) - len(kept)])
+        return len(kept)
+
+    def _run_flush_loop(self):
+        """Boyut veya zaman eşiğine ulaşıldığında tamponu boşaltan döngü"""
+        last_flush = time.monotonic()
+        try:
+            while self.running:
+                self._flush_event.wait(self.flush_interval)
+                self._flush_event.clear()
+
+                now = time.monotonic()
+                if self.pending_count() >= self.max_batch_size or now - last_flush >= self.flush_interval:
+                    # Her uyanışta sınırlı sayıda parti yaz, böylece döngü asla kilitlenmez
+                    for _ in range(max(1, self.max_pending // self.max_batch_size)):
+                        if not self.flush() or self.pending_count() < self.max_batch_size:
+                            break
+                    last_flush = now
+        except Exception as e:
+            logger.error(f"Sensör okuma tamponu döngüsünde hata: {str(e)}", exc_info=True)
+        finally:
+            # Bu thread'e ait veritabanı bağlantısını kapat
+            connection.close()
+
+
+# Singleton instance oluştur
+reading_buffer = SensorReadingBuffer()
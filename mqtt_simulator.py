@@ -1,4 +1,5 @@
 import paho.mqtt.client as mqtt
+import json
 import time
 import random
 import argparse
@@ -11,6 +12,8 @@ def main():
     parser.add_argument('--port', type=int, default=1883, help='MQTT broker port')
     parser.add_argument('--interval', type=float, default=5.0, help='Veri gönderme aralığı (saniye)')
     parser.add_argument('--rooms', type=int, default=2, help='Simüle edilecek oda sayısı')
+    parser.add_argument('--format', choices=['telemetry', 'legacy'], default='telemetry',
+                        help="Sensör mesaj formatı: 'telemetry' (tek JSON mesajı) veya 'legacy' (sensör başına ayrı mesaj)")
     args = parser.parse_args()
     
     # MQTT istemcisini başlat
@@ -103,10 +106,20 @@ def main():
                 humidity = round(random.uniform(40.0, 70.0), 1)
                 pir = random.choice(["0", "1"])  # 0: Hareket yok, 1: Hareket var
                 
-                # Sensör verilerini gönder (gerçek formata göre)
-                client.publish(f"room/{room_id}/temperature", str(temperature))
-                client.publish(f"room/{room_id}/humidity", str(humidity))
-                client.publish(f"room/{room_id}/pir", pir)
+                # Sensör verilerini gönder (seçilen formata göre)
+                if args.format == 'telemetry':
+                    # Tüm sensör verileri ve cihaz zaman damgası tek mesajda
+                    client.publish(f"room/{room_id}/telemetry", json.dumps({
+                        "temperature": temperature,
+                        "humidity": humidity,
+                        "presence": pir == "1",
+                        "ts": round(time.time(), 3),
+                        "seq": iteration
+                    }))
+                else:
+                    client.publish(f"room/{room_id}/temperature", str(temperature))
+                    client.publish(f"room/{room_id}/humidity", str(humidity))
+                    client.publish(f"room/{room_id}/pir", pir)
                 
                 print(f"   🏠 Oda {room_id}:")
                 print(f"      🌡️ Sıcaklık: {temperature}°C")